@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # Invalidação do usuário guardado em cache pelo backend de autenticação.
+        from . import signals  # noqa: F401
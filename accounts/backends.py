@@ -0,0 +1,45 @@
+"""
+Backend de autenticação que guarda o usuário logado no cache.
+
+O AuthenticationMiddleware carrega o usuário da sessão a cada requisição com get_user(), o que
+custa um SELECT em auth_user. Aqui o objeto User fica no cache por TEMPO_CACHE segundos e é
+removido sempre que o usuário é salvo ou apagado (ver signals.py): troca de senha, last_login,
+is_active etc. Como o hash da sessão é conferido com o usuário do cache, uma troca de senha
+continua encerrando as outras sessões.
+
+O tempo no cache vem de USUARIO_CACHE_SEGUNDOS. A invalidação só alcança o cache do processo que
+salvou o usuário: com um cache por processo (LocMemCache, o padrão do settings.py), os outros
+workers continuam com a versão antiga (hash da senha, is_active) até o tempo acabar, por isso
+lá ele é curto; com um cache compartilhado (perfil de produção) pode ser longo.
+
+Grupos e permissões não fazem parte do objeto em cache; continuam vindo do banco quando usados.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# Quando USUARIO_CACHE_SEGUNDOS não está definido.
+TEMPO_CACHE = 60
+
+
+def chave_usuario(user_id):
+    return f'accounts:usuario:{user_id}'
+
+
+def invalidar_usuario(user_id):
+    cache.delete(chave_usuario(user_id))
+
+
+class UsuarioEmCacheBackend(ModelBackend):
+    """ModelBackend que lê o usuário da sessão do cache antes de ir ao banco."""
+
+    def get_user(self, user_id):
+        chave = chave_usuario(user_id)
+        usuario = cache.get(chave)
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is None:
+                return None
+            cache.set(chave, usuario, getattr(settings, 'USUARIO_CACHE_SEGUNDOS', TEMPO_CACHE))
+        # Usuários desativados depois de entrar no cache também são recusados (a invalidação cobre o caso comum).
+        return usuario if self.user_can_authenticate(usuario) else None
@@ -0,0 +1,50 @@
+"""
+Passa as sessões abertas com o ModelBackend para o UsuarioEmCacheBackend.
+
+A sessão guarda o caminho do backend que autenticou o usuário, e o Django só a aceita se esse
+caminho estiver em AUTHENTICATION_BACKENDS, de onde o ModelBackend saiu. Só as sessões gravadas
+no banco (perfis 'db' e 'cached_db') podem ser percorridas; nos perfis 'cache' e 'signed_cookies'
+quem entrou antes da troca precisa entrar de novo.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core.cache import caches
+from django.db import migrations
+
+ANTIGO = 'django.contrib.auth.backends.ModelBackend'
+NOVO = 'accounts.backends.UsuarioEmCacheBackend'
+
+
+def trocar_backend(apps, schema_editor, de=ANTIGO, para=NOVO):
+    from django.contrib.sessions.backends.cached_db import KEY_PREFIX
+    from django.contrib.sessions.backends.db import SessionStore
+
+    sessoes = apps.get_model('sessions', 'Session').objects.using(schema_editor.connection.alias)
+    loja = SessionStore()
+    # As alterações são gravadas depois da leitura, para não atualizar a tabela com o cursor aberto.
+    alteradas = {}
+    for chave, texto in sessoes.values_list('session_key', 'session_data').iterator(chunk_size=2000):
+        dados = loja.decode(texto)
+        if dados.get(BACKEND_SESSION_KEY) == de:
+            dados[BACKEND_SESSION_KEY] = para
+            alteradas[chave] = loja.encode(dados)
+    cache_sessoes = caches[settings.SESSION_CACHE_ALIAS]
+    for chave, texto in alteradas.items():
+        sessoes.filter(pk=chave).update(session_data=texto)
+        # A cópia do perfil 'cached_db' ainda tem o caminho antigo: é relida do banco.
+        cache_sessoes.delete(KEY_PREFIX + chave)
+
+
+def desfazer(apps, schema_editor):
+    trocar_backend(apps, schema_editor, de=NOVO, para=ANTIGO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(trocar_backend, desfazer),
+    ]
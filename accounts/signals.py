@@ -0,0 +1,16 @@
+# Receptores de sinais do app accounts, conectados em AccountsConfig.ready().
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidar_usuario
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidar_usuario_em_cache(sender, instance, **kwargs):
+    """Remove o usuário do cache do backend já e de novo depois do commit, para não guardar uma versão antiga."""
+    user_id = instance.pk
+    invalidar_usuario(user_id)
+    transaction.on_commit(lambda: invalidar_usuario(user_id))
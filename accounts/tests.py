@@ -1,3 +1,94 @@
-from django.test import TestCase
+import importlib
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .backends import UsuarioEmCacheBackend, chave_usuario
+
+
+class UsuarioEmCacheBackendTests(TestCase):
+    """Testes do backend que guarda o usuário logado no cache."""
+
+    url = reverse('poderoso_apps:topics')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user, backend='accounts.backends.UsuarioEmCacheBackend')
+
+    def test_usuario_lido_do_cache(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(chave_usuario(self.user.id)))
+        # Sessão, validador da página e tópicos; o usuário não é mais consultado.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_troca_de_senha_encerra_a_sessao(self):
+        self.client.get(self.url)
+        self.user.set_password('outra-senha-456')
+        self.user.save()
+        self.assertIsNone(cache.get(chave_usuario(self.user.id)))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_alteracoes_invalidam_o_cache(self):
+        self.client.get(self.url)
+        User.objects.filter(pk=self.user.pk).update(first_name='Ana')
+        # update() não dispara sinais; o save() sim.
+        self.assertEqual(UsuarioEmCacheBackend().get_user(self.user.id).first_name, '')
+        usuario = User.objects.get(pk=self.user.pk)
+        usuario.save()
+        self.assertEqual(UsuarioEmCacheBackend().get_user(self.user.id).first_name, 'Ana')
+
+    def test_usuario_inativo_recusado(self):
+        self.client.get(self.url)
+        usuario = cache.get(chave_usuario(self.user.id))
+        usuario.is_active = False
+        cache.set(chave_usuario(self.user.id), usuario)
+        self.assertIsNone(UsuarioEmCacheBackend().get_user(self.user.id))
+
+    def test_usuario_apagado(self):
+        self.client.get(self.url)
+        self.user.delete()
+        self.assertIsNone(UsuarioEmCacheBackend().get_user(self.user.id))
+
+    def test_login_errado_confere_a_senha_uma_vez(self):
+        self.client.logout()
+        with mock.patch.object(ModelBackend, 'authenticate', autospec=True,
+                               side_effect=ModelBackend.authenticate) as autenticar:
+            response = self.client.post(reverse('accounts:login'), {'username': 'aluno', 'password': 'errada'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(autenticar.call_count, 1)
+
+    @override_settings(USUARIO_CACHE_SEGUNDOS=5)
+    def test_tempo_no_cache(self):
+        with mock.patch.object(cache, 'set') as guardar:
+            UsuarioEmCacheBackend().get_user(self.user.id)
+        self.assertEqual(guardar.call_args.args[2], 5)
+
+    def test_sessoes_do_model_backend_sao_migradas(self):
+        sessao = SessionStore()
+        sessao.update({
+            '_auth_user_id': str(self.user.pk), '_auth_user_backend': 'django.contrib.auth.backends.ModelBackend',
+            '_auth_user_hash': self.user.get_session_auth_hash(),
+        })
+        sessao.create()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = sessao.session_key
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+        migracao = importlib.import_module('accounts.migrations.0001_sessoes_usuario_em_cache')
+        migracao.trocar_backend(apps, mock.Mock(connection=connection))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(SessionStore(sessao.session_key)['_auth_user_backend'], 'accounts.backends.UsuarioEmCacheBackend')
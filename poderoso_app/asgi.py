@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'poderoso_app.settings')
+# Servidor ASGI: usa as views async das páginas de leitura (ver VIEWS_ASYNC no settings).
+os.environ.setdefault('DJANGO_VIEWS_ASYNC', '1')
 
 application = get_asgi_application()
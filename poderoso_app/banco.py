@@ -0,0 +1,30 @@
+"""
+Parâmetros de banco de dados compartilhados pelos perfis de configuração.
+"""
+
+# PRAGMAs aplicados a cada nova conexão SQLite em produção:
+# - WAL deixa leitores e o escritor trabalharem ao mesmo tempo;
+# - synchronous=NORMAL é seguro com WAL e evita um fsync por commit;
+# - busy_timeout faz a conexão esperar pelo lock em vez de falhar com "database is locked";
+# - mmap e cache_size (negativo = KiB) reduzem leituras ao disco.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def opcoes_sqlite(pragmas=SQLITE_PRAGMAS):
+    """
+    Monta o OPTIONS do DATABASES para SQLite.
+
+    'transaction_mode': 'IMMEDIATE' pega o lock de escrita já no BEGIN; assim uma transação que lê
+    e depois escreve espera na fila (busy_timeout) em vez de falhar ao tentar promover o lock.
+    """
+    return {
+        'init_command': ';'.join(f'PRAGMA {nome}={valor}' for nome, valor in pragmas.items()),
+        'transaction_mode': 'IMMEDIATE',
+    }
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,8 +51,20 @@ INSTALLED_APPS = [
     
 ]
 
+# Medição das requisições (Server-Timing e histogramas expostos em /metricas/ para usuários staff).
+# Opcional: custa alguns perf_counter() por requisição e consulta e expõe tempos internos no
+# Server-Timing. Desligada aqui (desenvolvimento e testes); DJANGO_METRICAS=1 liga, e o perfil de
+# produção liga por padrão. Com ela desligada, nem o middleware nem o backend medido são instalados.
+METRICAS_ATIVAS = os.environ.get('DJANGO_METRICAS', '0') == '1'
+METRICAS_MIDDLEWARE = 'poderoso_apps.metricas.MetricasMiddleware'
+METRICAS_TEMPLATES = 'poderoso_apps.metricas.TemplatesMedidos'
+
 MIDDLEWARE = [
+    # Primeiro da lista para medir o tempo de toda a pilha (ver poderoso_apps/metricas.py).
+    *([METRICAS_MIDDLEWARE] if METRICAS_ATIVAS else []),
     'django.middleware.security.SecurityMiddleware',
+    # Arquivos estáticos de STATIC_ROOT, antes da sessão e da autenticação (ver poderoso_apps/estaticos.py).
+    'poderoso_apps.estaticos.EstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,7 +77,8 @@ ROOT_URLCONF = 'poderoso_app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Com as métricas, DjangoTemplates com medição do tempo de renderização para o Server-Timing.
+        'BACKEND': METRICAS_TEMPLATES if METRICAS_ATIVAS else 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -127,9 +141,54 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = '/static/'
+# Destino do collectstatic, servido pelo EstaticosMiddleware com as variantes .br/.gz.
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+# Tempo de cache (segundos) dos estáticos sem hash no nome; os com hash recebem immutable.
+STATIC_CACHE_MAX_AGE = 3600
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/poderoso_apps'
 
+# Entrega dos arquivos de MEDIA_ROOT pela view servir_media.
+# MEDIA_SENDFILE: None (o Django envia o arquivo), 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache/lighttpd).
+# Com nginx, MEDIA_ACCEL_PREFIX deve apontar para uma location "internal" com alias para MEDIA_ROOT.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Tempo de cache (segundos) para arquivos cujo nome não contém o hash do conteúdo.
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Views assíncronas para as páginas de leitura (ver poderoso_apps/views_async.py).
+# O asgi.py liga por padrão; no WSGI as versões síncronas são mais rápidas.
+VIEWS_ASYNC = os.environ.get('DJANGO_VIEWS_ASYNC', '0') == '1'
+
+# Cache do catálogo de planos e das páginas de detalhes (ver poderoso_apps/cache.py).
+# Em memória, por processo; o perfil de produção usa um cache compartilhado.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'poderoso',
+    }
+}
+
+# Perfil das sessões (DJANGO_SESSION_PROFILE). Com 'db' cada requisição logada lê django_session;
+# 'cached_db' lê do cache e só vai ao banco quando a sessão muda ou some do cache; 'cache' não
+# usa o banco (a sessão se perde se o cache for limpo); 'signed_cookies' guarda a sessão assinada
+# no próprio cookie, sem estado no servidor (o logout não invalida cópias antigas do cookie).
+PERFIS_SESSAO = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = PERFIS_SESSAO[os.environ.get('DJANGO_SESSION_PROFILE', 'db')]
+
+# O usuário logado é lido do cache (ver accounts/backends.py). É o único backend: com o ModelBackend
+# também na lista, cada login errado conferiria a senha (PBKDF2) duas vezes. As sessões abertas com
+# o ModelBackend são passadas para ele pela migração accounts 0001.
+AUTHENTICATION_BACKENDS = ['accounts.backends.UsuarioEmCacheBackend']
+# Segundos que o usuário fica no cache. O CACHES daqui é por processo e a invalidação não chega
+# aos outros workers, então o tempo é curto; o perfil de produção usa um cache compartilhado.
+USUARIO_CACHE_SEGUNDOS = 30
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -139,4 +198,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = 'poderoso_apps:index'
 LOGOUT_REDIRECT_URL = 'poderoso_apps:index'
-LOGIN_URL = 'accounts:login'
\ No newline at end of file
+LOGIN_URL = 'accounts:login'
+
+# Processos usados para gerar miniaturas/WebP das imagens dos exercícios (0 = gera na própria requisição).
+IMAGENS_DERIVADOS_WORKERS = 2
+
+# Sincronização do aplicativo (ver poderoso_apps/sincronizacao.py): linhas por tipo em cada resposta,
+# atraso (segundos) para as transações em andamento confirmarem e dias que as exclusões são guardadas.
+SYNC_LIMITE = 500
+SYNC_JANELA_SEGUNDOS = 2
+SYNC_RETENCAO_DIAS = 90
@@ -0,0 +1,89 @@
+"""
+Perfil de produção do poderoso_app.
+
+Selecione com DJANGO_SETTINGS_MODULE=poderoso_app.settings_producao. Variáveis de ambiente:
+
+    DJANGO_SECRET_KEY, DJANGO_ALLOWED_HOSTS (separados por vírgula)
+    DJANGO_DB_ENGINE      'sqlite' (padrão) ou 'postgresql'
+    DJANGO_DB_NAME        arquivo do SQLite ou nome do banco PostgreSQL
+    DJANGO_DB_USER, DJANGO_DB_PASSWORD, DJANGO_DB_HOST, DJANGO_DB_PORT   (PostgreSQL)
+    DJANGO_DB_POOL_MAX    tamanho máximo do pool de conexões do PostgreSQL (padrão 10)
+    DJANGO_CONN_MAX_AGE   segundos que uma conexão SQLite é reaproveitada (padrão 600)
+    DJANGO_CACHE_DIR      pasta do cache compartilhado entre os workers (padrão BASE_DIR/cache)
+    DJANGO_SESSION_PROFILE  'cached_db' (padrão), 'cache', 'signed_cookies' ou 'db' (ver PERFIS_SESSAO)
+    DJANGO_STATIC_ROOT    destino do collectstatic (padrão BASE_DIR/staticfiles)
+    DJANGO_METRICAS       '1' (padrão) mede as requisições (Server-Timing e /metricas/); '0' desliga
+
+Rode 'python manage.py collectstatic' a cada deploy: os estáticos ganham o hash do conteúdo no
+nome e as variantes .gz/.br, servidas pelo próprio Django (EstaticosMiddleware).
+"""
+import os
+
+from .banco import opcoes_sqlite
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, METRICAS_MIDDLEWARE, METRICAS_TEMPLATES, MIDDLEWARE, PERFIS_SESSAO, SECRET_KEY, TEMPLATES
+
+DEBUG = False
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+if os.environ.get('DJANGO_DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'poderoso_app'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            # Pool de conexões do psycopg 3 (requer 'psycopg[pool]'); com pool, CONN_MAX_AGE fica em 0.
+            'OPTIONS': {
+                'pool': {
+                    'min_size': 2,
+                    'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # Conexões persistentes: os PRAGMAs e o handshake são pagos uma vez por worker, não por requisição.
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': opcoes_sqlite(),
+        }
+    }
+
+# O cache em memória é por processo: com vários workers, as versões invalidadas em um deles
+# não seriam vistas pelos outros. O cache em arquivo é compartilhado por todos os processos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Com o cache compartilhado, a invalidação do usuário logado vale para todos os workers.
+USUARIO_CACHE_SEGUNDOS = 60 * 60
+
+# Sessões lidas do cache compartilhado: a requisição logada não consulta nem trava o SQLite.
+SESSION_ENGINE = PERFIS_SESSAO[os.environ.get('DJANGO_SESSION_PROFILE', 'cached_db')]
+
+# Nomes com hash (manifesto) e variantes pré-comprimidas geradas no collectstatic.
+# Só aqui: o manifesto exige o collectstatic, que não roda no desenvolvimento nem nos testes.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'poderoso_apps.estaticos.ArmazenamentoComprimido'},
+}
+
+# Medição das requisições, ligada por padrão em produção (ver METRICAS_ATIVAS em settings.py).
+METRICAS_ATIVAS = os.environ.get('DJANGO_METRICAS', '1') == '1'
+MIDDLEWARE = [m for m in MIDDLEWARE if m != METRICAS_MIDDLEWARE]
+if METRICAS_ATIVAS:
+    MIDDLEWARE.insert(0, METRICAS_MIDDLEWARE)
+    TEMPLATES = [{**TEMPLATES[0], 'BACKEND': METRICAS_TEMPLATES}]
@@ -1,14 +1,223 @@
+import codecs
+
+from django import forms
 # Importa o módulo admin do Django, que fornece funcionalidades para criar interfaces administrativas.
-from django.contrib import admin  
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.auth.models import Group
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from . import busca, clonagem, importacao
 # Importa os modelos que serão registrados no painel administrativo.
-from .models import Topic, Entry, PlanoTreino, Exercicio  
+from .models import Topic, Entry, PlanoTreino, Exercicio, SessaoTreino, RegistroSerie, ResumoTreinoDiario
+from .paginacao import PaginadorEstimado
+
+
+class AdminEscalavel(admin.ModelAdmin):
+    """
+    Base dos admins das tabelas que crescem com o uso.
+
+    Contagem estimada nas listas sem filtro e sem o segundo COUNT(*) do total geral; as chaves
+    estrangeiras usam raw_id_fields/autocomplete_fields em vez de um <select> com a tabela inteira.
+    """
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class BuscaTextualMixin:
+    """Busca do admin pelo índice FTS5 (busca.filtrar), somada à busca exata pelo username do dono."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        por_dono, _ = super().get_search_results(request, queryset, search_term)
+        return busca.filtrar(queryset, search_term) | por_dono, False
+
+
+class ImportarPlanosForm(forms.Form):
+    """Formulário da página de importação de planos do admin."""
+    arquivo = forms.FileField(help_text='CSV ou JSON Lines, uma linha por exercício (mesmo formato da exportação).')
+    formato = forms.ChoiceField(choices=[('', 'Pela extensão do arquivo'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')],
+                                required=False)
+    lote = forms.IntegerField(min_value=1, initial=importacao.TAMANHO_LOTE, help_text='Linhas gravadas por transação.')
+
+
+class ClonarPlanosForm(forms.Form):
+    """Destinatários da ação de clonar planos: usernames e/ou um grupo inteiro."""
+    usuarios = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 8, 'cols': 40}), required=False,
+        help_text='Usernames, um por linha ou separados por vírgula.',
+    )
+    grupo = forms.ModelChoiceField(Group.objects.all(), required=False, help_text='Todos os usuários ativos do grupo.')
+
+    def clean(self):
+        dados = super().clean()
+        usernames = (dados.get('usuarios') or '').replace(',', '\n').split()
+        owner_ids, desconhecidos = clonagem.ids_dos_usuarios(usernames, dados.get('grupo'))
+        if desconhecidos:
+            raise forms.ValidationError(f'Usuários inexistentes: {", ".join(desconhecidos[:20])}')
+        if not owner_ids:
+            raise forms.ValidationError('Informe ao menos um usuário ou um grupo com usuários.')
+        dados['owner_ids'] = owner_ids
+        return dados
+
+
+def _exportar(planos, formato):
+    """Resposta em streaming com os planos selecionados e seus exercícios."""
+    extensao = 'csv' if formato == 'csv' else 'jsonl'
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    resposta = StreamingHttpResponse(
+        importacao.escrever(importacao.linhas_exportacao(planos), formato), content_type=f'{tipo}; charset=utf-8',
+    )
+    resposta['Content-Disposition'] = f'attachment; filename="planos.{extensao}"'
+    return resposta
+
+
+class ExercicioInline(admin.TabularInline):
+    """Exercícios editados na própria página do plano."""
+    model = Exercicio
+    fields = ('nome', 'series', 'repeticoes', 'intervalo', 'imagens')
+    extra = 0
+    show_change_link = True
+
+
+# Registra o modelo PlanoTreino com os exercícios inline, ações de exportação e a página de importação em lote.
+@admin.register(PlanoTreino)
+class PlanoTreinoAdmin(AdminEscalavel):
+    change_list_template = 'admin/poderoso_apps/planotreino/change_list.html'
+    actions = ['exportar_csv', 'exportar_jsonl', 'clonar_para_usuarios']
+    list_display = ('nome', 'owner', 'publico', 'tempo_estimado')
+    list_filter = ('publico',)
+    list_select_related = ('owner',)
+    autocomplete_fields = ('owner',)
+    # '=' vira igualdade (usa o índice único do username); '^' vira "começa com".
+    search_fields = ('^nome', '=owner__username')
+    inlines = [ExercicioInline]
+
+    @admin.action(description='Exportar planos selecionados (CSV)')
+    def exportar_csv(self, request, queryset):
+        return _exportar(queryset, 'csv')
+
+    @admin.action(description='Exportar planos selecionados (JSON Lines)')
+    def exportar_jsonl(self, request, queryset):
+        return _exportar(queryset, 'jsonl')
+
+    @admin.action(description='Clonar planos selecionados para usuários', permissions=['add'])
+    def clonar_para_usuarios(self, request, queryset):
+        """Página intermediária com os destinatários; cada plano vira uma cópia privada de cada usuário."""
+        form = ClonarPlanosForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            for modelo in queryset:
+                planos, exercicios = clonagem.clonar_plano(modelo, form.cleaned_data['owner_ids'])
+                self.message_user(request, (
+                    f'"{modelo.nome}": {len(planos)} planos e {exercicios} exercícios criados; '
+                    f'{len(form.cleaned_data["owner_ids"]) - len(planos)} usuários já tinham o plano.'
+                ), messages.SUCCESS)
+            return None
+        return TemplateResponse(request, 'admin/poderoso_apps/planotreino/clonar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Clonar planos para usuários',
+            'form': form,
+            'planos': queryset,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    def get_urls(self):
+        urls = [path('importar/', self.admin_site.admin_view(self.importar), name='poderoso_apps_planotreino_importar')]
+        return urls + super().get_urls()
+
+    def importar(self, request):
+        """Importa um arquivo de planos; linhas sem owner ficam com o usuário logado."""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = ImportarPlanosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            formato = form.cleaned_data['formato'] or importacao.formato_do_nome(arquivo.name)
+            try:
+                resultado = importacao.importar(
+                    importacao.ler(codecs.iterdecode(arquivo, 'utf-8-sig'), formato),
+                    tamanho_lote=form.cleaned_data['lote'], owner_padrao=request.user.get_username(),
+                )
+            except (ValueError, UnicodeDecodeError) as erro:
+                form.add_error('arquivo', str(erro))
+            else:
+                r = resultado.como_dict()
+                self.message_user(request, (
+                    f"Planos: {r['planos_criados']} criados, {r['planos_atualizados']} atualizados. "
+                    f"Exercícios: {r['exercicios_criados']} criados, {r['exercicios_atualizados']} atualizados."
+                ), messages.SUCCESS)
+                for erro in resultado.erros:
+                    self.message_user(request, erro, messages.WARNING)
+                if resultado.total_erros > len(resultado.erros):
+                    self.message_user(request, f'... e mais {resultado.total_erros - len(resultado.erros)} linhas com erro.',
+                                      messages.WARNING)
+                return redirect('admin:poderoso_apps_planotreino_changelist')
+        return TemplateResponse(request, 'admin/poderoso_apps/planotreino/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar planos',
+            'form': form,
+        })
+
 
 # Registra o modelo Topic no painel administrativo do Django.
-admin.site.register(Topic)  
+@admin.register(Topic)
+class TopicAdmin(BuscaTextualMixin, AdminEscalavel):
+    list_display = ('text', 'owner', 'date_added')
+    list_select_related = ('owner',)
+    autocomplete_fields = ('owner',)
+    search_fields = ('=owner__username',)
+    search_help_text = 'Busca no texto dos tópicos ou pelo username exato do dono.'
+
+
 # Registra o modelo Entry no painel administrativo do Django.
-admin.site.register(Entry)  
-# Registra o modelo PlanoTreino no painel administrativo do Django.
-admin.site.register(PlanoTreino)  
+@admin.register(Entry)
+class EntryAdmin(BuscaTextualMixin, AdminEscalavel):
+    list_display = ('__str__', 'topic', 'date_added')
+    list_select_related = ('topic',)
+    raw_id_fields = ('topic',)
+    search_fields = ('=topic__owner__username',)
+    search_help_text = 'Busca no texto das entradas ou pelo username exato do dono.'
+
+
 # Registra o modelo Exercicio no painel administrativo do Django.
-admin.site.register(Exercicio)  
-# Comentário indicando que aqui é o local para registrar modelos adicionais, se necessário.
+@admin.register(Exercicio)
+class ExercicioAdmin(AdminEscalavel):
+    list_display = ('nome', 'plano', 'series', 'repeticoes', 'intervalo', 'duracao_estimada')
+    list_select_related = ('plano',)
+    autocomplete_fields = ('plano',)
+    search_fields = ('^nome', '=plano__owner__username')
+
+
+# Registra as sessões de treino e o histórico de séries de cada usuário.
+@admin.register(SessaoTreino)
+class SessaoTreinoAdmin(AdminEscalavel):
+    list_display = ('owner', 'plano', 'iniciada_em', 'finalizada_em')
+    list_select_related = ('owner', 'plano')
+    raw_id_fields = ('owner', 'plano', 'exercicios_concluidos')
+    list_filter = (('finalizada_em', admin.EmptyFieldListFilter),)
+    search_fields = ('=owner__username',)
+
+
+@admin.register(RegistroSerie)
+class RegistroSerieAdmin(AdminEscalavel):
+    list_display = ('exercicio', 'numero', 'repeticoes', 'owner', 'plano', 'registrada_em')
+    list_select_related = ('exercicio', 'owner', 'plano')
+    raw_id_fields = ('sessao', 'owner', 'plano', 'exercicio')
+    # Filtra pelo dono, coluna inicial dos índices serie_owner_*.
+    search_fields = ('=owner__username',)
+
+
+@admin.register(ResumoTreinoDiario)
+class ResumoTreinoDiarioAdmin(AdminEscalavel):
+    list_display = ('owner', 'dia', 'plano', 'exercicios', 'series', 'volume', 'minutos')
+    list_select_related = ('owner', 'plano')
+    raw_id_fields = ('owner', 'plano')
+    search_fields = ('=owner__username',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PoderosoAppsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'poderoso_apps'
+
+    def ready(self):
+        # Registra os receptores de sinais (derivados de imagens etc.).
+        from . import signals  # noqa: F401
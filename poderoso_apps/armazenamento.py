@@ -0,0 +1,80 @@
+"""
+Armazenamento endereçado por conteúdo das imagens dos exercícios (Exercicio.imagens).
+
+O Storage padrão renomeia os envios com nomes repetidos (sup.png, sup_MRg9DGg.png, ...) e guarda
+uma cópia de cada. Aqui o arquivo é gravado com o SHA-256 do conteúdo como nome,
+em conteudo/ab/cd/<sha256>.<ext>: o mesmo conteúdo enviado várias vezes ocupa o disco uma vez só.
+O hash é calculado enquanto o envio é copiado em blocos para um arquivo temporário, que depois é
+movido para o nome final (ou descartado, se o conteúdo já existia).
+
+Como o nome muda sempre que o conteúdo muda, os arquivos são servidos como imutáveis, com cache
+longo (ver arquivos.nome_com_hash). O número de exercícios que usam cada arquivo fica em
+ImagemConteudo (ver ImagemConteudo.ajustar), e o comando limpar_imagens apaga os que ficaram sem
+referências.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+PASTA_CONTEUDO = 'conteudo'
+PASTA_TEMPORARIA = 'tmp'
+
+
+def nome_por_conteudo(hash_hex, nome_original):
+    """Nome relativo ao MEDIA_ROOT do arquivo com o hash 'hash_hex' (a extensão vem do original)."""
+    extensao = os.path.splitext(nome_original)[1].lower()
+    return f'{PASTA_CONTEUDO}/{hash_hex[:2]}/{hash_hex[2:4]}/{hash_hex}{extensao}'
+
+
+def e_conteudo(nome):
+    """Indica se 'nome' foi gravado por ArmazenamentoPorConteudo (e por isso tem contagem de referências)."""
+    return bool(nome) and nome.startswith(f'{PASTA_CONTEUDO}/')
+
+
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """FileSystemStorage que grava cada conteúdo distinto uma única vez, com o hash como nome."""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome final é o hash: dois envios com o mesmo nome original não colidem, e o mesmo
+        # conteúdo deve cair no mesmo arquivo em vez de ganhar um sufixo aleatório.
+        return name
+
+    def _save(self, name, content):
+        pasta_temporaria = self.path(f'{PASTA_CONTEUDO}/{PASTA_TEMPORARIA}')
+        os.makedirs(pasta_temporaria, exist_ok=True)
+        hash_conteudo = hashlib.sha256()
+        descritor, temporario = tempfile.mkstemp(dir=pasta_temporaria)
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloco in content.chunks():
+                    hash_conteudo.update(bloco)
+                    destino.write(bloco)
+            nome = nome_por_conteudo(hash_conteudo.hexdigest(), name)
+            caminho = self.path(nome)
+            if os.path.exists(caminho):
+                # Conteúdo já armazenado: a data renovada protege o arquivo do limpar_imagens
+                # até o exercício que acabou de enviá-lo ser gravado.
+                os.utime(caminho)
+                return nome
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporario, self.file_permissions_mode)
+            # Atômico no mesmo sistema de arquivos: quem lê nunca vê um arquivo pela metade.
+            os.replace(temporario, caminho)
+            temporario = None
+            return nome
+        finally:
+            if temporario is not None:
+                os.unlink(temporario)
+
+
+armazenamento_imagens = ArmazenamentoPorConteudo()
+
+
+def obter_armazenamento():
+    """Storage de Exercicio.imagens; passado como callable para não entrar nas migrações."""
+    return armazenamento_imagens
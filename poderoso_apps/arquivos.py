@@ -0,0 +1,162 @@
+"""
+Entrega de arquivos do disco (imagens enviadas) com cache HTTP, Range e repasse ao proxy.
+
+- ETag forte e Last-Modified, respondendo 304 às requisições condicionais;
+- Cache-Control de longo prazo (immutable) para nomes que contêm o hash do conteúdo;
+- requisições Range de um único intervalo (206/416);
+- repasse da transferência ao proxy via X-Accel-Redirect (nginx) ou X-Sendfile (Apache/lighttpd);
+- sem proxy, FileResponse entrega o arquivo aberto, e servidores como o gunicorn usam os.sendfile;
+- variantes pré-comprimidas (arquivo.css.br, arquivo.css.gz) com Content-Encoding (ver estaticos.py).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Um ano: o máximo recomendado para recursos que nunca mudam.
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+# Nomes com o hash do conteúdo: "arquivo.3f2a9c1b7e4d.css", "3f2a...e4d.png" (sha256, ver armazenamento.py)
+# ou um derivado dele, "3f2a...e4d-250w.webp".
+NOME_COM_HASH = re.compile(r'(^|[._-])[0-9a-f]{12,64}(-\d+w)?\.[A-Za-z0-9]+$')
+INTERVALO = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Sufixo no disco de cada Content-Encoding pré-gerado.
+SUFIXOS = {'br': '.br', 'gzip': '.gz'}
+
+
+def nome_com_hash(caminho):
+    """Indica se o nome do arquivo contém o hash do conteúdo (e portanto nunca muda)."""
+    return bool(NOME_COM_HASH.search(os.path.basename(caminho)))
+
+
+def _etag(caminho, estado):
+    if nome_com_hash(caminho):
+        # O próprio nome já identifica o conteúdo.
+        return '"%s"' % os.path.splitext(os.path.basename(caminho))[0].rsplit('.', 1)[-1]
+    return '"%x-%x"' % (estado.st_size, estado.st_mtime_ns)
+
+
+def _intervalo(request, tamanho, etag):
+    """
+    Interpreta o cabeçalho Range e retorna (inicio, fim) inclusivos, None para o arquivo inteiro
+    ou False quando o intervalo não pode ser atendido.
+    """
+    cabecalho = request.headers.get('Range')
+    if not cabecalho or request.method not in ('GET', 'HEAD'):
+        return None
+    # If-Range com outra versão do arquivo: envia o arquivo inteiro.
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    encontrado = INTERVALO.match(cabecalho.strip())
+    if not encontrado or encontrado.groups() == ('', ''):
+        # Vários intervalos ou sintaxe desconhecida: o cabeçalho pode ser ignorado (RFC 9110).
+        return None
+    inicio, fim = encontrado.groups()
+    if inicio == '':
+        # "bytes=-500": os últimos 500 bytes.
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+class _Trecho:
+    """Arquivo limitado a um intervalo; expõe fileno() para que o servidor possa usar sendfile."""
+
+    def __init__(self, arquivo, tamanho):
+        self.arquivo = arquivo
+        self.restante = tamanho
+
+    def read(self, tamanho=-1):
+        if self.restante <= 0:
+            return b''
+        if tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self.arquivo.read(tamanho)
+        self.restante -= len(dados)
+        return dados
+
+    def fileno(self):
+        return self.arquivo.fileno()
+
+    def close(self):
+        self.arquivo.close()
+
+
+def servir_arquivo(request, raiz, caminho, sendfile=None, prefixo_accel='', max_age=3600, codificacao=None):
+    """
+    Responde com o arquivo 'caminho' (relativo a 'raiz').
+
+    'sendfile' pode ser 'x-accel-redirect', 'x-sendfile' ou None (o próprio Django entrega o arquivo).
+    'codificacao' ('br' ou 'gzip') entrega a variante pré-comprimida do arquivo, que fica ao lado
+    dele com o sufixo de SUFIXOS; o tipo e a política de cache continuam sendo os do original.
+    """
+    try:
+        completo = safe_join(raiz, caminho + SUFIXOS[codificacao] if codificacao else caminho)
+        estado = os.stat(completo)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not os.path.isfile(completo):
+        raise Http404
+
+    etag = _etag(caminho, estado)
+    if codificacao:
+        # Cada codificação é uma representação diferente e precisa de um ETag próprio.
+        etag = f'{etag[:-1]}-{codificacao}"'
+    base = HttpResponse()
+    base['ETag'] = etag
+    base['Last-Modified'] = http_date(estado.st_mtime)
+    base['Cache-Control'] = CACHE_IMUTAVEL if nome_com_hash(caminho) else f'public, max-age={max_age}'
+    base['Accept-Ranges'] = 'bytes'
+    if codificacao:
+        base['Content-Encoding'] = codificacao
+
+    # 304 (ou 412) antes de abrir o arquivo.
+    condicional = get_conditional_response(request, etag=etag, last_modified=estado.st_mtime, response=base)
+    if condicional is not base:
+        return condicional
+
+    tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+
+    if sendfile:
+        # O proxy lê o arquivo do disco e trata Range sozinho; o worker fica livre na hora.
+        base['Content-Type'] = tipo
+        if sendfile == 'x-accel-redirect':
+            base['X-Accel-Redirect'] = prefixo_accel.rstrip('/') + '/' + quote(caminho.lstrip('/'))
+        else:
+            base['X-Sendfile'] = completo
+        return base
+
+    intervalo = _intervalo(request, estado.st_size, etag)
+    if intervalo is False:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{estado.st_size}'
+        return resposta
+
+    if request.method == 'HEAD':
+        resposta, tamanho = base, estado.st_size
+        resposta['Content-Type'] = tipo
+    elif intervalo is None:
+        resposta = FileResponse(open(completo, 'rb'), content_type=tipo)
+        tamanho = estado.st_size
+    else:
+        inicio, fim = intervalo
+        tamanho = fim - inicio + 1
+        arquivo = open(completo, 'rb')
+        arquivo.seek(inicio)
+        resposta = FileResponse(_Trecho(arquivo, tamanho), content_type=tipo, status=206)
+        resposta['Content-Range'] = f'bytes {inicio}-{fim}/{estado.st_size}'
+
+    for cabecalho in ('ETag', 'Last-Modified', 'Cache-Control', 'Accept-Ranges', 'Content-Encoding'):
+        if cabecalho in base:
+            resposta[cabecalho] = base[cabecalho]
+    resposta['Content-Length'] = tamanho
+    return resposta
@@ -0,0 +1,118 @@
+"""
+Busca textual nos tópicos e entradas de um usuário.
+
+No SQLite usa a tabela FTS5 'poderoso_apps_busca' (criada na migração 0014 e mantida por
+triggers), com ranking bm25 e trechos destacados. Nos outros bancos faz um icontains simples.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Entry, Topic
+
+TABELA = 'poderoso_apps_busca'
+# Marcadores de destaque que não aparecem em texto digitado; viram <mark> depois do escape.
+INICIO, FIM = '\x02', '\x03'
+
+
+def _consulta_fts(termos):
+    """Monta a expressão MATCH com cada termo entre aspas (sem operadores do usuário) e como prefixo."""
+    return ' '.join('"%s"*' % termo.replace('"', '""') for termo in termos)
+
+
+def _destacar(trecho):
+    return mark_safe(escape(trecho).replace(INICIO, '<mark>').replace(FIM, '</mark>'))
+
+
+def buscar(owner, texto, limite=50):
+    """
+    Retorna os resultados de 'texto' entre os tópicos e entradas de 'owner', do mais relevante ao menos.
+
+    Cada resultado é um dicionário com 'tipo' ('topic' ou 'entry'), 'id', 'topic_id' e 'trecho' (HTML seguro).
+    """
+    termos = texto.split()
+    if not termos:
+        return []
+    if connection.vendor != 'sqlite':
+        return _buscar_sem_fts(owner, termos, limite)
+
+    sql = f"""
+        SELECT rowid, topic_id, snippet({TABELA}, 0, %s, %s, '…', 16)
+        FROM {TABELA}
+        WHERE {TABELA} MATCH %s
+        ORDER BY bm25({TABELA}, 1.0, 0.0)
+        LIMIT %s
+    """
+    expressao = f'owner:u{owner.pk} AND text:({_consulta_fts(termos)})'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [INICIO, FIM, expressao, limite])
+        linhas = cursor.fetchall()
+    return [
+        {
+            'tipo': 'entry' if rowid % 2 else 'topic',
+            'id': rowid // 2,
+            'topic_id': topic_id,
+            'trecho': _destacar(trecho),
+        }
+        for rowid, topic_id, trecho in linhas
+    ]
+
+
+def _buscar_sem_fts(owner, termos, limite):
+    """Busca simples (sem ranking) para bancos sem FTS5."""
+    topicos = Topic.objects.filter(owner=owner)
+    entradas = Entry.objects.filter(topic__owner=owner)
+    for termo in termos:
+        topicos = topicos.filter(text__icontains=termo)
+        entradas = entradas.filter(text__icontains=termo)
+    resultados = [
+        {'tipo': 'topic', 'id': t.id, 'topic_id': t.id, 'trecho': escape(t.text)}
+        for t in topicos.order_by('-date_added')[:limite]
+    ]
+    resultados += [
+        {'tipo': 'entry', 'id': e.id, 'topic_id': e.topic_id, 'trecho': escape(e.text[:200])}
+        for e in entradas.order_by('-date_added')[:limite - len(resultados)]
+    ]
+    return resultados
+
+
+def filtrar(queryset, texto):
+    """
+    Filtra um queryset de Topic ou Entry pelos termos de 'texto', de todos os usuários (usado no admin).
+
+    No SQLite a filtragem é um "id IN (subconsulta no índice FTS5)", sem varrer a tabela.
+    """
+    termos = texto.split()
+    if not termos:
+        return queryset
+    if connection.vendor != 'sqlite':
+        for termo in termos:
+            queryset = queryset.filter(text__icontains=termo)
+        return queryset
+    # rowid par para tópicos e ímpar para entradas (ver migração 0014).
+    resto = 1 if queryset.model is Entry else 0
+    ids = RawSQL(
+        f'SELECT rowid / 2 FROM {TABELA} WHERE {TABELA} MATCH %s AND rowid % 2 = %s',
+        [f'text:({_consulta_fts(termos)})', resto],
+    )
+    return queryset.filter(id__in=ids)
+
+
+def reconstruir():
+    """Recria todo o índice a partir das tabelas de tópicos e entradas. Retorna o número de linhas indexadas."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA}')
+        cursor.execute(f"""
+            INSERT INTO {TABELA}(rowid, text, owner, topic_id)
+            SELECT id * 2, text, 'u' || owner_id, id FROM poderoso_apps_topic
+        """)
+        cursor.execute(f"""
+            INSERT INTO {TABELA}(rowid, text, owner, topic_id)
+            SELECT e.id * 2 + 1, e.text, 'u' || t.owner_id, e.topic_id
+            FROM poderoso_apps_entry e JOIN poderoso_apps_topic t ON t.id = e.topic_id
+        """)
+        # Junta os segmentos do índice para deixar as consultas mais rápidas.
+        cursor.execute(f"INSERT INTO {TABELA}({TABELA}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {TABELA}')
+        return cursor.fetchone()[0]
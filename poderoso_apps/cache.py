@@ -0,0 +1,200 @@
+"""
+Cache versionado do catálogo de planos, das páginas de detalhes de plano e das estatísticas
+de cada usuário (página de perfil).
+
+Cada grupo de dados ('catalogo' ou 'plano:<id>') tem um número de versão guardado no cache e
+que faz parte das chaves dos dados. Invalidar é só incrementar a versão: as entradas antigas
+deixam de ser lidas e expiram sozinhas. Funciona com qualquer backend (locmem, arquivo, ...),
+pois não depende de apagar chaves por padrão.
+
+As versões são incrementadas pelos sinais de PlanoTreino, Exercicio, Topic e Entry (ver signals.py).
+Operações em massa que não disparam sinais devem chamar invalidar_* explicitamente.
+"""
+import re
+import time
+
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db.models import DateTimeField, F, Func, IntegerField, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+
+from .models import Entry, Exercicio, PlanoTreino, RegistroSerie, SessaoTreino, Topic
+
+# Os dados são imutáveis para uma mesma versão, então podem ficar bastante tempo no cache.
+TEMPO_CACHE = 60 * 60 * 24
+PREFIXO = 'poderoso'
+# Marcador deixado no HTML em cache no lugar do estado de cada checkbox (ver aplicar_estados).
+ESTADO = re.compile(r'__ESTADO_(\d+)__')
+
+
+def _chave_versao(grupo):
+    return f'{PREFIXO}:versao:{grupo}'
+
+
+def versao(grupo):
+    """Retorna a versão atual do grupo, criando-a se o cache ainda não a conhece."""
+    chave = _chave_versao(grupo)
+    atual = cache.get(chave)
+    if atual is None:
+        # Começa de um valor baseado no relógio para não reaproveitar versões de antes de uma limpeza do cache.
+        cache.add(chave, time.time_ns(), None)
+        atual = cache.get(chave)
+    return atual
+
+
+async def aversao(grupo):
+    """Versão assíncrona de versao()."""
+    chave = _chave_versao(grupo)
+    atual = await cache.aget(chave)
+    if atual is None:
+        await cache.aadd(chave, time.time_ns(), None)
+        atual = await cache.aget(chave)
+    return atual
+
+
+def _invalidar(grupo):
+    try:
+        cache.incr(_chave_versao(grupo))
+    except ValueError:
+        # A versão ainda não estava no cache: qualquer valor novo já invalida as chaves antigas.
+        cache.set(_chave_versao(grupo), time.time_ns(), None)
+
+
+def invalidar_catalogo():
+    _invalidar('catalogo')
+
+
+def invalidar_plano(plano_id):
+    _invalidar(f'plano:{plano_id}')
+
+
+def invalidar_estatisticas(owner_id):
+    _invalidar(f'estatisticas:{owner_id}')
+
+
+def versao_catalogo():
+    return versao('catalogo')
+
+
+async def aversao_catalogo():
+    return await aversao('catalogo')
+
+
+def _planos():
+    # A duração total do plano já vem somada pelo banco: é o tempo restante de quem não concluiu nada.
+    return PlanoTreino.objects.annotate(duracao_total=Coalesce(Sum('exercicios__duracao_estimada'), 0))
+
+
+def _dados_plano(plano, exercicios, versao_plano):
+    return {
+        'plano': plano,
+        'total_exercicios': len(exercicios),
+        # Validadores da página (ver condicional.py): a versão também muda quando só o HTML muda,
+        # como quando as miniaturas das imagens ficam prontas.
+        'versao': versao_plano,
+        'atualizado_em': max((plano.atualizado_em, *(e.atualizado_em for e in exercicios))),
+        'html': render_to_string('poderoso_apps/exercicios_plano.html', {'exercicios': exercicios}),
+    }
+
+
+def detalhes_plano(plano_id):
+    """
+    Retorna os dados compartilhados da página de um plano: {'plano', 'total_exercicios', 'versao',
+    'atualizado_em', 'html'}. O plano vem anotado com 'duracao_total', em segundos.
+
+    'html' é a lista de exercícios já renderizada, com marcadores no lugar do estado de cada
+    checkbox. Retorna None se o plano não existir.
+    """
+    versao_plano = versao(f'plano:{plano_id}')
+    chave = f'{PREFIXO}:plano:{plano_id}:{versao_plano}'
+    dados = cache.get(chave)
+    if dados is None:
+        plano = _planos().filter(id=plano_id).first()
+        if plano is None:
+            return None
+        dados = _dados_plano(plano, list(plano.exercicios.all()), versao_plano)
+        cache.set(chave, dados, TEMPO_CACHE)
+    return dados
+
+
+async def adetalhes_plano(plano_id):
+    """Versão assíncrona de detalhes_plano()."""
+    versao_plano = await aversao(f'plano:{plano_id}')
+    chave = f'{PREFIXO}:plano:{plano_id}:{versao_plano}'
+    dados = await cache.aget(chave)
+    if dados is None:
+        plano = await _planos().filter(id=plano_id).afirst()
+        if plano is None:
+            return None
+        dados = _dados_plano(plano, [exercicio async for exercicio in plano.exercicios.all()], versao_plano)
+        await cache.aset(chave, dados, TEMPO_CACHE)
+    return dados
+
+
+def aplicar_estados(html, concluidos, habilitado=True):
+    """Troca os marcadores do HTML em cache pelo estado das checkboxes do usuário atual."""
+    if not habilitado:
+        return ESTADO.sub('disabled', html)
+    return ESTADO.sub(lambda m: 'checked' if int(m.group(1)) in concluidos else '', html)
+
+
+def _escalar(queryset, funcao, campo, output_field):
+    """Subconsulta com um único valor agregado (COUNT, MAX) sobre todo o queryset, sem GROUP BY."""
+    return Subquery(
+        queryset.order_by().annotate(valor=Func(F(campo), function=funcao, output_field=output_field)).values('valor')[:1]
+    )
+
+
+def _contar(queryset):
+    return _escalar(queryset, 'COUNT', 'pk', IntegerField())
+
+
+def _ultima(queryset, campo):
+    return _escalar(queryset, 'MAX', campo, DateTimeField())
+
+
+def _calcular_estatisticas(owner_id):
+    """Todos os números do perfil em uma única consulta, com uma subconsulta escalar por valor."""
+    # O progresso considera os planos que o usuário está treinando, isto é, com sessão aberta.
+    abertas = SessaoTreino.objects.filter(owner_id=owner_id, finalizada_em__isnull=True)
+    valores = User.objects.filter(pk=owner_id).values(
+        topicos=_contar(Topic.objects.filter(owner_id=owner_id)),
+        entradas=_contar(Entry.objects.filter(topic__owner_id=owner_id)),
+        planos=_contar(PlanoTreino.objects.filter(owner_id=owner_id)),
+        exercicios_em_andamento=_contar(Exercicio.objects.filter(plano__in=abertas.values('plano_id'))),
+        exercicios_concluidos=_contar(SessaoTreino.exercicios_concluidos.through.objects.filter(sessaotreino__in=abertas)),
+        ultimo_topico=_ultima(Topic.objects.filter(owner_id=owner_id), 'date_added'),
+        ultima_entrada=_ultima(Entry.objects.filter(topic__owner_id=owner_id), 'date_added'),
+        ultima_sessao=_ultima(SessaoTreino.objects.filter(owner_id=owner_id), 'iniciada_em'),
+        ultima_serie=_ultima(RegistroSerie.objects.filter(owner_id=owner_id), 'registrada_em'),
+    ).first()
+    if valores is None:
+        return None
+    atividades = [valores[c] for c in ('ultimo_topico', 'ultima_entrada', 'ultima_sessao', 'ultima_serie') if valores[c]]
+    total = valores['exercicios_em_andamento']
+    return {
+        'topicos': valores['topicos'],
+        'entradas': valores['entradas'],
+        'planos': valores['planos'],
+        'exercicios_em_andamento': total,
+        'exercicios_concluidos': valores['exercicios_concluidos'],
+        'progresso': valores['exercicios_concluidos'] * 100 / total if total else 0,
+        'ultima_atividade': max(atividades, default=None),
+    }
+
+
+def estatisticas_usuario(owner_id):
+    """
+    Estatísticas do perfil do usuário: {'topicos', 'entradas', 'planos', 'exercicios_em_andamento',
+    'exercicios_concluidos', 'progresso', 'ultima_atividade'}.
+
+    Com o cache preenchido não há consulta ao banco; os sinais de Topic, Entry e Exercicio e as
+    views que marcam exercícios chamam invalidar_estatisticas().
+    """
+    chave = f'{PREFIXO}:estatisticas:{owner_id}:{versao(f"estatisticas:{owner_id}")}'
+    dados = cache.get(chave)
+    if dados is None:
+        dados = _calcular_estatisticas(owner_id)
+        cache.set(chave, dados, TEMPO_CACHE)
+    return dados
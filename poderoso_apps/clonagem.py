@@ -0,0 +1,108 @@
+"""
+Clonagem de um plano de treino (modelo) para muitos usuários de uma vez.
+
+Os planos são criados com um único bulk_create e os exercícios com INSERT ... SELECT (um a cada
+PLANOS_POR_INSERT planos), que copia as linhas do modelo dentro do banco, sem trazê-las para o
+Python. Nos bancos sem
+suporte conhecido a esse caminho, os exercícios são montados aqui e gravados com bulk_create.
+As imagens não são copiadas: os clones apontam para o mesmo arquivo (e os mesmos derivados), e
+cada cópia soma uma referência ao arquivo no armazenamento por conteúdo (ver ImagemConteudo).
+
+Como as operações em massa não disparam sinais, o catálogo e o perfil de cada usuário são
+invalidados aqui mesmo.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidar_catalogo, invalidar_estatisticas
+from .models import Exercicio, ImagemConteudo, PlanoTreino
+
+# Bancos em que o INSERT ... SELECT abaixo foi verificado.
+INSERT_SELECT = ('sqlite', 'postgresql')
+# Colunas copiadas de cada exercício; duracao_estimada é gerada pelo banco.
+COLUNAS_EXERCICIO = ('nome', 'series', 'repeticoes', 'intervalo', 'intervalo_segundos', 'imagens')
+# Planos por INSERT ... SELECT, abaixo do limite de 999 parâmetros das versões antigas do SQLite.
+PLANOS_POR_INSERT = 500
+
+
+def ids_dos_usuarios(usernames=(), grupo=None):
+    """
+    Retorna (ids, desconhecidos): os ids dos usuários de 'usernames' e do grupo 'grupo'
+    (nome ou Group), na ordem informada, e os usernames que não existem.
+    """
+    usernames = list(dict.fromkeys(u for u in usernames if u))
+    encontrados = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    ids = [encontrados[u] for u in usernames if u in encontrados]
+    if grupo is not None:
+        filtro = {'groups': grupo} if not isinstance(grupo, str) else {'groups__name': grupo}
+        ids += User.objects.filter(is_active=True, **filtro).order_by('id').values_list('id', flat=True)
+    return list(dict.fromkeys(ids)), [u for u in usernames if u not in encontrados]
+
+
+def _copiar_exercicios(modelo_id, planos, agora):
+    """Copia os exercícios do plano 'modelo_id' para cada plano de 'planos'; retorna quantos criou."""
+    if connection.vendor not in INSERT_SELECT:
+        exercicios = list(Exercicio.objects.filter(plano_id=modelo_id).order_by('id').values(*COLUNAS_EXERCICIO))
+        # bulk_create não passa por Exercicio.save(); 'intervalo_segundos' já vem copiado.
+        return len(Exercicio.objects.bulk_create([
+            Exercicio(plano_id=plano.id, atualizado_em=agora, **dados) for plano in planos for dados in exercicios
+        ], batch_size=1000))
+
+    q = connection.ops.quote_name
+    opcoes_exercicio, opcoes_plano = Exercicio._meta, PlanoTreino._meta
+    colunas = [opcoes_exercicio.get_field(campo).column for campo in COLUNAS_EXERCICIO]
+    plano_id = opcoes_exercicio.get_field('plano').column
+    atualizado_em = opcoes_exercicio.get_field('atualizado_em')
+    total = 0
+    for inicio in range(0, len(planos), PLANOS_POR_INSERT):
+        ids = [plano.id for plano in planos[inicio:inicio + PLANOS_POR_INSERT]]
+        sql = (
+            f"INSERT INTO {q(opcoes_exercicio.db_table)} "
+            f"({q(plano_id)}, {', '.join(q(c) for c in colunas)}, {q(atualizado_em.column)}) "
+            f"SELECT p.{q(opcoes_plano.pk.column)}, {', '.join(f'e.{q(c)}' for c in colunas)}, %s "
+            f"FROM {q(opcoes_plano.db_table)} p CROSS JOIN {q(opcoes_exercicio.db_table)} e "
+            f"WHERE e.{q(plano_id)} = %s AND p.{q(opcoes_plano.pk.column)} IN ({', '.join(['%s'] * len(ids))}) "
+            f"ORDER BY p.{q(opcoes_plano.pk.column)}, e.{q(opcoes_exercicio.pk.column)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [atualizado_em.get_db_prep_save(agora, connection), modelo_id, *ids])
+            total += cursor.rowcount
+    return total
+
+
+def clonar_plano(modelo, owner_ids, ignorar_existentes=True):
+    """
+    Cria uma cópia do plano 'modelo', com todos os exercícios, para cada usuário de 'owner_ids'.
+
+    Com 'ignorar_existentes', quem já tem um plano com o mesmo nome (inclusive o dono do modelo)
+    é pulado, então repetir a clonagem não duplica planos. As cópias são privadas: cada uma aparece
+    só no catálogo do seu dono. Retorna (planos criados, quantidade de exercícios criados).
+    """
+    owner_ids = list(dict.fromkeys(owner_ids))
+    if ignorar_existentes:
+        # Busca pelo índice (owner, nome).
+        existentes = set(PlanoTreino.objects.filter(owner_id__in=owner_ids, nome=modelo.nome).values_list('owner_id', flat=True))
+        owner_ids = [owner_id for owner_id in owner_ids if owner_id not in existentes]
+    if not owner_ids:
+        return [], 0
+
+    def invalidar_owners():
+        for owner_id in owner_ids:
+            invalidar_estatisticas(owner_id)
+
+    with transaction.atomic():
+        planos = PlanoTreino.objects.bulk_create([
+            PlanoTreino(owner_id=owner_id, nome=modelo.nome, descricao=modelo.descricao,
+                        tempo_estimado=modelo.tempo_estimado, publico=False)
+            for owner_id in owner_ids
+        ])
+        exercicios = _copiar_exercicios(modelo.id, planos, timezone.now())
+        imagens = Counter(Exercicio.objects.filter(plano_id=modelo.id).values_list('imagens', flat=True))
+        ImagemConteudo.ajustar({nome: n * len(planos) for nome, n in imagens.items()})
+        transaction.on_commit(invalidar_catalogo)
+        # Quantidade de planos no perfil de cada novo dono.
+        transaction.on_commit(invalidar_owners)
+    return planos, exercicios
@@ -0,0 +1,52 @@
+"""
+GET condicional (ETag/Last-Modified) das páginas de tópicos e de planos.
+
+Cada página monta um validador barato antes das consultas pesadas e da renderização: as datas
+de atualização (date_updated/atualizado_em), contagens e o usuário. Se o navegador já tem aquela
+versão (If-None-Match/If-Modified-Since), a resposta é um 304 sem corpo.
+
+As páginas dependem do usuário, então a resposta é privada e sempre revalidada
+(Cache-Control: private, no-cache). Uma exclusão não muda a data máxima; por isso as contagens
+entram no ETag, que tem precedência sobre o If-Modified-Since (RFC 9110).
+"""
+import hashlib
+
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+
+def validador(request, *partes):
+    """
+    ETag da página a partir das 'partes' que identificam o conteúdo.
+
+    Entram também o usuário (a barra de navegação mostra o nome), a query string (cursor da
+    paginação) e o segredo CSRF: depois de um novo login o formulário de logout da página guardada
+    pelo navegador teria um token que não vale mais.
+    """
+    # Como a renderização faria, cria o segredo CSRF na primeira visita: o ETag já sai com ele.
+    get_token(request)
+    usuario = request.user
+    base = (
+        usuario.pk, usuario.get_username(), request.META['CSRF_COOKIE'],
+        request.GET.urlencode(), *partes,
+    )
+    return quote_etag(hashlib.md5(repr(base).encode(), usedforsecurity=False).hexdigest())
+
+
+def nao_modificado(request, etag, atualizado_em=None):
+    """Retorna o 304 (ou 412) se o cliente já tem esta versão, ou None para seguir com a view."""
+    ultima = int(atualizado_em.timestamp()) if atualizado_em else None
+    resposta = get_conditional_response(request, etag=etag, last_modified=ultima)
+    if resposta is not None:
+        return aplicar(resposta, etag, atualizado_em)
+    return None
+
+
+def aplicar(resposta, etag, atualizado_em=None):
+    """Acrescenta os validadores e a política de cache à resposta."""
+    resposta['ETag'] = etag
+    if atualizado_em:
+        resposta['Last-Modified'] = http_date(atualizado_em.timestamp())
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
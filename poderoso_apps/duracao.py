@@ -0,0 +1,57 @@
+"""
+Duração estimada dos exercícios.
+
+Exercicio.intervalo é texto livre ("60s", "1min30", "1:30", "30-60s", ...). segundos_intervalo()
+converte esse texto no descanso em segundos, guardado em Exercicio.intervalo_segundos, e a
+duração de cada exercício é calculada pelo banco a partir das séries, repetições e descanso
+(Exercicio.duracao_estimada). Mudar as constantes abaixo exige uma migração, pois a fórmula
+faz parte da definição da coluna.
+"""
+import re
+
+# Tempo médio de execução de uma repetição.
+SEGUNDOS_POR_REPETICAO = 3
+# Descanso assumido quando o intervalo não pôde ser interpretado.
+INTERVALO_PADRAO = 60
+
+_UNIDADES = {'h': 3600, 'min': 60, 'm': 60, "'": 60, "''": 1, '"': 1, 's': 1, None: 1}
+# Número seguido da unidade opcional; "''" vem antes de "'" para que 1'30'' seja lido inteiro.
+_PARTE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|min|m|''|'|\"|s)?")
+_FAIXA = re.compile(r'\s*(?:-|–|\ba\b|\baté\b)\s*')
+_SINONIMOS = ((re.compile(r'horas?'), 'h'), (re.compile(r'min(?:utos?)?'), 'min'), (re.compile(r'seg(?:undos?)?'), 's'))
+
+
+def _segundos(texto):
+    relogio = re.fullmatch(r'(\d+):(\d{1,2})', texto.strip())
+    if relogio:
+        return int(relogio[1]) * 60 + int(relogio[2])
+    partes = _PARTE.findall(texto)
+    if not partes:
+        return None
+    return sum(float(numero) * _UNIDADES[unidade or None] for numero, unidade in partes)
+
+
+def segundos_intervalo(texto):
+    """
+    Converte o intervalo digitado em segundos (int), ou None se não houver número no texto.
+
+    Aceita "60", "60s", "90 segundos", "2min", "1min30", "1m30s", "1,5 min", "1:30" e 1'30''.
+    Faixas como "30-60s" ou "1 a 2 min" valem a média dos extremos; o primeiro extremo sem
+    unidade usa a unidade do segundo.
+    """
+    if not texto:
+        return None
+    texto = texto.lower().replace(',', '.')
+    for padrao, unidade in _SINONIMOS:
+        texto = padrao.sub(unidade, texto)
+
+    extremos = _FAIXA.split(texto, maxsplit=1)
+    if len(extremos) == 2 and re.fullmatch(r'\d+(?:\.\d+)?', extremos[0].strip()):
+        unidade = _PARTE.findall(extremos[1])
+        if unidade:
+            extremos[0] = extremos[0].strip() + (unidade[-1][1] or '')
+    valores = [_segundos(extremo) for extremo in extremos]
+    valores = [valor for valor in valores if valor is not None]
+    if not valores:
+        return None
+    return round(sum(valores) / len(valores))
@@ -0,0 +1,126 @@
+"""
+Arquivos estáticos com hash no nome, pré-comprimidos e servidos pelo próprio Django.
+
+ArmazenamentoComprimido é o storage do collectstatic no perfil de produção: além do manifesto
+com o hash do conteúdo no nome de cada arquivo (ManifestStaticFilesStorage), grava ao lado de
+cada arquivo de texto as variantes .gz e, se o pacote 'brotli' estiver instalado, .br.
+
+EstaticosMiddleware entrega os arquivos de STATIC_ROOT antes do resto da pilha (sessão,
+autenticação, views), escolhendo a variante pelo Accept-Encoding. Os nomes com hash recebem
+Cache-Control immutable, então o navegador nem revalida; ETag, 304 e Range vêm de
+arquivos.servir_arquivo(). Assim um único contêiner (gunicorn ou uvicorn) serve os assets sem
+um nginx na frente.
+"""
+import gzip
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+
+from .arquivos import SUFIXOS, servir_arquivo
+
+try:
+    import brotli
+except ImportError:  # Sem brotli, só as variantes gzip são geradas.
+    brotli = None
+
+# Só formatos de texto ganham com a compressão; imagens e fontes woff/woff2 já são comprimidas.
+EXTENSOES_COMPRIMIVEIS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+# A variante só é gravada se economizar ao menos 5% do tamanho.
+ECONOMIA_MINIMA = 0.95
+# Ordem de preferência quando o cliente aceita as duas.
+CODIFICACOES = ('br', 'gzip')
+
+
+def _comprimir(dados):
+    """Retorna {codificacao: bytes} com as variantes que valem a pena."""
+    variantes = {'gzip': gzip.compress(dados, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes['br'] = brotli.compress(dados, quality=11)
+    return {c: v for c, v in variantes.items() if len(v) < len(dados) * ECONOMIA_MINIMA}
+
+
+class ArmazenamentoComprimido(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que pré-comprime os arquivos com hash no collectstatic."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nome in sorted(set(self.hashed_files.values())):
+            if os.path.splitext(nome)[1].lower() not in EXTENSOES_COMPRIMIVEIS or not self.exists(nome):
+                continue
+            with self.open(nome) as arquivo:
+                dados = arquivo.read()
+            for codificacao, comprimido in _comprimir(dados).items():
+                variante = nome + SUFIXOS[codificacao]
+                with open(self.path(variante), 'wb') as destino:
+                    destino.write(comprimido)
+                yield nome, variante, True
+
+
+def codificacoes_aceitas(cabecalho):
+    """Codificações de CODIFICACOES aceitas pelo Accept-Encoding, na ordem de preferência do servidor."""
+    pesos = {}
+    for item in cabecalho.split(','):
+        nome, _, parametros = item.strip().partition(';')
+        peso = 1.0
+        parametros = parametros.strip().replace(' ', '')
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        pesos[nome.strip().lower()] = peso
+    curinga = pesos.get('*', 0.0)
+    return [c for c in CODIFICACOES if pesos.get(c, curinga) > 0]
+
+
+class EstaticosMiddleware:
+    """Serve STATIC_URL a partir de STATIC_ROOT com as variantes pré-comprimidas; o resto segue adiante."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT or not settings.STATIC_URL.startswith('/'):
+            # Sem STATIC_ROOT não há o que servir; STATIC_URL absoluta (CDN) é atendida por outro servidor.
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefixo = settings.STATIC_URL
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        return self._servir(request) or self.get_response(request)
+
+    async def _acall(self, request):
+        # Leitura de disco bloqueante: sai do laço de eventos só para os caminhos estáticos.
+        resposta = await sync_to_async(self._servir)(request) if self._estatico(request) else None
+        return resposta or await self.get_response(request)
+
+    def _estatico(self, request):
+        return request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefixo)
+
+    def _servir(self, request):
+        if not self._estatico(request):
+            return None
+        caminho = request.path_info[len(self.prefixo):]
+        for codificacao in (*codificacoes_aceitas(request.headers.get('Accept-Encoding', '')), None):
+            try:
+                resposta = servir_arquivo(
+                    request, settings.STATIC_ROOT, caminho,
+                    max_age=settings.STATIC_CACHE_MAX_AGE, codificacao=codificacao,
+                )
+            except Http404:
+                continue
+            # Os caches intermediários precisam guardar uma cópia por codificação.
+            patch_vary_headers(resposta, ('Accept-Encoding',))
+            return resposta
+        return None
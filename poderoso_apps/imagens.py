@@ -0,0 +1,140 @@
+"""
+Geração de versões reduzidas (derivados) das imagens dos exercícios.
+
+Para cada imagem enviada são gerados, em cada largura de LARGURAS:
+    - um WebP (animado quando a original é um GIF animado);
+    - uma miniatura estática (PNG/JPEG), que para GIFs é o primeiro quadro (poster).
+
+Os derivados ficam em MEDIA_ROOT/derivados/, espelhando o caminho da original, e são
+gerados em um pool de processos para não ocupar a thread da requisição.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Larguras geradas: a página exibe as imagens com 250px, e 500px atende telas de alta densidade.
+LARGURAS = (250, 500)
+PASTA_DERIVADOS = 'derivados'
+EXTENSOES_IMAGEM = {'.gif', '.png', '.jpg', '.jpeg', '.webp'}
+
+_pool = None
+
+
+def _extensao_miniatura(nome):
+    """PNG preserva transparência e paletas (GIF/PNG); o resto vira JPEG."""
+    extensao = os.path.splitext(nome)[1].lower()
+    return '.png' if extensao in {'.png', '.gif', '.webp'} else '.jpg'
+
+
+def nomes_derivados(nome):
+    """
+    Retorna os nomes (relativos ao MEDIA_ROOT) dos derivados de uma imagem.
+
+    O resultado é um dicionário {largura: {'webp': nome, 'miniatura': nome}}.
+    """
+    base = os.path.splitext(nome)[0]
+    extensao = _extensao_miniatura(nome)
+    return {
+        largura: {
+            'webp': f'{PASTA_DERIVADOS}/{base}-{largura}w.webp',
+            'miniatura': f'{PASTA_DERIVADOS}/{base}-{largura}w{extensao}',
+        }
+        for largura in LARGURAS
+    }
+
+
+def _redimensionar(quadro, largura):
+    """Reduz o quadro para a largura pedida mantendo a proporção (nunca amplia)."""
+    from PIL import Image
+
+    if quadro.width <= largura:
+        return quadro.copy()
+    altura = max(1, round(quadro.height * largura / quadro.width))
+    return quadro.resize((largura, altura), Image.LANCZOS)
+
+
+def gerar_derivados(caminho, media_root, forcar=False):
+    """
+    Gera os derivados da imagem em 'caminho' (absoluto) dentro de 'media_root'.
+
+    Roda nos processos do pool, por isso recebe apenas caminhos e não usa o ORM.
+    Retorna a lista de arquivos gravados.
+    """
+    from PIL import Image, ImageSequence
+
+    nome = os.path.relpath(caminho, media_root).replace(os.sep, '/')
+    gerados = []
+    with Image.open(caminho) as original:
+        animada = getattr(original, 'is_animated', False)
+        for largura, nomes in nomes_derivados(nome).items():
+            destino_webp = os.path.join(media_root, nomes['webp'])
+            destino_miniatura = os.path.join(media_root, nomes['miniatura'])
+            if not forcar and os.path.exists(destino_webp) and os.path.exists(destino_miniatura):
+                continue
+            os.makedirs(os.path.dirname(destino_webp), exist_ok=True)
+
+            original.seek(0)
+            primeiro = _redimensionar(original.convert('RGBA'), largura)
+            if destino_miniatura.endswith('.jpg'):
+                primeiro.convert('RGB').save(destino_miniatura, 'JPEG', quality=82, optimize=True)
+            else:
+                primeiro.save(destino_miniatura, 'PNG', optimize=True)
+
+            if animada:
+                quadros = [_redimensionar(q.convert('RGBA'), largura) for q in ImageSequence.Iterator(original)]
+                quadros[0].save(
+                    destino_webp, 'WEBP', save_all=True, append_images=quadros[1:], quality=75,
+                    duration=original.info.get('duration', 100), loop=original.info.get('loop', 0),
+                )
+            else:
+                primeiro.save(destino_webp, 'WEBP', quality=80)
+            gerados += [destino_miniatura, destino_webp]
+    return gerados
+
+
+def _pool_processos():
+    """Cria sob demanda o pool compartilhado; 'spawn' evita herdar conexões e threads do servidor."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGENS_DERIVADOS_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def _registrar_falha(futuro, nome):
+    if futuro.exception() is not None:
+        logger.error('Falha ao gerar derivados de %s: %s', nome, futuro.exception())
+
+
+def agendar_derivados(nome, forcar=False, ao_concluir=None):
+    """
+    Agenda a geração dos derivados da imagem 'nome' (relativo ao MEDIA_ROOT).
+
+    Com IMAGENS_DERIVADOS_WORKERS = 0 a geração acontece na hora (útil em testes e scripts).
+    'ao_concluir' é chamada sem argumentos quando a geração termina com sucesso.
+    """
+    media_root = str(settings.MEDIA_ROOT)
+    caminho = os.path.join(media_root, nome)
+    if settings.IMAGENS_DERIVADOS_WORKERS == 0:
+        gerados = gerar_derivados(caminho, media_root, forcar)
+        if ao_concluir:
+            ao_concluir()
+        return gerados
+    futuro = _pool_processos().submit(gerar_derivados, caminho, media_root, forcar)
+    futuro.add_done_callback(lambda f: _registrar_falha(f, nome))
+    if ao_concluir:
+        futuro.add_done_callback(lambda f: f.exception() is None and ao_concluir())
+    return futuro
+
+
+def derivados_prontos(nome):
+    """Indica se o maior derivado de 'nome' já existe (são gravados do menor para o maior)."""
+    maior = nomes_derivados(nome)[LARGURAS[-1]]['webp']
+    return os.path.exists(os.path.join(settings.MEDIA_ROOT, maior))
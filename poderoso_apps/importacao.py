@@ -0,0 +1,356 @@
+"""
+Importação e exportação de planos de treino e exercícios em CSV ou JSON Lines.
+
+Cada linha do arquivo é um exercício, com os dados do plano repetidos (COLUNAS). Um plano sem
+exercícios aparece em uma linha com 'exercicio' vazio. Os planos são identificados por
+(owner, plano) e os exercícios por (plano, exercicio): importar o mesmo arquivo duas vezes
+atualiza as linhas em vez de duplicá-las.
+
+A leitura e a escrita são feitas linha a linha e a importação grava em lotes (bulk_create e
+bulk_update, um lote por transação), então a memória não depende do tamanho do arquivo.
+Como as operações em massa não disparam sinais, o cache dos planos e os derivados das imagens
+são tratados aqui mesmo.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.utils import validate_file_name
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidar_catalogo, invalidar_estatisticas, invalidar_plano
+from .duracao import segundos_intervalo
+from .imagens import agendar_derivados, derivados_prontos
+from .models import Exercicio, ImagemConteudo, PlanoTreino
+
+COLUNAS = (
+    'owner', 'plano', 'descricao', 'tempo_estimado', 'publico',
+    'exercicio', 'series', 'repeticoes', 'intervalo', 'imagem',
+)
+# Valores aceitos na coluna 'publico' (sem diferenciar maiúsculas).
+VERDADEIROS = ('1', 'true', 'sim', 's', 'yes')
+FALSOS = ('0', 'false', 'nao', 'não', 'n', 'no')
+FORMATOS = ('csv', 'jsonl')
+TAMANHO_LOTE = 2000
+# Quantas mensagens de erro são guardadas no resultado (as demais só são contadas).
+MAXIMO_ERROS = 100
+# Linhas de saída agrupadas em cada pedaço da exportação.
+LINHAS_POR_PEDACO = 1000
+
+
+def formato_do_nome(nome):
+    """'jsonl' para .jsonl/.json/.ndjson, 'csv' para o resto."""
+    return 'jsonl' if nome.lower().rsplit('.', 1)[-1] in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+# Exportação -------------------------------------------------------------------------------------
+
+def linhas_exportacao(planos=None):
+    """Gera um dicionário por linha (COLUNAS), percorrendo o banco em blocos com iterator()."""
+    planos = PlanoTreino.objects.all() if planos is None else planos
+    exercicios = Exercicio.objects.filter(plano__in=planos).order_by('plano_id', 'id').values_list(
+        'plano__owner__username', 'plano__nome', 'plano__descricao', 'plano__tempo_estimado', 'plano__publico',
+        'nome', 'series', 'repeticoes', 'intervalo', 'imagens',
+    )
+    for valores in exercicios.iterator(chunk_size=LINHAS_POR_PEDACO):
+        yield dict(zip(COLUNAS, valores))
+    vazios = planos.filter(exercicios__isnull=True).order_by('id').values_list(
+        'owner__username', 'nome', 'descricao', 'tempo_estimado', 'publico',
+    )
+    for valores in vazios.iterator(chunk_size=LINHAS_POR_PEDACO):
+        yield dict(zip(COLUNAS, valores + ('', None, None, '', '')))
+
+
+def escrever(linhas, formato):
+    """Gera o arquivo de saída em pedaços de texto, para StreamingHttpResponse ou um arquivo."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if formato == 'csv':
+        escritor.writerow(COLUNAS)
+    for i, linha in enumerate(linhas, 1):
+        if formato == 'csv':
+            escritor.writerow(['' if linha[c] is None else linha[c] for c in COLUNAS])
+        else:
+            buffer.write(json.dumps(linha, ensure_ascii=False))
+            buffer.write('\n')
+        if i % LINHAS_POR_PEDACO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Importação -------------------------------------------------------------------------------------
+
+def ler(arquivo, formato):
+    """Gera (número da linha, dicionário) a partir de um arquivo de texto, sem carregá-lo inteiro."""
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        faltando = {'plano', 'exercicio'} - set(leitor.fieldnames or ())
+        if faltando:
+            raise ValueError(f'Colunas ausentes no CSV: {", ".join(sorted(faltando))}')
+        for linha in leitor:
+            yield leitor.line_num, linha
+        return
+    for numero, texto in enumerate(arquivo, 1):
+        if not texto.strip():
+            continue
+        try:
+            linha = json.loads(texto)
+        except json.JSONDecodeError as erro:
+            linha = {'_erro': f'JSON inválido ({erro.msg})'}
+        yield numero, linha if isinstance(linha, dict) else {'_erro': 'a linha deve ser um objeto JSON'}
+
+
+def _texto(linha, campo, limite=None, obrigatorio=False):
+    valor = linha.get(campo)
+    valor = '' if valor is None else str(valor).strip()
+    if obrigatorio and not valor:
+        raise ValueError(f'{campo}: obrigatório')
+    if limite and len(valor) > limite:
+        raise ValueError(f'{campo}: no máximo {limite} caracteres')
+    return valor
+
+
+def _inteiro(linha, campo, minimo=0):
+    valor = linha.get(campo)
+    try:
+        valor = int(str(valor).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo}: informe um número inteiro')
+    if valor < minimo:
+        raise ValueError(f'{campo}: deve ser maior ou igual a {minimo}')
+    return valor
+
+
+def _booleano(linha, campo):
+    """True ou False; None quando a coluna está vazia ou ausente (arquivos antigos)."""
+    valor = linha.get(campo)
+    if isinstance(valor, bool) or valor is None:
+        return valor
+    valor = str(valor).strip().lower()
+    if not valor:
+        return None
+    if valor in VERDADEIROS:
+        return True
+    if valor in FALSOS:
+        return False
+    raise ValueError(f'{campo}: use true ou false')
+
+
+def _imagem(linha):
+    """Nome da imagem relativo ao MEDIA_ROOT, sem caminhos absolutos nem '..'."""
+    nome = _texto(linha, 'imagem', 100)
+    if not nome:
+        return None
+    try:
+        validate_file_name(nome, allow_relative_path=True)
+    except SuspiciousFileOperation:
+        raise ValueError('imagem: informe um caminho relativo ao diretório de mídia')
+    return nome
+
+
+def _limpar(linha, owner_padrao):
+    """Valida uma linha e retorna (username, dados do plano, dados do exercício ou None)."""
+    if '_erro' in linha:
+        raise ValueError(linha['_erro'])
+    username = _texto(linha, 'owner') or owner_padrao
+    if not username:
+        raise ValueError('owner: obrigatório (ou use o dono padrão)')
+    plano = {
+        'nome': _texto(linha, 'plano', 100, obrigatorio=True),
+        'descricao': _texto(linha, 'descricao') or None,
+        'tempo_estimado': _inteiro(linha, 'tempo_estimado'),
+        # None mantém o valor de um plano existente; os planos novos ficam privados.
+        'publico': _booleano(linha, 'publico'),
+    }
+    if not _texto(linha, 'exercicio'):
+        return username, plano, None
+    exercicio = {
+        'nome': _texto(linha, 'exercicio', 200),
+        'series': _inteiro(linha, 'series', 1),
+        'repeticoes': _inteiro(linha, 'repeticoes', 1),
+        'intervalo': _texto(linha, 'intervalo', 50),
+        'imagens': _imagem(linha),
+    }
+    # bulk_create e o UPDATE em lote não passam por Exercicio.save(), que faria essa conversão.
+    exercicio['intervalo_segundos'] = segundos_intervalo(exercicio['intervalo'])
+    return username, plano, exercicio
+
+
+class Resultado:
+    """Contadores da importação; guarda só as primeiras MAXIMO_ERROS mensagens de erro."""
+
+    def __init__(self):
+        self.planos_criados = self.planos_atualizados = 0
+        self.exercicios_criados = self.exercicios_atualizados = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def erro(self, numero, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAXIMO_ERROS:
+            self.erros.append(f'linha {numero}: {mensagem}')
+
+    def como_dict(self):
+        return {
+            'planos_criados': self.planos_criados, 'planos_atualizados': self.planos_atualizados,
+            'exercicios_criados': self.exercicios_criados, 'exercicios_atualizados': self.exercicios_atualizados,
+            'erros': self.total_erros,
+        }
+
+
+def importar(linhas, tamanho_lote=TAMANHO_LOTE, owner_padrao=None):
+    """
+    Importa as linhas de ler() em lotes de 'tamanho_lote', criando ou atualizando planos e exercícios.
+
+    'owner_padrao' é o username usado nas linhas sem a coluna owner. Linhas inválidas são puladas e
+    registradas no Resultado; cada lote é gravado em uma transação.
+    """
+    resultado = Resultado()
+    linhas = iter(linhas)
+    while lote := list(islice(linhas, tamanho_lote)):
+        _importar_lote(lote, owner_padrao, resultado)
+    invalidar_catalogo()
+    return resultado
+
+
+def _importar_lote(lote, owner_padrao, resultado):
+    validas = []
+    for numero, linha in lote:
+        try:
+            validas.append((numero, *_limpar(linha, owner_padrao)))
+        except ValueError as erro:
+            resultado.erro(numero, erro)
+
+    usernames = {username for _, username, _, _ in validas}
+    owners = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+    # Último valor de cada plano e de cada exercício no lote (a última linha prevalece).
+    planos, exercicios = {}, {}
+    for numero, username, plano, exercicio in validas:
+        if username not in owners:
+            resultado.erro(numero, f'owner: usuário "{username}" não existe')
+            continue
+        chave_plano = (owners[username], plano['nome'])
+        planos[chave_plano] = plano
+        if exercicio:
+            exercicios[(chave_plano, exercicio['nome'])] = exercicio
+
+    with transaction.atomic():
+        ids_planos = _gravar_planos(planos, resultado)
+        _gravar_exercicios(exercicios, ids_planos, resultado)
+        # O cache é invalidado só depois que o lote for confirmado.
+        for plano_id in ids_planos.values():
+            transaction.on_commit(lambda plano_id=plano_id: invalidar_plano(plano_id))
+        # Quantidade de planos no perfil de cada dono.
+        for owner_id in {owner_id for owner_id, _ in ids_planos}:
+            transaction.on_commit(lambda owner_id=owner_id: invalidar_estatisticas(owner_id))
+        imagens = {e['imagens'] for e in exercicios.values() if e['imagens']}
+        # O storage do campo (o armazenamento por conteúdo), não o default_storage.
+        armazenamento = Exercicio._meta.get_field('imagens').storage
+        for nome in imagens:
+            # O arquivo pode ainda não ter sido copiado para o MEDIA_ROOT; gerar_derivados_imagens cobre esse caso depois.
+            if armazenamento.exists(nome) and not derivados_prontos(nome):
+                transaction.on_commit(lambda nome=nome: agendar_derivados(nome))
+
+
+def _atualizar(modelo, objetos, campos):
+    """
+    UPDATE ... WHERE id = %s com executemany.
+
+    bulk_update() monta um CASE WHEN por campo e por objeto, e esse trabalho em Python domina
+    o tempo com dezenas de milhares de linhas; um UPDATE preparado e repetido é bem mais barato.
+    """
+    if not objetos:
+        return
+    opcoes = modelo._meta
+    colunas = [opcoes.get_field(campo) for campo in campos]
+    atribuicoes = ', '.join(f'{connection.ops.quote_name(c.column)} = %s' for c in colunas)
+    sql = f'UPDATE {connection.ops.quote_name(opcoes.db_table)} SET {atribuicoes} WHERE {connection.ops.quote_name(opcoes.pk.column)} = %s'
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [c.get_db_prep_save(getattr(objeto, c.attname), connection) for c in colunas] + [objeto.pk]
+            for objeto in objetos
+        ])
+
+
+def _gravar_planos(planos, resultado):
+    """Cria ou atualiza os planos do lote e retorna {(owner_id, nome): id}."""
+    if not planos:
+        return {}
+    existentes = {
+        (p.owner_id, p.nome): p
+        for p in PlanoTreino.objects.filter(
+            owner_id__in={o for o, _ in planos}, nome__in={n for _, n in planos},
+        ).order_by('-id')  # Com nomes repetidos no banco, o plano mais antigo é o atualizado.
+    }
+    novos, alterados, publicados = [], [], []
+    agora = timezone.now()
+    for (owner_id, nome), dados in planos.items():
+        plano = existentes.get((owner_id, nome))
+        publico = dados['publico']
+        if plano is None:
+            novos.append(PlanoTreino(owner_id=owner_id, **{**dados, 'publico': bool(publico)}))
+            continue
+        if publico is None:
+            publico = plano.publico
+        if (plano.descricao, plano.tempo_estimado, plano.publico) != (dados['descricao'], dados['tempo_estimado'], publico):
+            if publico and not plano.publico:
+                publicados.append(plano.id)
+            plano.descricao, plano.tempo_estimado, plano.publico = dados['descricao'], dados['tempo_estimado'], publico
+            # O UPDATE direto não passa pelo auto_now.
+            plano.atualizado_em = agora
+            alterados.append(plano)
+    PlanoTreino.objects.bulk_create(novos)
+    _atualizar(PlanoTreino, alterados, ('descricao', 'tempo_estimado', 'publico', 'atualizado_em'))
+    if publicados:
+        # Como o sinal pre_save dos planos: os exercícios passam a aparecer na sincronização dos outros usuários.
+        Exercicio.objects.filter(plano_id__in=publicados).update(atualizado_em=agora)
+    resultado.planos_criados += len(novos)
+    resultado.planos_atualizados += len(alterados)
+    return {(p.owner_id, p.nome): p.id for p in (*existentes.values(), *novos)}
+
+
+def _gravar_exercicios(exercicios, ids_planos, resultado):
+    if not exercicios:
+        return
+    existentes = {
+        (e.plano_id, e.nome): e
+        for e in Exercicio.objects.filter(
+            plano_id__in={ids_planos[p] for p, _ in exercicios}, nome__in={n for _, n in exercicios},
+        ).order_by('-id')
+    }
+    campos = ('series', 'repeticoes', 'intervalo', 'intervalo_segundos', 'imagens')
+    novos, alterados = [], []
+    # Referências das imagens do armazenamento por conteúdo (ver ImagemConteudo).
+    referencias = Counter()
+    agora = timezone.now()
+    for (chave_plano, nome), dados in exercicios.items():
+        plano_id = ids_planos[chave_plano]
+        exercicio = existentes.get((plano_id, nome))
+        if exercicio is None:
+            novos.append(Exercicio(plano_id=plano_id, **dados))
+            referencias[dados['imagens']] += 1
+            continue
+        atuais = (
+            exercicio.series, exercicio.repeticoes, exercicio.intervalo, exercicio.intervalo_segundos,
+            exercicio.imagens.name or None,
+        )
+        if atuais != tuple(dados[c] for c in campos):
+            referencias[atuais[-1]] -= 1
+            referencias[dados['imagens']] += 1
+            for campo in campos:
+                setattr(exercicio, campo, dados[campo])
+            exercicio.atualizado_em = agora
+            alterados.append(exercicio)
+    Exercicio.objects.bulk_create(novos)
+    _atualizar(Exercicio, alterados, (*campos, 'atualizado_em'))
+    ImagemConteudo.ajustar(referencias)
+    resultado.exercicios_criados += len(novos)
+    resultado.exercicios_atualizados += len(alterados)
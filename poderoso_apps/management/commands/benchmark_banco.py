@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from poderoso_app.banco import SQLITE_PRAGMAS
+
+# Reproduz o padrão de escrita de SessaoTreino.definir_estados: lê o estado atual e depois grava.
+ESQUEMA = """
+    CREATE TABLE exercicio (id INTEGER PRIMARY KEY, plano_id INTEGER NOT NULL);
+    CREATE TABLE concluido (
+        sessao_id INTEGER NOT NULL, exercicio_id INTEGER NOT NULL, UNIQUE (sessao_id, exercicio_id)
+    );
+"""
+
+
+def _conectar(caminho, perfil):
+    if perfil == 'padrao':
+        # Igual ao settings.py: journal DELETE, timeout padrão do sqlite3 e BEGIN adiado (DEFERRED).
+        return sqlite3.connect(caminho, isolation_level=None, check_same_thread=False), 'BEGIN'
+    conexao = sqlite3.connect(caminho, isolation_level=None, check_same_thread=False)
+    for nome, valor in SQLITE_PRAGMAS.items():
+        conexao.execute(f'PRAGMA {nome}={valor}')
+    return conexao, 'BEGIN IMMEDIATE'
+
+
+def _trabalhador(caminho, perfil, sessao_id, operacoes, exercicios, resultado):
+    conexao, begin = _conectar(caminho, perfil)
+    sucesso = erros = 0
+    for i in range(operacoes):
+        exercicio_id = (sessao_id * 7 + i) % exercicios + 1
+        try:
+            conexao.execute(begin)
+            feito = conexao.execute(
+                'SELECT 1 FROM concluido WHERE sessao_id = ? AND exercicio_id = ?', (sessao_id, exercicio_id)
+            ).fetchone()
+            if feito:
+                conexao.execute(
+                    'DELETE FROM concluido WHERE sessao_id = ? AND exercicio_id = ?', (sessao_id, exercicio_id)
+                )
+            else:
+                conexao.execute('INSERT INTO concluido VALUES (?, ?)', (sessao_id, exercicio_id))
+            # Leitura do progresso, como na resposta da API.
+            conexao.execute('SELECT count(*) FROM concluido WHERE sessao_id = ?', (sessao_id,)).fetchone()
+            conexao.execute('COMMIT')
+            sucesso += 1
+        except sqlite3.OperationalError as erro:
+            if 'locked' not in str(erro) and 'busy' not in str(erro):
+                raise
+            erros += 1
+            if conexao.in_transaction:
+                conexao.execute('ROLLBACK')
+    conexao.close()
+    resultado.append((sucesso, erros))
+
+
+class Command(BaseCommand):
+    help = ('Mede a taxa de erros "database is locked" do SQLite com marcações de exercícios concorrentes, '
+            'comparando o perfil padrão com o perfil de produção (WAL, PRAGMAs e BEGIN IMMEDIATE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operacoes', type=int, default=200, help='Marcações por thread.')
+        parser.add_argument('--exercicios', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON.')
+
+    def executar(self, perfil, options):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'benchmark.sqlite3')
+            with sqlite3.connect(caminho) as conexao:
+                conexao.executescript(ESQUEMA)
+                conexao.executemany('INSERT INTO exercicio VALUES (?, 1)', [(i,) for i in range(1, options['exercicios'] + 1)])
+
+            resultado = []
+            threads = [
+                threading.Thread(target=_trabalhador, args=(
+                    caminho, perfil, sessao_id, options['operacoes'], options['exercicios'], resultado,
+                ))
+                for sessao_id in range(options['threads'])
+            ]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracao = time.perf_counter() - inicio
+
+        sucesso = sum(s for s, _ in resultado)
+        erros = sum(e for _, e in resultado)
+        return {
+            'perfil': perfil,
+            'operacoes': sucesso + erros,
+            'erros_lock': erros,
+            'taxa_erro': round(erros / (sucesso + erros), 4),
+            'operacoes_por_segundo': round(sucesso / duracao, 1),
+        }
+
+    def handle(self, *args, **options):
+        resultados = [self.executar(perfil, options) for perfil in ('padrao', 'producao')]
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for r in resultados:
+            self.stdout.write(
+                f"{r['perfil']:>9}: {r['operacoes']} operações, {r['erros_lock']} erros de lock "
+                f"({r['taxa_erro']:.2%}), {r['operacoes_por_segundo']} commits/s"
+            )
@@ -0,0 +1,188 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from .benchmark_views import ESCALAVEIS, VOLUMES, _percentil
+from .benchmark_views import Command as BenchmarkViews
+
+# Servidores comparados: o mesmo projeto servido por gunicorn (WSGI, views síncronas)
+# e por uvicorn (ASGI, views async de views_async.py).
+SERVIDORES = {
+    'wsgi': {'modulo': 'gunicorn', 'views_async': '0'},
+    'asgi': {'modulo': 'uvicorn', 'views_async': '1'},
+}
+
+
+def _comando_servidor(nome, porta, options):
+    if nome == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'poderoso_app.wsgi:application', '--bind', f'127.0.0.1:{porta}',
+                '--workers', str(options['workers']), '--threads', str(options['threads']), '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'poderoso_app.asgi:application', '--host', '127.0.0.1',
+            '--port', str(porta), '--workers', str(options['workers']), '--log-level', 'warning', '--no-access-log']
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _requisicao(porta, caminho, cookie):
+    """GET com Connection: close; retorna o status HTTP."""
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    try:
+        escritor.write((
+            f'GET {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n'
+        ).encode())
+        await escritor.drain()
+        primeira = await leitor.readline()
+        while await leitor.read(65536):
+            pass
+        return int(primeira.split()[1])
+    finally:
+        escritor.close()
+
+
+async def _carga(porta, caminho, cookie, clientes, duracao):
+    """'clientes' conexões simultâneas repetindo a requisição durante 'duracao' segundos."""
+    latencias, erros = [], 0
+    fim = time.perf_counter() + duracao
+
+    async def cliente():
+        nonlocal erros
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                status = await _requisicao(porta, caminho, cookie)
+            except (OSError, ValueError, IndexError):
+                status = None
+            if status != 200:
+                erros += 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(clientes)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'req_por_s': round(len(latencias) / total, 1),
+        'p50_ms': round(_percentil(latencias, 50), 2) if latencias else None,
+        'p95_ms': round(_percentil(latencias, 95), 2) if latencias else None,
+        'p99_ms': round(_percentil(latencias, 99), 2) if latencias else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compara a vazão do projeto servido por WSGI (gunicorn) e ASGI (uvicorn) com muitos clientes '
+            'simultâneos nas páginas de leitura, usando um banco SQLite temporário com o perfil de produção.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=64, help='Conexões simultâneas.')
+        parser.add_argument('--duracao', type=float, default=5, help='Segundos de carga por rota.')
+        parser.add_argument('--workers', type=int, default=1, help='Processos de cada servidor.')
+        parser.add_argument('--threads', type=int, default=8, help='Threads por worker do gunicorn.')
+        parser.add_argument('--escala', type=int, default=1, help='Escala dos dados (ver benchmark_views).')
+        parser.add_argument('--servidores', nargs='*', choices=sorted(SERVIDORES), default=sorted(SERVIDORES, reverse=True))
+        # Etapa interna: roda no subprocesso, já apontando para o banco temporário.
+        parser.add_argument('--semear', action='store_true', help='(uso interno) cria os dados e a sessão de teste.')
+
+    def handle(self, *args, **options):
+        if options['semear']:
+            return self.semear(options)
+
+        with tempfile.TemporaryDirectory(prefix='benchmark-servidores-') as pasta:
+            env = {
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'poderoso_app.settings_producao',
+                'DJANGO_DB_NAME': os.path.join(pasta, 'db.sqlite3'),
+                'DJANGO_CACHE_DIR': os.path.join(pasta, 'cache'),
+                'DJANGO_ALLOWED_HOSTS': '127.0.0.1',
+                'DJANGO_SECRET_KEY': os.environ.get('DJANGO_SECRET_KEY', 'benchmark-servidores-' + os.urandom(16).hex()),
+            }
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            subprocess.run(manage + ['migrate', '-v0'], env=env, check=True, cwd=settings.BASE_DIR)
+            semeadura = subprocess.run(
+                manage + ['benchmark_servidores', '--semear', '--escala', str(options['escala'])],
+                env=env, check=True, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            dados = json.loads(semeadura.stdout)
+
+            relatorio = {'clientes': options['clientes'], 'duracao_s': options['duracao'],
+                         'workers': options['workers'], 'escala': options['escala'], 'servidores': {}}
+            for nome in options['servidores']:
+                servidor = SERVIDORES[nome]
+                if importlib.util.find_spec(servidor['modulo']) is None:
+                    relatorio['servidores'][nome] = {'erro': f"{servidor['modulo']} não está instalado"}
+                    continue
+                relatorio['servidores'][nome] = self.medir(nome, dados, {**env, 'DJANGO_VIEWS_ASYNC': servidor['views_async']}, options)
+
+        self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+    def medir(self, nome, dados, env, options):
+        porta = _porta_livre()
+        processo = subprocess.Popen(_comando_servidor(nome, porta, options), env=env, cwd=settings.BASE_DIR)
+        try:
+            self.esperar(porta, processo)
+            resultados = {}
+            for rota, caminho in dados['rotas'].items():
+                # Aquece caches e conexões antes de medir.
+                asyncio.run(_carga(porta, caminho, dados['cookie'], 4, 0.5))
+                resultados[rota] = asyncio.run(
+                    _carga(porta, caminho, dados['cookie'], options['clientes'], options['duracao'])
+                )
+            return resultados
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+
+    def esperar(self, porta, processo, limite=30):
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim:
+            if processo.poll() is not None:
+                raise CommandError(f'O servidor terminou com código {processo.returncode}.')
+            try:
+                with socket.create_connection(('127.0.0.1', porta), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'O servidor não respondeu na porta {porta} em {limite}s.')
+
+    def semear(self, options):
+        """Cria os dados sintéticos e uma sessão logada; imprime o cookie e as rotas em JSON."""
+        volumes = {
+            nome: padrao * (options['escala'] if nome in ESCALAVEIS else 1)
+            for nome, padrao in VOLUMES.items()
+        }
+        # Sem imagens: o MEDIA_ROOT é o do projeto, e as páginas medidas não dependem delas.
+        volumes['imagens'] = 0
+        dados = BenchmarkViews().semear(volumes, media_root=None)
+        usuario = dados['usuario']
+        # A sessão é criada no mesmo backend que os servidores vão usar (SESSION_ENGINE).
+        sessao = importlib.import_module(settings.SESSION_ENGINE).SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.create()
+        self.stdout.write(json.dumps({
+            'cookie': f'{settings.SESSION_COOKIE_NAME}={sessao.session_key}',
+            'rotas': {
+                'topics': reverse('poderoso_apps:topics'),
+                'topic': reverse('poderoso_apps:topic', args=[dados['topico'].id]),
+                'planos_treinos': reverse('poderoso_apps:planos_treinos'),
+                'detalhes_plano': f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={dados['plano'].id}",
+            },
+        }))
@@ -0,0 +1,105 @@
+import json
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from .benchmark_views import VOLUMES, _percentil
+from .benchmark_views import Command as BenchmarkViews
+
+BACKENDS = {
+    'model': 'django.contrib.auth.backends.ModelBackend',
+    'cache': 'accounts.backends.UsuarioEmCacheBackend',
+}
+ESCRITAS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class _Consultas:
+    """Classifica as consultas da requisição: sessão, usuário e o restante (a view), e conta as escritas."""
+
+    def __init__(self):
+        self.contagem = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'django_session' in sql:
+            self.contagem['sessao'] += 1
+        elif 'FROM "auth_user"' in sql and 'JOIN' not in sql:
+            self.contagem['usuario'] += 1
+        else:
+            self.contagem['view'] += 1
+        if sql.lstrip().upper().startswith(ESCRITAS):
+            self.contagem['escritas'] += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Compara os perfis de sessão (PERFIS_SESSAO) com e sem o usuário em cache, medindo as consultas '
+            'por requisição em topics e detalhes_plano num banco de teste com dados sintéticos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=50, help='Requisições medidas por rota e combinação.')
+        parser.add_argument('--perfis', nargs='*', choices=sorted(settings.PERFIS_SESSAO), default=list(settings.PERFIS_SESSAO))
+        parser.add_argument('--backends', nargs='*', choices=sorted(BACKENDS), default=list(BACKENDS))
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, IMAGENS_DERIVADOS_WORKERS=0, DEBUG=False):
+                cache.clear()
+                dados = BenchmarkViews().semear({**VOLUMES, 'imagens': 0}, media_root)
+                rotas = {
+                    'topics': reverse('poderoso_apps:topics'),
+                    'detalhes_plano': f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={dados['plano'].id}",
+                }
+                resultados = {
+                    f'{perfil}+{backend}': self.medir(perfil, backend, dados['usuario'], rotas, options['repeticoes'])
+                    for perfil in options['perfis'] for backend in options['backends']
+                }
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+            cache.clear()
+
+        self.stdout.write(json.dumps({'repeticoes': options['repeticoes'], 'resultados': resultados}, indent=2))
+
+    def medir(self, perfil, backend, usuario, rotas, repeticoes):
+        ajustes = {
+            'SESSION_ENGINE': settings.PERFIS_SESSAO[perfil],
+            'AUTHENTICATION_BACKENDS': [BACKENDS[backend]],
+        }
+        resultado = {}
+        with override_settings(**ajustes):
+            cache.clear()
+            cliente = Client()
+            cliente.force_login(usuario, backend=BACKENDS[backend])
+            for nome, url in rotas.items():
+                # A primeira requisição preenche os caches (sessão, usuário, página do plano).
+                cliente.get(url)
+                total, latencias = Counter(), []
+                for _ in range(repeticoes):
+                    consultas = _Consultas()
+                    inicio = time.perf_counter()
+                    with connection.execute_wrapper(consultas):
+                        resposta = cliente.get(url)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    if resposta.status_code != 200:
+                        raise CommandError(f'{nome} respondeu {resposta.status_code} com {perfil}+{backend}.')
+                    total.update(consultas.contagem)
+                latencias.sort()
+                resultado[nome] = {
+                    **{tipo: round(total[tipo] / repeticoes, 2) for tipo in ('sessao', 'usuario', 'view', 'escritas')},
+                    'consultas': round(sum(total[t] for t in ('sessao', 'usuario', 'view')) / repeticoes, 2),
+                    'p50_ms': round(_percentil(latencias, 50), 3),
+                }
+        return resultado
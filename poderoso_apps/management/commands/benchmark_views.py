@@ -0,0 +1,285 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+
+from poderoso_apps.imagens import gerar_derivados
+from poderoso_apps.models import Entry, Exercicio, PlanoTreino, SessaoTreino, Topic
+
+# Volumes de escala 1 ("hoje"). A escala multiplica os volumes que crescem com o uso:
+# entradas por tópico (view topic), exercícios por plano (detalhes_planos) e planos (catálogo).
+VOLUMES = {
+    'usuarios': 5,
+    'topicos_por_usuario': 20,
+    'entradas_por_topico': 10,
+    'planos': 10,
+    'exercicios_por_plano': 8,
+    'imagens': 4,
+}
+ESCALAVEIS = ('entradas_por_topico', 'planos', 'exercicios_por_plano')
+NAMESPACES = ('poderoso_apps', 'accounts')
+SENHA = 'benchmark-senha-123'
+
+
+def _percentil(ordenados, p):
+    """Percentil pelo método do posto mais próximo."""
+    # Posto ceil(p/100 * n), contado a partir de 1. Multiplicar antes de dividir evita 7 / 100 * 100 = 7.000000000000001.
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p * len(ordenados) / 100) - 1))
+    return ordenados[indice]
+
+
+class _Medidor:
+    """Conta as consultas e soma o tempo de SQL via connection.execute_wrapper."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class Command(BaseCommand):
+    help = ('Cria um banco de teste com dados sintéticos, chama todas as rotas de poderoso_apps e accounts '
+            'pelo cliente de teste e reporta latência (p50/p95/p99), consultas e tempo de SQL por view, em JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=int, default=1, help='Multiplica os volumes que crescem com o uso (ex.: 10, 100).')
+        for nome, padrao in VOLUMES.items():
+            parser.add_argument(f"--{nome.replace('_', '-')}", type=int, dest=nome,
+                                help=f'Padrão: {padrao}{" x escala" if nome in ESCALAVEIS else ""}.')
+        parser.add_argument('--repeticoes', type=int, default=50, help='Requisições medidas por rota.')
+        parser.add_argument('--aquecimento', type=int, default=3, help='Requisições descartadas antes da medição.')
+        parser.add_argument('--rotas', nargs='*', help='Mede apenas estas rotas (ex.: poderoso_apps:topic).')
+        parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez da saída padrão.')
+        parser.add_argument('--condicional', action='store_true',
+                            help='Revalida as páginas: cada GET envia o ETag da resposta anterior (If-None-Match), '
+                                 'como um navegador com a página em cache.')
+
+    def handle(self, *args, **options):
+        volumes = {
+            nome: options[nome] if options[nome] is not None else padrao * (options['escala'] if nome in ESCALAVEIS else 1)
+            for nome, padrao in VOLUMES.items()
+        }
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        # Banco de teste (SQLite em memória por padrão): o banco configurado nunca é tocado.
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, IMAGENS_DERIVADOS_WORKERS=0, DEBUG=False):
+                cache.clear()
+                inicio = time.perf_counter()
+                dados = self.semear(volumes, media_root)
+                semeadura = time.perf_counter() - inicio
+                rotas, sem_cenario = self.medir(dados, options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+            cache.clear()
+
+        relatorio = {
+            'escala': options['escala'],
+            'volumes': volumes,
+            'semeadura_s': round(semeadura, 2),
+            'repeticoes': options['repeticoes'],
+            'rotas': rotas,
+            'sem_cenario': sem_cenario,
+        }
+        texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto)
+        else:
+            self.stdout.write(texto)
+
+    def semear(self, volumes, media_root):
+        """Cria usuários, tópicos, entradas, planos, exercícios e imagens com bulk_create."""
+        # O hash da senha é lento de propósito; como a senha é a mesma, é calculado uma vez só.
+        modelo = User()
+        modelo.set_password(SENHA)
+        User.objects.bulk_create([
+            User(username=f'bench{i}', password=modelo.password) for i in range(volumes['usuarios'])
+        ])
+        usuarios = list(User.objects.filter(username__startswith='bench').order_by('id'))
+
+        topicos = Topic.objects.bulk_create([
+            Topic(text=f'Tópico {u.id}-{i} treino de peito e costas', owner=u)
+            for u in usuarios for i in range(volumes['topicos_por_usuario'])
+        ], batch_size=1000)
+        Entry.objects.bulk_create((
+            Entry(topic=t, text=f'Entrada {i}: supino, remada e agachamento com carga progressiva.')
+            for t in topicos for i in range(volumes['entradas_por_topico'])
+        ), batch_size=1000)
+
+        imagens = []
+        for i in range(volumes['imagens']):
+            nome = f'benchmark/imagem{i}.png'
+            caminho = os.path.join(media_root, nome)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            Image.new('RGB', (800, 600), (40 * i % 256, 90, 160)).save(caminho)
+            gerar_derivados(caminho, media_root, False)
+            imagens.append(nome)
+
+        planos = PlanoTreino.objects.bulk_create([
+            PlanoTreino(nome=f'Plano {i}', descricao='Plano sintético do benchmark', owner=usuarios[i % len(usuarios)],
+                        tempo_estimado=60, publico=i % 2 == 0)
+            for i in range(volumes['planos'])
+        ])
+        Exercicio.objects.bulk_create((
+            Exercicio(plano=p, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s',
+                      intervalo_segundos=60,
+                      imagens=imagens[i % len(imagens)] if imagens else None)
+            for p in planos for i in range(volumes['exercicios_por_plano'])
+        ), batch_size=1000)
+
+        # Metade dos exercícios do primeiro plano concluídos na sessão aberta do usuário medido.
+        usuario, plano = usuarios[0], planos[0]
+        exercicios = list(plano.exercicios.values_list('id', flat=True))
+        SessaoTreino.aberta(usuario, plano).definir_estados({e: True for e in exercicios[::2]})
+
+        topico = Topic.objects.filter(owner=usuario).order_by('id').first()
+        return {
+            'usuario': usuario,
+            'topico': topico,
+            'entrada': topico.entry_set.order_by('id').first(),
+            'plano': plano,
+            'exercicios': exercicios,
+            'imagem': imagens[0] if imagens else None,
+        }
+
+    def cenarios(self, dados):
+        """Requisição de cada rota: {nome: {'url', 'metodo', 'corpo', 'content_type', 'anonimo'}}."""
+        usuario, plano = dados['usuario'], dados['plano']
+        estados = {str(e): i % 2 == 0 for i, e in enumerate(dados['exercicios'][:10])}
+        cenarios = {
+            'poderoso_apps:topic': {'url': reverse('poderoso_apps:topic', args=[dados['topico'].id])},
+            'poderoso_apps:new_entry': {'url': reverse('poderoso_apps:new_entry', args=[dados['topico'].id])},
+            'poderoso_apps:edit_entry': {'url': reverse('poderoso_apps:edit_entry', args=[dados['entrada'].id])},
+            'poderoso_apps:buscar': {'url': reverse('poderoso_apps:buscar') + '?q=supino'},
+            'poderoso_apps:planos_treinos': {'url': reverse('poderoso_apps:planos_treinos') + f'?plano_id={plano.id}'},
+            'poderoso_apps:detalhes_plano': {'url': reverse('poderoso_apps:detalhes_plano') + f'?plano_id={plano.id}'},
+            'poderoso_apps:definir_concluidos': {
+                'url': reverse('poderoso_apps:definir_concluidos'), 'metodo': 'post', 'content_type': 'application/json',
+                'corpo': json.dumps({'plano_id': plano.id, 'estados': estados}),
+            },
+            'poderoso_apps:calcular_tmb_lote': {
+                'url': reverse('poderoso_apps:calcular_tmb_lote'), 'metodo': 'post', 'content_type': 'text/csv',
+                'corpo': 'peso,idade,altura,sexo\n' + '70,30,175,H\n60,25,165,M\n' * 500,
+            },
+            'accounts:logout': {'url': reverse('accounts:logout'), 'metodo': 'post'},
+            'accounts:password_reset_confirm': {'url': reverse('accounts:password_reset_confirm', kwargs={
+                'uidb64': urlsafe_base64_encode(force_bytes(usuario.pk)),
+                'token': default_token_generator.make_token(usuario),
+            })},
+        }
+        if dados['imagem']:
+            cenarios['poderoso_apps:media'] = {'url': reverse('poderoso_apps:media', args=[dados['imagem']])}
+        for nome in ('login', 'register', 'password_reset'):
+            cenarios[f'accounts:{nome}'] = {'url': reverse(f'accounts:{nome}'), 'anonimo': True}
+        return cenarios
+
+    def rotas(self):
+        """Lista (nome, tem_argumentos) de todas as rotas dos namespaces medidos."""
+        encontradas = []
+
+        def percorrer(padroes, namespace):
+            for padrao in padroes:
+                if isinstance(padrao, URLResolver):
+                    percorrer(padrao.url_patterns, padrao.namespace or namespace)
+                elif isinstance(padrao, URLPattern) and padrao.name and namespace in NAMESPACES:
+                    nome = f'{namespace}:{padrao.name}'
+                    if nome not in (n for n, _ in encontradas):
+                        encontradas.append((nome, bool(padrao.pattern.regex.groupindex)))
+
+        percorrer(get_resolver().url_patterns, None)
+        return encontradas
+
+    def medir(self, dados, options):
+        cenarios = self.cenarios(dados)
+        cliente = Client()
+        resultados, sem_cenario = {}, []
+        for nome, tem_argumentos in self.rotas():
+            if options['rotas'] and nome not in options['rotas']:
+                continue
+            cenario = cenarios.get(nome)
+            if cenario is None:
+                if tem_argumentos:
+                    sem_cenario.append(nome)
+                    continue
+                cenario = {'url': reverse(nome)}
+            resultados[nome] = self.medir_rota(cliente, dados['usuario'], cenario, options)
+        if options['rotas'] and not resultados:
+            raise CommandError('Nenhuma das rotas pedidas existe.')
+        return resultados, sem_cenario
+
+    def medir_rota(self, cliente, usuario, cenario, options):
+        metodo = getattr(cliente, cenario.get('metodo', 'get'))
+        argumentos = {}
+        if 'corpo' in cenario:
+            argumentos = {'data': cenario['corpo'], 'content_type': cenario['content_type']}
+
+        latencias, consultas, tempos_sql, status = [], [], [], defaultdict(int)
+        etag = None
+        for i in range(options['aquecimento'] + options['repeticoes']):
+            # Cada requisição começa com uma sessão nova (o logout, por exemplo, encerra a anterior).
+            csrf = cliente.cookies.get(settings.CSRF_COOKIE_NAME)
+            cliente.logout()
+            if not cenario.get('anonimo'):
+                cliente.force_login(usuario)
+            if etag:
+                # O segredo CSRF faz parte do ETag (ver condicional.py): o navegador o manteria.
+                cliente.cookies[settings.CSRF_COOKIE_NAME] = csrf.value
+                argumentos['headers'] = {'If-None-Match': etag}
+            medidor = _Medidor()
+            inicio = time.perf_counter()
+            with connection.execute_wrapper(medidor):
+                resposta = metodo(cenario['url'], **argumentos)
+                if resposta.streaming:
+                    # A resposta em streaming só é produzida quando consumida.
+                    for _ in resposta.streaming_content:
+                        pass
+            duracao = time.perf_counter() - inicio
+            if options['condicional'] and cenario.get('metodo', 'get') == 'get':
+                etag = resposta.get('ETag', etag)
+            if i < options['aquecimento']:
+                continue
+            latencias.append(duracao * 1000)
+            consultas.append(medidor.consultas)
+            tempos_sql.append(medidor.tempo * 1000)
+            status[resposta.status_code] += 1
+
+        latencias.sort()
+        return {
+            'url': cenario['url'],
+            'metodo': cenario.get('metodo', 'get').upper(),
+            'status': dict(status),
+            'p50_ms': round(_percentil(latencias, 50), 3),
+            'p95_ms': round(_percentil(latencias, 95), 3),
+            'p99_ms': round(_percentil(latencias, 99), 3),
+            'media_ms': round(sum(latencias) / len(latencias), 3),
+            'consultas': round(sum(consultas) / len(consultas), 2),
+            'consultas_max': max(consultas),
+            'sql_ms': round(sum(tempos_sql) / len(tempos_sql), 3),
+        }
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from poderoso_apps import tmb
+
+
+class Command(BaseCommand):
+    help = ('Calcula a TMB de uma lista de alunos em CSV (peso, idade, altura, sexo) ou JSON. '
+            'Lê e escreve em blocos, então listas grandes não precisam caber na memória.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('entrada', help="Arquivo .csv ou .json ('-' lê CSV da entrada padrão).")
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão).')
+        parser.add_argument('--formato', choices=('csv', 'json'), help='Formato da saída (padrão: o da entrada).')
+
+    def handle(self, *args, **options):
+        entrada = options['entrada']
+        formato_entrada = 'json' if entrada.lower().endswith('.json') else 'csv'
+        arquivo = sys.stdin if entrada == '-' else open(entrada, encoding='utf-8-sig', newline='')
+        saida = open(options['saida'], 'w', encoding='utf-8', newline='') if options['saida'] else None
+        escrever_saida = saida.write if saida else (lambda texto: self.stdout.write(texto, ending=''))
+        inicio = time.perf_counter()
+        linhas = erros = 0
+        try:
+            try:
+                if formato_entrada == 'json':
+                    blocos = tmb.ler_json(arquivo)
+                else:
+                    blocos = tmb.ler_csv(arquivo)
+            except ValueError as erro:
+                raise CommandError(str(erro))
+
+            def contar(resultados):
+                nonlocal linhas, erros
+                for resultado in resultados:
+                    linhas += 1
+                    erros += resultado[2] is not None
+                    yield resultado
+
+            escrever = tmb.escrever_json if (options['formato'] or formato_entrada) == 'json' else tmb.escrever_csv
+            for pedaco in escrever(contar(tmb.resultados(blocos))):
+                escrever_saida(pedaco)
+        finally:
+            if arquivo is not sys.stdin:
+                arquivo.close()
+            if saida:
+                saida.close()
+
+        self.stderr.write(
+            f'{linhas} linhas ({erros} com erro) em {time.perf_counter() - inicio:.3f}s '
+            f"({'NumPy' if tmb.np is not None else 'Python puro'})."
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+
+from poderoso_apps import clonagem
+from poderoso_apps.models import PlanoTreino
+
+
+class Command(BaseCommand):
+    help = ('Clona um plano de treino, com todos os exercícios, para vários usuários de uma vez. '
+            'Quem já tem um plano com o mesmo nome é pulado; as imagens são compartilhadas, não copiadas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('plano_id', type=int, help='Id do plano modelo.')
+        parser.add_argument('usuarios', nargs='*', help='Usernames que recebem o plano.')
+        parser.add_argument('--grupo', help='Clona também para todos os usuários ativos deste grupo.')
+        parser.add_argument('--arquivo', help='Arquivo com um username por linha.')
+        parser.add_argument('--duplicar', action='store_true', help='Cria a cópia mesmo para quem já tem um plano com o mesmo nome.')
+
+    def handle(self, *args, **options):
+        modelo = PlanoTreino.objects.filter(id=options['plano_id']).first()
+        if modelo is None:
+            raise CommandError(f'Plano {options["plano_id"]} não existe.')
+        if options['grupo'] and not Group.objects.filter(name=options['grupo']).exists():
+            raise CommandError(f'Grupo "{options["grupo"]}" não existe.')
+
+        usernames = list(options['usuarios'])
+        if options['arquivo']:
+            with open(options['arquivo'], encoding='utf-8') as arquivo:
+                usernames += [linha.strip() for linha in arquivo]
+        owner_ids, desconhecidos = clonagem.ids_dos_usuarios(usernames, options['grupo'])
+        if desconhecidos:
+            raise CommandError(f'Usuários inexistentes: {", ".join(desconhecidos[:20])}')
+        if not owner_ids:
+            raise CommandError('Informe usernames, --arquivo ou --grupo.')
+
+        inicio = time.perf_counter()
+        planos, exercicios = clonagem.clonar_plano(modelo, owner_ids, ignorar_existentes=not options['duplicar'])
+        self.stdout.write(self.style.SUCCESS(
+            f'"{modelo.nome}": {len(planos)} planos e {exercicios} exercícios criados; '
+            f'{len(owner_ids) - len(planos)} usuários já tinham o plano. ({time.perf_counter() - inicio:.2f}s)'
+        ))
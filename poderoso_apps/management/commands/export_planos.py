@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from poderoso_apps import importacao
+from poderoso_apps.models import PlanoTreino
+
+
+class Command(BaseCommand):
+    help = ('Exporta planos de treino e exercícios para CSV ou JSON Lines (uma linha por exercício), '
+            'no formato aceito por import_planos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão).')
+        parser.add_argument('--formato', choices=importacao.FORMATOS, help='Padrão: pela extensão de --saida, ou CSV.')
+        parser.add_argument('--owner', help='Exporta apenas os planos deste username.')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or importacao.formato_do_nome(options['saida'] or '.csv')
+        planos = PlanoTreino.objects.all()
+        if options['owner']:
+            planos = planos.filter(owner__username=options['owner'])
+        pedacos = importacao.escrever(importacao.linhas_exportacao(planos), formato)
+        if not options['saida']:
+            for pedaco in pedacos:
+                self.stdout.write(pedaco, ending='')
+            return
+        with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+            for pedaco in pedacos:
+                arquivo.write(pedaco)
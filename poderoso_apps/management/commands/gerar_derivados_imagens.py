@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from poderoso_apps.imagens import EXTENSOES_IMAGEM, PASTA_DERIVADOS, gerar_derivados
+
+
+class Command(BaseCommand):
+    help = 'Gera miniaturas, WebP e posters para as imagens já existentes em MEDIA_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forcar', action='store_true', help='Regera derivados que já existem.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Número de processos.')
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        caminhos = []
+        for pasta, subpastas, arquivos in os.walk(media_root):
+            # Não processa os próprios derivados.
+            if pasta == media_root and PASTA_DERIVADOS in subpastas:
+                subpastas.remove(PASTA_DERIVADOS)
+            caminhos += [
+                os.path.join(pasta, arquivo) for arquivo in arquivos
+                if os.path.splitext(arquivo)[1].lower() in EXTENSOES_IMAGEM
+            ]
+
+        gerados = falhas = 0
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futuros = {pool.submit(gerar_derivados, c, media_root, options['forcar']): c for c in caminhos}
+            for futuro in as_completed(futuros):
+                try:
+                    gerados += len(futuro.result())
+                except Exception as erro:
+                    falhas += 1
+                    self.stderr.write(f'{futuros[futuro]}: {erro}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(caminhos)} imagens verificadas, {gerados} derivados gerados, {falhas} falhas.'
+        ))
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from poderoso_apps import importacao
+
+
+class Command(BaseCommand):
+    help = ('Importa planos de treino e exercícios de um arquivo CSV ou JSON Lines (uma linha por exercício), '
+            'criando ou atualizando em lotes. Ver poderoso_apps/importacao.py para as colunas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Arquivo .csv ou .jsonl ('-' lê da entrada padrão).")
+        parser.add_argument('--formato', choices=importacao.FORMATOS, help='Padrão: pela extensão do arquivo (CSV na entrada padrão).')
+        parser.add_argument('--lote', type=int, default=importacao.TAMANHO_LOTE, help='Linhas gravadas por transação.')
+        parser.add_argument('--owner', help='Username usado nas linhas sem a coluna owner.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser maior que zero.')
+        formato = options['formato'] or importacao.formato_do_nome(options['arquivo'])
+        inicio = time.perf_counter()
+        arquivo = sys.stdin if options['arquivo'] == '-' else open(options['arquivo'], encoding='utf-8-sig', newline='')
+        try:
+            resultado = importacao.importar(
+                importacao.ler(arquivo, formato), tamanho_lote=options['lote'], owner_padrao=options['owner'],
+            )
+        except ValueError as erro:
+            raise CommandError(str(erro))
+        finally:
+            if arquivo is not sys.stdin:
+                arquivo.close()
+
+        for erro in resultado.erros:
+            self.stderr.write(erro)
+        if resultado.total_erros > len(resultado.erros):
+            self.stderr.write(f'... e mais {resultado.total_erros - len(resultado.erros)} erros.')
+        r = resultado.como_dict()
+        self.stdout.write(
+            f"Planos: {r['planos_criados']} criados, {r['planos_atualizados']} atualizados. "
+            f"Exercícios: {r['exercicios_criados']} criados, {r['exercicios_atualizados']} atualizados. "
+            f"{r['erros']} linhas com erro. ({time.perf_counter() - inicio:.2f}s)"
+        )
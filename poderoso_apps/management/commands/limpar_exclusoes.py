@@ -0,0 +1,24 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from poderoso_apps.models import Exclusao
+
+
+class Command(BaseCommand):
+    help = ('Apaga os registros de exclusão (tombstones) da sincronização mais antigos que a retenção. '
+            'Aplicativos com um cursor anterior recebem "reiniciar" e baixam tudo de novo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.SYNC_RETENCAO_DIAS,
+                            help='Dias guardados (padrão SYNC_RETENCAO_DIAS).')
+
+    def handle(self, *args, **options):
+        if options['dias'] < settings.SYNC_RETENCAO_DIAS:
+            # Os cursores entre os dois prazos perderiam exclusões sem receber "reiniciar".
+            raise CommandError(f'--dias não pode ser menor que SYNC_RETENCAO_DIAS ({settings.SYNC_RETENCAO_DIAS}).')
+        limite = timezone.now() - datetime.timedelta(days=options['dias'])
+        apagadas, _ = Exclusao.objects.filter(excluido_em__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f'{apagadas} exclusões anteriores a {limite:%d/%m/%Y} apagadas.'))
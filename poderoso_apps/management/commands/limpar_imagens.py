@@ -0,0 +1,110 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from poderoso_apps.armazenamento import PASTA_CONTEUDO, PASTA_TEMPORARIA, armazenamento_imagens, e_conteudo
+from poderoso_apps.cache import invalidar_plano
+from poderoso_apps.imagens import agendar_derivados, derivados_prontos, nomes_derivados
+from poderoso_apps.models import Exercicio, ImagemConteudo
+
+
+class Command(BaseCommand):
+    help = ('Apaga do armazenamento por conteúdo as imagens sem referências (e seus derivados). '
+            'Com --converter, move antes as imagens antigas dos exercícios para o armazenamento por conteúdo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carencia', type=int, default=60,
+                            help='Minutos desde a última gravação do arquivo antes de apagá-lo (envios em andamento).')
+        parser.add_argument('--recontar', action='store_true', help='Refaz as contagens a partir dos exercícios antes de limpar.')
+        parser.add_argument('--converter', action='store_true',
+                            help='Grava as imagens com nomes antigos pelo hash, atualiza os exercícios e apaga os originais.')
+        parser.add_argument('--simular', action='store_true', help='Só lista o que seria apagado.')
+
+    def handle(self, *args, **options):
+        self.simular = options['simular']
+        if options['converter'] and not self.simular:
+            self.converter()
+        if options['recontar'] and not self.simular:
+            ImagemConteudo.recontar()
+
+        limite = time.time() - options['carencia'] * 60
+        apagados = bytes_liberados = 0
+        # Arquivos com contagem zerada. A lista é lida antes: as linhas são apagadas durante o laço, e no
+        # SQLite um cursor aberto na mesma conexão (iterator()) pode pular linhas nesse caso.
+        for nome in list(ImagemConteudo.objects.filter(referencias__lte=0).values_list('nome', flat=True)):
+            if self.recente(nome, limite):
+                continue
+            with transaction.atomic():
+                # Confere de novo: um exercício pode ter passado a usar o arquivo enquanto isso.
+                if not self.simular and not ImagemConteudo.objects.filter(nome=nome, referencias__lte=0).delete()[0]:
+                    continue
+                tamanho = self.apagar(nome)
+            apagados += 1
+            bytes_liberados += tamanho
+
+        # Arquivos sem linha em ImagemConteudo: envios de transações desfeitas e temporários esquecidos.
+        raiz = armazenamento_imagens.path(PASTA_CONTEUDO)
+        for pasta, _, arquivos in os.walk(raiz):
+            for arquivo in arquivos:
+                nome = os.path.relpath(os.path.join(pasta, arquivo), armazenamento_imagens.location).replace(os.sep, '/')
+                if self.recente(nome, limite):
+                    continue
+                temporario = nome.startswith(f'{PASTA_CONTEUDO}/{PASTA_TEMPORARIA}/')
+                if not temporario and (
+                    ImagemConteudo.objects.filter(nome=nome).exists() or Exercicio.objects.filter(imagens=nome).exists()
+                ):
+                    continue
+                apagados += 1
+                bytes_liberados += self.apagar(nome, derivados=not temporario)
+
+        verbo = 'seriam apagados' if self.simular else 'apagados'
+        self.stdout.write(self.style.SUCCESS(f'{apagados} arquivos {verbo} ({bytes_liberados / 1024:.0f} KiB).'))
+
+    def recente(self, nome, limite):
+        try:
+            return os.path.getmtime(armazenamento_imagens.path(nome)) >= limite
+        except FileNotFoundError:
+            return False
+
+    def apagar(self, nome, derivados=True):
+        """Apaga o arquivo e os derivados; retorna os bytes liberados."""
+        nomes = [nome]
+        if derivados:
+            nomes += [derivado for tamanhos in nomes_derivados(nome).values() for derivado in tamanhos.values()]
+        total = 0
+        for atual in nomes:
+            caminho = armazenamento_imagens.path(atual)
+            if os.path.exists(caminho):
+                total += os.path.getsize(caminho)
+                if self.simular:
+                    self.stdout.write(atual)
+                else:
+                    os.remove(caminho)
+        return total
+
+    def converter(self):
+        """Grava cada imagem antiga pelo hash e troca o nome em todos os exercícios que a usam."""
+        antigas = (Exercicio.objects.exclude(imagens__startswith=f'{PASTA_CONTEUDO}/').exclude(imagens='')
+                   .exclude(imagens__isnull=True).values_list('imagens', flat=True).distinct())
+        convertidas = 0
+        for antigo in list(antigas):
+            if e_conteudo(antigo) or not armazenamento_imagens.exists(antigo):
+                self.stderr.write(f'{antigo}: arquivo não encontrado.')
+                continue
+            with armazenamento_imagens.open(antigo) as arquivo:
+                novo = armazenamento_imagens.save(antigo, arquivo)
+            with transaction.atomic():
+                exercicios = Exercicio.objects.filter(imagens=antigo)
+                planos = set(exercicios.values_list('plano_id', flat=True))
+                # O UPDATE direto não passa pelo auto_now nem pelos sinais.
+                ImagemConteudo.ajustar({novo: exercicios.update(imagens=novo, atualizado_em=timezone.now())})
+                for plano_id in planos:
+                    transaction.on_commit(lambda plano_id=plano_id: invalidar_plano(plano_id))
+            if not derivados_prontos(novo):
+                agendar_derivados(novo)
+            self.apagar(antigo)
+            convertidas += 1
+        self.stdout.write(f'{convertidas} imagens antigas convertidas.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from poderoso_apps import busca
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca textual (FTS5) dos tópicos e entradas.'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('O índice FTS5 só existe no SQLite; nos outros bancos a busca não usa índice próprio.')
+        with transaction.atomic():
+            total = busca.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'{total} tópicos e entradas indexados.'))
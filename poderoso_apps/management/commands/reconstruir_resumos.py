@@ -0,0 +1,46 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from poderoso_apps.models import RegistroSerie, ResumoTreinoDiario
+
+
+def _data(texto):
+    try:
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise CommandError(f'Data inválida: {texto!r} (use AAAA-MM-DD).')
+
+
+class Command(BaseCommand):
+    help = ('Refaz os resumos diários de treino (ResumoTreinoDiario) a partir do histórico de séries. '
+            'Pode ser repetido sem duplicar dados; sem datas, cobre todo o histórico.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=_data, help='Primeiro dia (AAAA-MM-DD).')
+        parser.add_argument('--fim', type=_data, help='Último dia, inclusive (AAAA-MM-DD).')
+        parser.add_argument('--owner', help='Refaz apenas os resumos deste username.')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f'Usuário "{options["owner"]}" não existe.')
+
+        inicio, fim = options['inicio'], options['fim']
+        if inicio is None or fim is None:
+            series = RegistroSerie.objects.all() if owner is None else RegistroSerie.objects.filter(owner=owner)
+            limites = series.annotate(dia=TruncDate('registrada_em')).aggregate(primeiro=Min('dia'), ultimo=Max('dia'))
+            hoje = timezone.localdate()
+            inicio = inicio or limites['primeiro'] or hoje
+            fim = fim or max(limites['ultimo'] or hoje, inicio)
+        if inicio > fim:
+            raise CommandError('--inicio deve ser anterior a --fim.')
+
+        total = ResumoTreinoDiario.reconstruir(inicio, fim, owner=owner)
+        self.stdout.write(self.style.SUCCESS(f'{total} resumos gravados de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}.'))
@@ -0,0 +1,213 @@
+"""
+Medição das requisições: tempo total, consultas ao banco e renderização de templates.
+
+MetricasMiddleware mede cada requisição, devolve os tempos no cabeçalho Server-Timing
+(visível na aba de rede do navegador) e acumula histogramas por view, expostos pela view
+'metricas' no formato texto do Prometheus.
+
+Os histogramas ficam na memória do processo: com vários workers, cada um tem os seus, e o
+Prometheus soma as séries de todos os alvos. O custo por requisição é o de alguns
+perf_counter() e de um incremento de contador por consulta.
+
+As consultas são contadas por _contar_consulta, instalado uma vez na conexão de cada thread.
+As conexões do Django são por thread, e nas views async o ORM roda numa thread de sync_to_async,
+não na do laço de eventos: instalar o contador na conexão da thread do middleware não veria essas
+consultas. Ele lê a medição da requisição pelo ContextVar, que o sync_to_async copia para a thread
+que executa as consultas; requisições simultâneas não mexem na lista de wrappers da conexão.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+
+# Limites dos baldes, como nos clientes oficiais do Prometheus.
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+BALDES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SEM_ROTA = '<sem rota>'
+
+# Medição da requisição em andamento; ContextVar separa threads e tarefas assíncronas.
+_medicao = ContextVar('medicao', default=None)
+
+
+class Histograma:
+    """Histograma com rótulo 'view', no modelo do Prometheus (baldes cumulativos, _sum e _count)."""
+
+    def __init__(self, nome, descricao, baldes):
+        self.nome = nome
+        self.descricao = descricao
+        self.baldes = baldes
+        self._series = {}
+        self._trava = threading.Lock()
+
+    def observar(self, view, valor):
+        indice = bisect_left(self.baldes, valor)
+        with self._trava:
+            serie = self._series.get(view)
+            if serie is None:
+                # Um contador por balde, mais o "+Inf", a soma e a quantidade.
+                serie = self._series[view] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def limpar(self):
+        with self._trava:
+            self._series.clear()
+
+    def exportar(self):
+        """Linhas no formato texto do Prometheus."""
+        with self._trava:
+            series = {view: (contagens[:], soma, total) for view, (contagens, soma, total) in self._series.items()}
+        linhas = [f'# HELP {self.nome} {self.descricao}', f'# TYPE {self.nome} histogram']
+        for view in sorted(series):
+            contagens, soma, total = series[view]
+            rotulo = view.replace('\\', '\\\\').replace('"', '\\"')
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + ('+Inf',), contagens):
+                acumulado += contagem
+                linhas.append(f'{self.nome}_bucket{{view="{rotulo}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{self.nome}_sum{{view="{rotulo}"}} {soma}')
+            linhas.append(f'{self.nome}_count{{view="{rotulo}"}} {total}')
+        return linhas
+
+
+DURACAO = Histograma('poderoso_request_duration_seconds', 'Tempo total da requisição na view.', BALDES_SEGUNDOS)
+CONSULTAS = Histograma('poderoso_db_queries', 'Consultas ao banco por requisição.', BALDES_CONSULTAS)
+DURACAO_SQL = Histograma('poderoso_db_duration_seconds', 'Tempo gasto em SQL por requisição.', BALDES_SEGUNDOS)
+DURACAO_TEMPLATES = Histograma(
+    'poderoso_template_render_seconds', 'Tempo de renderização de templates por requisição.', BALDES_SEGUNDOS,
+)
+HISTOGRAMAS = (DURACAO, CONSULTAS, DURACAO_SQL, DURACAO_TEMPLATES)
+
+
+def exportar():
+    """Todos os histogramas no formato texto do Prometheus."""
+    return '\n'.join(linha for histograma in HISTOGRAMAS for linha in histograma.exportar()) + '\n'
+
+
+class _Medicao:
+    __slots__ = ('consultas', 'tempo_sql', 'tempo_templates', 'renderizando')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.tempo_templates = 0.0
+        self.renderizando = False
+
+
+def _contar_consulta(execute, sql, params, many, context):
+    """Wrapper de execução (connection.execute_wrappers): conta e cronometra a consulta da requisição medida."""
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_sql += time.perf_counter() - inicio
+        medicao.consultas += 1
+
+
+def _instalar_contador():
+    """Instala _contar_consulta na conexão da thread atual, se ainda não estiver."""
+    if _contar_consulta not in connection.execute_wrappers:
+        # No início da lista: connection.execute_wrapper() usado por outro código tira o último ao sair.
+        connection.execute_wrappers.insert(0, _contar_consulta)
+
+
+class _TemplateMedido:
+    """Envolve o template do backend e soma o tempo de render() na medição da requisição."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, nome):
+        return getattr(self._template, nome)
+
+    def render(self, context=None, request=None):
+        medicao = _medicao.get()
+        # Templates renderizados dentro de outro (ex.: render_to_string num filtro) já estão no tempo do externo.
+        if medicao is None or medicao.renderizando:
+            return self._template.render(context, request)
+        medicao.renderizando = True
+        inicio = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            medicao.tempo_templates += time.perf_counter() - inicio
+            medicao.renderizando = False
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """Backend de templates do Django que mede o tempo de renderização (ver TEMPLATES no settings)."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name))
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição e acrescenta o cabeçalho Server-Timing (desligue com METRICAS_ATIVAS = False).
+
+    Funciona nos dois modos, para não forçar uma troca de thread na frente das views async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_ATIVAS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._medir_async(request)
+        _instalar_contador()
+        medicao = _Medicao()
+        token = _medicao.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self._registrar(request, response, medicao, time.perf_counter() - inicio)
+
+    async def _medir_async(self, request):
+        # Na thread em que o ORM das views async roda (a mesma de sync_to_async com thread_sensitive).
+        await sync_to_async(_instalar_contador)()
+        medicao = _Medicao()
+        token = _medicao.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self._registrar(request, response, medicao, time.perf_counter() - inicio)
+
+    def _registrar(self, request, response, medicao, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else SEM_ROTA
+        DURACAO.observar(view, total)
+        CONSULTAS.observar(view, medicao.consultas)
+        DURACAO_SQL.observar(view, medicao.tempo_sql)
+        DURACAO_TEMPLATES.observar(view, medicao.tempo_templates)
+
+        # Em respostas em streaming, o tempo é o da view até a resposta começar a ser enviada.
+        response['Server-Timing'] = (
+            f'db;dur={medicao.tempo_sql * 1000:.2f};desc="{medicao.consultas} consultas", '
+            f'tpl;dur={medicao.tempo_templates * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
@@ -0,0 +1,105 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+LOTE = 2000
+
+
+def copiar_concluidos(apps, schema_editor):
+    """
+    Leva o 'concluido' dos exercícios para uma sessão aberta do dono de cada plano.
+
+    A conclusão passou a ser de cada usuário, e até aqui só o dono do plano podia marcá-la.
+    """
+    Exercicio = apps.get_model('poderoso_apps', 'Exercicio')
+    SessaoTreino = apps.get_model('poderoso_apps', 'SessaoTreino')
+    Concluido = SessaoTreino.exercicios_concluidos.through
+    alias = schema_editor.connection.alias
+    por_plano = {}
+    concluidos = Exercicio.objects.using(alias).filter(concluido=True).values_list('pk', 'plano_id', 'plano__owner_id')
+    for pk, plano_id, owner_id in concluidos.iterator(chunk_size=LOTE):
+        por_plano.setdefault((owner_id, plano_id), []).append(pk)
+    for (owner_id, plano_id), pks in por_plano.items():
+        sessao = SessaoTreino.objects.using(alias).create(owner_id=owner_id, plano_id=plano_id)
+        Concluido.objects.using(alias).bulk_create(
+            [Concluido(sessaotreino_id=sessao.pk, exercicio_id=pk) for pk in pks], batch_size=LOTE
+        )
+
+
+def devolver_concluidos(apps, schema_editor):
+    """Marca de novo os exercícios concluídos na sessão aberta do dono do plano."""
+    Exercicio = apps.get_model('poderoso_apps', 'Exercicio')
+    SessaoTreino = apps.get_model('poderoso_apps', 'SessaoTreino')
+    Concluido = SessaoTreino.exercicios_concluidos.through
+    alias = schema_editor.connection.alias
+    do_dono = Concluido.objects.using(alias).filter(
+        sessaotreino__finalizada_em__isnull=True, sessaotreino__owner_id=F('sessaotreino__plano__owner_id'),
+    )
+    Exercicio.objects.using(alias).filter(pk__in=do_dono.values('exercicio_id')).update(concluido=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0011_alter_exercicio_imagens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessaoTreino',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciada_em', models.DateTimeField(auto_now_add=True)),
+                ('finalizada_em', models.DateTimeField(blank=True, null=True)),
+                ('exercicios_concluidos', models.ManyToManyField(blank=True, related_name='sessoes_abertas', to='poderoso_apps.exercicio')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('plano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessoes', to='poderoso_apps.planotreino')),
+            ],
+            options={
+                'verbose_name_plural': 'sessões de treino',
+            },
+        ),
+        migrations.RunPython(copiar_concluidos, devolver_concluidos),
+        migrations.RemoveField(
+            model_name='exercicio',
+            name='concluido',
+        ),
+        migrations.CreateModel(
+            name='RegistroSerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField(help_text='Número da série dentro do exercício')),
+                ('repeticoes', models.PositiveIntegerField()),
+                ('registrada_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('exercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poderoso_apps.exercicio')),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('plano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poderoso_apps.planotreino')),
+                ('sessao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='poderoso_apps.sessaotreino')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='sessaotreino',
+            index=models.Index(fields=['owner', 'plano', '-iniciada_em'], name='sessao_owner_plano_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessaotreino',
+            constraint=models.UniqueConstraint(condition=models.Q(('finalizada_em__isnull', True)), fields=('owner', 'plano'), name='sessao_aberta_unica'),
+        ),
+        migrations.AddIndex(
+            model_name='registroserie',
+            index=models.Index(fields=['owner', '-registrada_em'], name='serie_owner_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroserie',
+            index=models.Index(fields=['owner', 'plano', '-registrada_em'], name='serie_owner_plano_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroserie',
+            index=models.Index(fields=['owner', 'exercicio', '-registrada_em'], name='serie_owner_exerc_data_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0012_sessaotreino_registroserie'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['topic', 'date_added'], name='entry_topic_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['owner', 'date_added'], name='topic_owner_data_idx'),
+        ),
+    ]
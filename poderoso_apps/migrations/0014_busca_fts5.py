@@ -0,0 +1,96 @@
+# Índice de busca textual (SQLite FTS5) sobre Topic.text e Entry.text, mantido por triggers.
+
+from django.db import migrations
+
+# rowid = id * 2 para tópicos e id * 2 + 1 para entradas, assim cada linha é achada direto pelo rowid.
+# 'owner' guarda o token "u<id do dono>", o que permite filtrar por usuário usando o próprio índice FTS.
+CRIAR = [
+    """
+    CREATE VIRTUAL TABLE poderoso_apps_busca USING fts5(
+        text, owner, topic_id UNINDEXED,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_topic_ai AFTER INSERT ON poderoso_apps_topic BEGIN
+        INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+        VALUES (new.id * 2, new.text, 'u' || new.owner_id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_topic_au AFTER UPDATE OF text, owner_id ON poderoso_apps_topic BEGIN
+        DELETE FROM poderoso_apps_busca WHERE rowid = old.id * 2;
+        INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+        VALUES (new.id * 2, new.text, 'u' || new.owner_id, new.id);
+        UPDATE poderoso_apps_busca SET owner = 'u' || new.owner_id
+        WHERE new.owner_id != old.owner_id
+          AND rowid IN (SELECT id * 2 + 1 FROM poderoso_apps_entry WHERE topic_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_topic_ad AFTER DELETE ON poderoso_apps_topic BEGIN
+        DELETE FROM poderoso_apps_busca WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_entry_ai AFTER INSERT ON poderoso_apps_entry BEGIN
+        INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+        SELECT new.id * 2 + 1, new.text, 'u' || owner_id, new.topic_id
+        FROM poderoso_apps_topic WHERE id = new.topic_id;
+    END
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_entry_au AFTER UPDATE OF text, topic_id ON poderoso_apps_entry BEGIN
+        DELETE FROM poderoso_apps_busca WHERE rowid = old.id * 2 + 1;
+        INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+        SELECT new.id * 2 + 1, new.text, 'u' || owner_id, new.topic_id
+        FROM poderoso_apps_topic WHERE id = new.topic_id;
+    END
+    """,
+    """
+    CREATE TRIGGER poderoso_apps_busca_entry_ad AFTER DELETE ON poderoso_apps_entry BEGIN
+        DELETE FROM poderoso_apps_busca WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    # Indexa o que já existe.
+    """
+    INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+    SELECT id * 2, text, 'u' || owner_id, id FROM poderoso_apps_topic
+    """,
+    """
+    INSERT INTO poderoso_apps_busca(rowid, text, owner, topic_id)
+    SELECT e.id * 2 + 1, e.text, 'u' || t.owner_id, e.topic_id
+    FROM poderoso_apps_entry e JOIN poderoso_apps_topic t ON t.id = e.topic_id
+    """,
+]
+
+REMOVER = [
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_topic_ai',
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_topic_au',
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_topic_ad',
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_entry_ai',
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_entry_au',
+    'DROP TRIGGER IF EXISTS poderoso_apps_busca_entry_ad',
+    'DROP TABLE IF EXISTS poderoso_apps_busca',
+]
+
+
+def executar(comandos):
+    def operacao(apps, schema_editor):
+        # FTS5 só existe no SQLite; nos outros bancos a busca usa o fallback da view.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in comandos:
+            schema_editor.execute(sql)
+    return operacao
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0013_topic_entry_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(executar(CRIAR), executar(REMOVER)),
+    ]
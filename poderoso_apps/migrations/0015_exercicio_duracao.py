@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:38
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+from poderoso_apps.duracao import segundos_intervalo
+
+LOTE = 2000
+
+
+def preencher_intervalos(apps, schema_editor):
+    """Interpreta o 'intervalo' dos exercícios existentes, percorrendo a tabela em lotes pela chave primária."""
+    Exercicio = apps.get_model('poderoso_apps', 'Exercicio')
+    ultimo = 0
+    while lote := list(
+        Exercicio.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', 'intervalo')[:LOTE]
+    ):
+        # Os textos se repetem muito ("60s", "90s", ...): um UPDATE por valor distinto dentro do lote.
+        por_valor = {}
+        for pk, intervalo in lote:
+            por_valor.setdefault(segundos_intervalo(intervalo), []).append(pk)
+        for segundos, pks in por_valor.items():
+            if segundos is not None:
+                Exercicio.objects.filter(pk__in=pks).update(intervalo_segundos=segundos)
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0014_busca_fts5'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercicio',
+            name='intervalo_segundos',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_intervalos, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='exercicio',
+            name='duracao_estimada',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('series'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('repeticoes'), '*', models.Value(3)), '+', django.db.models.functions.comparison.Coalesce('intervalo_segundos', 60))), output_field=models.PositiveIntegerField()),
+        ),
+    ]
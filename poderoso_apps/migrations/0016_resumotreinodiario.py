@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0015_exercicio_duracao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoTreinoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('exercicios', models.PositiveIntegerField(default=0)),
+                ('series', models.PositiveIntegerField(default=0)),
+                ('volume', models.PositiveIntegerField(default=0, help_text='Total de repetições')),
+                ('minutos', models.FloatField(default=0)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('plano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poderoso_apps.planotreino')),
+            ],
+            options={
+                'verbose_name_plural': 'resumos diários de treino',
+                'constraints': [models.UniqueConstraint(fields=('owner', 'dia', 'plano'), name='resumo_owner_dia_plano_unico')],
+            },
+        ),
+    ]
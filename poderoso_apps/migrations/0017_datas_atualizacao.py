@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:50
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+# No SQLite, adicionar uma coluna NOT NULL recria a tabela, o que apaga os gatilhos da busca FTS5
+# (0014) e falha nos que citam a outra tabela; eles são removidos antes e recriados depois.
+fts = import_module('poderoso_apps.migrations.0014_busca_fts5')
+GATILHOS = [sql for sql in fts.CRIAR if 'CREATE TRIGGER' in sql]
+REMOVER_GATILHOS = [sql for sql in fts.REMOVER if 'DROP TRIGGER' in sql]
+
+
+def copiar_datas(apps, schema_editor):
+    """Tópicos e entradas existentes começam com a data de criação; planos e exercícios, com a da migração."""
+    for modelo in ('Topic', 'Entry'):
+        apps.get_model('poderoso_apps', modelo).objects.update(date_updated=models.F('date_added'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0016_resumotreinodiario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.executar(REMOVER_GATILHOS), fts.executar(GATILHOS)),
+        migrations.AddField(
+            model_name='entry',
+            name='date_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='exercicio',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='planotreino',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='date_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copiar_datas, migrations.RunPython.noop),
+        migrations.RunPython(fts.executar(GATILHOS), fts.executar(REMOVER_GATILHOS)),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['topic', 'date_updated'], name='entry_topic_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['owner', 'date_updated'], name='topic_owner_atualizacao_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def publicar_existentes(apps, schema_editor):
+    """Até aqui o catálogo mostrava todos os planos a todos: os existentes continuam visíveis."""
+    apps.get_model('poderoso_apps', 'PlanoTreino').objects.update(publico=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0017_datas_atualizacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planotreino',
+            name='publico',
+            field=models.BooleanField(default=False, help_text='Aparece no catálogo de todos os usuários'),
+        ),
+        migrations.RunPython(publicar_existentes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='planotreino',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='planotreino',
+            index=models.Index(fields=['owner', 'nome'], name='plano_owner_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planotreino',
+            index=models.Index(condition=models.Q(('publico', True)), fields=['nome'], name='plano_publico_nome_idx'),
+        ),
+    ]
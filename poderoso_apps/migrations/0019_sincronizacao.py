@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0018_catalogo_por_dono'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exclusao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('plano', 'Plano de treino'), ('exercicio', 'Exercício'), ('topico', 'Tópico'), ('entrada', 'Entrada')], max_length=10)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('excluido_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'exclusões',
+            },
+        ),
+        migrations.AlterField(
+            model_name='exercicio',
+            name='plano',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='exercicios', to='poderoso_apps.planotreino'),
+        ),
+        migrations.AddIndex(
+            model_name='exercicio',
+            index=models.Index(fields=['plano', 'atualizado_em'], name='exerc_plano_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planotreino',
+            index=models.Index(fields=['owner', 'atualizado_em'], name='plano_owner_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planotreino',
+            index=models.Index(condition=models.Q(('publico', True)), fields=['atualizado_em'], name='plano_publico_atualiz_idx'),
+        ),
+        migrations.AddField(
+            model_name='exclusao',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='exclusao',
+            index=models.Index(fields=['owner', 'excluido_em'], name='exclusao_owner_data_idx'),
+        ),
+    ]
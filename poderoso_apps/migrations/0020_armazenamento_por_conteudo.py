@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:09
+
+import django.utils.timezone
+import poderoso_apps.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poderoso_apps', '0019_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagemConteudo',
+            fields=[
+                ('nome', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('referencias', models.IntegerField(default=0)),
+                ('criada_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'imagens (conteúdo)',
+            },
+        ),
+        migrations.AlterField(
+            model_name='exercicio',
+            name='imagens',
+            field=models.ImageField(blank=True, null=True, storage=poderoso_apps.armazenamento.obter_armazenamento, upload_to='media'),
+        ),
+        migrations.AddIndex(
+            model_name='exercicio',
+            index=models.Index(fields=['imagens'], name='exercicio_imagem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagemconteudo',
+            index=models.Index(condition=models.Q(('referencias__lte', 0)), fields=['nome'], name='imagem_sem_referencias_idx'),
+        ),
+    ]
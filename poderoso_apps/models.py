@@ -2,6 +2,13 @@
 from django.db import models  
 from django.contrib.auth.models import User  # Importa o modelo User para associar usuários aos tópicos e planos.
 from django.db.models import CASCADE  # Importa o comportamento de exclusão em cascata.
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Prefetch, Q, Subquery, Sum, Value, When  # Expressões usadas nas agregações de progresso.
+from django.db.models.functions import Cast, Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .armazenamento import PASTA_CONTEUDO, e_conteudo, obter_armazenamento
+from .duracao import INTERVALO_PADRAO, SEGUNDOS_POR_REPETICAO, segundos_intervalo
+from .imagens import LARGURAS, derivados_prontos, nomes_derivados
 
 class Topic(models.Model):
     """
@@ -20,9 +27,19 @@ class Topic(models.Model):
     text = models.CharField(max_length=200)
     # Define o campo 'date_added' como um DateTimeField que armazena a data e a hora em que o tópico foi criado.
     date_added = models.DateTimeField(auto_now_add=True)  # Preenchido automaticamente na criação.
+    # Data da última alteração, usada no validador (ETag/Last-Modified) das páginas (ver condicional.py).
+    date_updated = models.DateTimeField(auto_now=True)
     # Define o campo 'owner' como uma chave estrangeira que referencia o modelo User.
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        # Índice usado pela paginação por cursor da lista de tópicos de cada usuário.
+        indexes = [
+            models.Index(fields=['owner', 'date_added'], name='topic_owner_data_idx'),
+            # MAX(date_updated) e COUNT(*) do validador da lista de tópicos saem só do índice.
+            models.Index(fields=['owner', 'date_updated'], name='topic_owner_atualizacao_idx'),
+        ]
+
     def __str__(self):
         """
         Retorna uma representação em string do tópico.
@@ -53,9 +70,17 @@ class Entry(models.Model):
     text = models.TextField()  
     # Define o campo 'date_added' como um DateTimeField para armazenar a data e a hora de criação.
     date_added = models.DateTimeField(auto_now_add=True)  # Preenchido automaticamente.
+    # Data da última edição da entrada (ver Topic.date_updated).
+    date_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'entries'  # Define como 'entries' para o plural no admin.
+        # Índice usado pela paginação por cursor das entradas de cada tópico.
+        indexes = [
+            models.Index(fields=['topic', 'date_added'], name='entry_topic_data_idx'),
+            # Validador da página do tópico: MAX(date_updated) e COUNT(*) das entradas pelo índice.
+            models.Index(fields=['topic', 'date_updated'], name='entry_topic_atualizacao_idx'),
+        ]
 
     def __str__(self):
         """
@@ -66,24 +91,151 @@ class Entry(models.Model):
         """
         return f"({self.text[:50]}...)"  # Retorna os primeiros 50 caracteres da entrada seguidos por '...'.
 
+class PlanoTreinoQuerySet(models.QuerySet):
+    """QuerySet com as agregações usadas pelas páginas de planos de treino."""
+
+    def com_progresso(self, owner=None):
+        """
+        Anota cada plano com o total de exercícios, os concluídos, o progresso (%) e o tempo restante.
+
+        Os concluídos vêm da sessão de treino aberta do usuário 'owner' (zero para visitantes anônimos).
+        Tudo é calculado pelo banco em uma única consulta, sem contagens extras por plano.
+        """
+        if owner is not None and owner.is_authenticated:
+            concluidos = Coalesce(Subquery(
+                SessaoTreino.exercicios_concluidos.through.objects.filter(
+                    sessaotreino__plano=OuterRef('pk'),
+                    sessaotreino__owner=owner,
+                    sessaotreino__finalizada_em__isnull=True,
+                ).order_by().values('sessaotreino__plano').annotate(n=Count('pk')).values('n')
+            ), 0)
+        else:
+            concluidos = Value(0)
+        total = Cast('total_exercicios', FloatField())
+        return self.annotate(
+            total_exercicios=Count('exercicios'),
+            exercicios_concluidos=concluidos,
+        ).annotate(
+            progresso=Case(
+                When(total_exercicios=0, then=Value(0.0)),
+                default=F('exercicios_concluidos') * 100.0 / total,
+                output_field=FloatField(),
+            ),
+            # Soma da duração estimada dos exercícios que o usuário ainda não concluiu, em minutos.
+            tempo_restante=Coalesce(Subquery(
+                Exercicio.objects.filter(plano=OuterRef('pk')).restantes(owner)
+                .order_by().values('plano').annotate(s=Sum('duracao_estimada')).values('s')
+            ), 0) / 60.0,
+        )
+
+    def visiveis(self, owner=None):
+        """Planos que 'owner' pode abrir: os públicos e os dele (só os públicos para visitantes anônimos)."""
+        if owner is not None and owner.is_authenticated:
+            return self.filter(Q(publico=True) | Q(owner=owner))
+        return self.filter(publico=True)
+
+    def catalogo(self, owner=None):
+        """
+        Planos do catálogo de 'owner': os dele e os públicos (só os públicos para visitantes anônimos).
+
+        Cada plano vem com 'total_exercicios' e 'duracao_total' (segundos) somados pelo banco na mesma
+        consulta, e com os exercícios (só id e nome) carregados por um único prefetch: duas consultas
+        no total, qualquer que seja o número de planos.
+
+        Os ids saem de um UNION (os públicos pelo índice parcial plano_publico_nome_idx, os do dono
+        por plano_owner_nome_idx): com um OR simples o SQLite percorreria a tabela inteira.
+        """
+        ids = PlanoTreino.objects.filter(publico=True).values('pk')
+        if owner is not None and owner.is_authenticated:
+            ids = ids.union(PlanoTreino.objects.filter(owner=owner).values('pk'), all=True)
+        return self.filter(pk__in=ids).annotate(
+            total_exercicios=Count('exercicios'),
+            duracao_total=Coalesce(Sum('exercicios__duracao_estimada'), 0),
+        ).prefetch_related(
+            Prefetch('exercicios', queryset=Exercicio.objects.only('id', 'plano_id', 'nome').order_by('id'))
+        ).only('id', 'nome', 'owner_id', 'publico').order_by('nome', 'id')
+
+
+class ExercicioQuerySet(models.QuerySet):
+    """QuerySet de exercícios com o estado de conclusão do usuário."""
+
+    def com_estado(self, owner=None):
+        """Anota 'concluido_na_sessao' indicando se o exercício já foi feito na sessão aberta do usuário."""
+        if owner is None or not owner.is_authenticated:
+            return self.annotate(concluido_na_sessao=Value(False))
+        return self.annotate(concluido_na_sessao=Exists(
+            SessaoTreino.exercicios_concluidos.through.objects.filter(
+                exercicio=OuterRef('pk'),
+                sessaotreino__owner=owner,
+                sessaotreino__finalizada_em__isnull=True,
+            )
+        ))
+
+    def restantes(self, owner=None):
+        """Exercícios ainda não concluídos na sessão aberta do usuário (todos, para visitantes anônimos)."""
+        if owner is None or not owner.is_authenticated:
+            return self
+        return self.com_estado(owner).filter(concluido_na_sessao=False)
+
+    def tempo_restante(self, owner=None):
+        """Minutos que faltam para o usuário terminar os exercícios, somados pelo banco."""
+        return (self.restantes(owner).aggregate(s=Sum('duracao_estimada'))['s'] or 0) / 60
+
+    async def atempo_restante(self, owner=None):
+        """Versão assíncrona de tempo_restante()."""
+        return ((await self.restantes(owner).aaggregate(s=Sum('duracao_estimada')))['s'] or 0) / 60
+
+
 class PlanoTreino(models.Model):
     """Modelo que representa um plano de treino (ex: TREINO AXB, 3X, 4X)"""
 
+    objects = PlanoTreinoQuerySet.as_manager()
+
     # Define o campo 'nome' como um CharField com limite de 100 caracteres.
     nome = models.CharField(max_length=100)
     # Define o campo 'descricao' como um TextField que pode ser nulo ou em branco.
     descricao = models.TextField(null=True, blank=True)  
     # Define o campo 'owner' como uma chave estrangeira que referencia o modelo User.
-    owner = models.ForeignKey(User, on_delete=CASCADE)  # Usuário que criou o plano. 
+    # O índice (owner, nome) abaixo começa pelo dono, então a chave dispensa um índice próprio.
+    owner = models.ForeignKey(User, on_delete=CASCADE, db_index=False)  # Usuário que criou o plano. 
     tempo_estimado = models.PositiveIntegerField(help_text="Tempo em minutos")   
+    # Planos públicos (modelos da academia) aparecem no catálogo de todos; os demais, só no do dono.
+    publico = models.BooleanField(default=False, help_text="Aparece no catálogo de todos os usuários")
+    # Data da última alteração do plano, parte do validador da página do plano (ver condicional.py).
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Planos de cada usuário (catálogo) e a busca por (owner, nome) da importação.
+            models.Index(fields=['owner', 'nome'], name='plano_owner_nome_idx'),
+            # Índice parcial só com os planos públicos, a parte do catálogo comum a todos.
+            models.Index(fields=['nome'], condition=Q(publico=True), name='plano_publico_nome_idx'),
+            # Planos alterados desde o cursor da sincronização: os do dono e os públicos (ver sincronizacao.py).
+            models.Index(fields=['owner', 'atualizado_em'], name='plano_owner_atualizacao_idx'),
+            models.Index(fields=['atualizado_em'], condition=Q(publico=True), name='plano_publico_atualiz_idx'),
+        ]
+
     def __str__(self):
         return self.nome  # Retorna o nome do plano de treino.
 
+    def visivel_para(self, owner):
+        """Mesma regra de PlanoTreinoQuerySet.visiveis(), para o plano já carregado (ex.: do cache)."""
+        return self.publico or (owner is not None and owner.is_authenticated and self.owner_id == owner.id)
+
+    def calcular_progresso(self, total_exercicios, exercicios_concluidos):
+        """Retorna o progresso em %, com a mesma regra de com_progresso()."""
+        if not total_exercicios:
+            return 0
+        return exercicios_concluidos * 100 / total_exercicios
+
 class Exercicio(models.Model):
     """Modelo que representa um exercício específico em um plano"""
 
+    objects = ExercicioQuerySet.as_manager()
+
     # Define o campo 'plano' como uma chave estrangeira que referencia o modelo PlanoTreino.
-    plano = models.ForeignKey(PlanoTreino, related_name='exercicios', on_delete=CASCADE)  
+    # O índice (plano, atualizado_em) abaixo começa pelo plano, então a chave dispensa um índice próprio.
+    plano = models.ForeignKey(PlanoTreino, related_name='exercicios', on_delete=CASCADE, db_index=False)
     # Define o campo 'nome' como um CharField com limite de 200 caracteres.
     nome = models.CharField(max_length=200)
     
@@ -93,9 +245,378 @@ class Exercicio(models.Model):
     repeticoes = models.IntegerField()  
     # Define o campo 'intervalo' como um CharField com limite de 50 caracteres para armazenar o intervalo.
     intervalo = models.CharField(max_length=50)  
-    # Define o campo 'concluido' como um BooleanField que indica se o exercício foi concluído ou não.
-    concluido = models.BooleanField(default=False)  # Padrão é False.
-    imagens = models.ImageField(upload_to='media', null=True, blank=True)
+    # Descanso entre as séries em segundos, interpretado a partir de 'intervalo' (vazio se não houver número).
+    intervalo_segundos = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Duração estimada do exercício em segundos, calculada pelo banco (ver duracao.py).
+    duracao_estimada = models.GeneratedField(
+        expression=F('series') * (
+            F('repeticoes') * SEGUNDOS_POR_REPETICAO + Coalesce('intervalo_segundos', INTERVALO_PADRAO)
+        ),
+        output_field=models.PositiveIntegerField(),
+        db_persist=True,
+    )
+    # Gravadas uma vez por conteúdo, com o hash como nome (ver armazenamento.py).
+    imagens = models.ImageField(upload_to='media', storage=obter_armazenamento, null=True, blank=True)
+    # Data da última alteração do exercício (ver PlanoTreino.atualizado_em).
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Exercícios alterados desde o cursor da sincronização, plano a plano.
+            models.Index(fields=['plano', 'atualizado_em'], name='exerc_plano_atualizacao_idx'),
+            # Contagem de referências de cada imagem (ImagemConteudo.recontar) e conversão das antigas.
+            models.Index(fields=['imagens'], name='exercicio_imagem_idx'),
+        ]
 
     def __str__(self):
         return self.nome  # Retorna o nome do exercício.
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        exercicio = super().from_db(db, field_names, values)
+        # Imagem gravada no banco, para ajustar as referências quando ela mudar (ver signals.py).
+        if 'imagens' in field_names:
+            exercicio._imagem_gravada = values[field_names.index('imagens')] or None
+        return exercicio
+
+    def save(self, *args, **kwargs):
+        # Operações em massa (bulk_create, update) devem preencher 'intervalo_segundos' por conta própria.
+        self.intervalo_segundos = segundos_intervalo(self.intervalo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'intervalo' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'intervalo_segundos'}
+        super().save(*args, **kwargs)
+
+    def miniaturas(self):
+        """
+        Retorna os atributos 'src'/'srcset' das versões reduzidas da imagem.
+
+        Retorna None enquanto os derivados ainda não foram gerados, para que o template use a original.
+        """
+        if not self.imagens or not derivados_prontos(self.imagens.name):
+            return None
+        url = self.imagens.storage.url
+        derivados = nomes_derivados(self.imagens.name)
+        return {
+            'src': url(derivados[LARGURAS[0]]['miniatura']),
+            'srcset': ', '.join(f"{url(nomes['miniatura'])} {largura}w" for largura, nomes in derivados.items()),
+            'webp_srcset': ', '.join(f"{url(nomes['webp'])} {largura}w" for largura, nomes in derivados.items()),
+        }
+
+
+class SessaoTreino(models.Model):
+    """
+    Sessão de treino (workout session) de um usuário em um plano.
+
+    Enquanto 'finalizada_em' estiver vazio a sessão está aberta e guarda, em 'exercicios_concluidos',
+    o progresso daquele usuário. Cada usuário tem no máximo uma sessão aberta por plano.
+    Ao finalizar, as séries feitas são gravadas em RegistroSerie e o progresso aberto é limpo.
+    """
+
+    owner = models.ForeignKey(User, on_delete=CASCADE)
+    plano = models.ForeignKey(PlanoTreino, related_name='sessoes', on_delete=CASCADE)
+    iniciada_em = models.DateTimeField(auto_now_add=True)
+    finalizada_em = models.DateTimeField(null=True, blank=True)
+    exercicios_concluidos = models.ManyToManyField(Exercicio, blank=True, related_name='sessoes_abertas')
+
+    class Meta:
+        verbose_name_plural = 'sessões de treino'
+        indexes = [
+            models.Index(fields=['owner', 'plano', '-iniciada_em'], name='sessao_owner_plano_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'plano'],
+                condition=Q(finalizada_em__isnull=True),
+                name='sessao_aberta_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} - {self.plano} ({self.iniciada_em:%d/%m/%Y})"
+
+    @classmethod
+    def _concluidos(cls, owner, plano_id):
+        return cls.exercicios_concluidos.through.objects.filter(
+            sessaotreino__owner=owner, sessaotreino__plano_id=plano_id, sessaotreino__finalizada_em__isnull=True,
+        ).values_list('exercicio_id', flat=True)
+
+    @classmethod
+    def ids_concluidos(cls, owner, plano_id):
+        """Retorna o conjunto de ids dos exercícios concluídos na sessão aberta do usuário no plano."""
+        return set(cls._concluidos(owner, plano_id))
+
+    @classmethod
+    async def aids_concluidos(cls, owner, plano_id):
+        """Versão assíncrona de ids_concluidos()."""
+        return {exercicio_id async for exercicio_id in cls._concluidos(owner, plano_id)}
+
+    @classmethod
+    def aberta(cls, owner, plano):
+        """Retorna a sessão aberta do usuário no plano, criando-a se ainda não existir."""
+        sessao, _ = cls.objects.get_or_create(owner=owner, plano=plano, finalizada_em=None)
+        return sessao
+
+    def definir_estados(self, estados):
+        """
+        Define o estado de conclusão dos exercícios informados em {exercicio_id: bool}.
+
+        Ignora exercícios de outros planos e retorna quantos exercícios tiveram o estado alterado.
+        """
+        Concluido = SessaoTreino.exercicios_concluidos.through
+        atuais = dict(self.plano.exercicios.filter(id__in=estados).annotate(
+            feito=Exists(Concluido.objects.filter(sessaotreino=self, exercicio=OuterRef('pk')))
+        ).values_list('id', 'feito'))
+
+        concluir = [i for i, feito in atuais.items() if estados[i] and not feito]
+        desfazer = [i for i, feito in atuais.items() if not estados[i] and feito]
+        if concluir:
+            Concluido.objects.bulk_create(
+                [Concluido(sessaotreino=self, exercicio_id=i) for i in concluir], ignore_conflicts=True
+            )
+        if desfazer:
+            Concluido.objects.filter(sessaotreino=self, exercicio_id__in=desfazer).delete()
+        return len(concluir) + len(desfazer)
+
+    def finalizar(self):
+        """Encerra a sessão gravando uma linha de RegistroSerie por série de cada exercício concluído."""
+        with transaction.atomic():
+            agora = timezone.now()
+            registros = [
+                RegistroSerie(
+                    sessao=self, owner_id=self.owner_id, plano_id=self.plano_id, exercicio=exercicio,
+                    numero=numero, repeticoes=exercicio.repeticoes, registrada_em=agora,
+                )
+                for exercicio in self.exercicios_concluidos.all()
+                for numero in range(1, exercicio.series + 1)
+            ]
+            RegistroSerie.objects.bulk_create(registros, batch_size=500)
+            self.finalizada_em = agora
+            self.save(update_fields=['finalizada_em'])
+            self.exercicios_concluidos.clear()
+            ResumoTreinoDiario.somar(self.owner_id, self.plano_id, timezone.localdate(agora), registros)
+        return registros
+
+
+class RegistroSerie(models.Model):
+    """Registro de uma série executada (set log), usado como histórico de treinos."""
+
+    sessao = models.ForeignKey(SessaoTreino, related_name='series', on_delete=CASCADE)
+    # 'owner' e 'plano' são repetidos aqui para que o histórico seja consultado sem joins.
+    # 'owner' já é o prefixo dos índices compostos abaixo, então dispensa um índice próprio.
+    owner = models.ForeignKey(User, on_delete=CASCADE, db_index=False)
+    plano = models.ForeignKey(PlanoTreino, on_delete=CASCADE)
+    exercicio = models.ForeignKey(Exercicio, on_delete=CASCADE)
+    numero = models.PositiveSmallIntegerField(help_text="Número da série dentro do exercício")
+    repeticoes = models.PositiveIntegerField()
+    registrada_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-registrada_em'], name='serie_owner_data_idx'),
+            models.Index(fields=['owner', 'plano', '-registrada_em'], name='serie_owner_plano_data_idx'),
+            models.Index(fields=['owner', 'exercicio', '-registrada_em'], name='serie_owner_exerc_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.exercicio} - série {self.numero}"
+
+
+class ResumoTreinoDiarioQuerySet(models.QuerySet):
+    """Consultas do histórico de treinos feitas sobre o resumo, e não sobre RegistroSerie."""
+
+    PERIODOS = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+
+    def por_periodo(self, owner, inicio, fim, periodo='semana'):
+        """
+        Totais do usuário entre as datas 'inicio' e 'fim' (inclusive), agrupados por 'dia', 'semana' ou 'mes'.
+
+        Retorna dicionários {'periodo', 'exercicios', 'series', 'volume', 'minutos'} em ordem de data.
+        Um mês lê no máximo uma linha por dia e plano treinado.
+        """
+        resumos = self.filter(owner=owner, dia__range=(inicio, fim))
+        truncar = self.PERIODOS[periodo]
+        chave = F('dia') if truncar is None else truncar('dia')
+        return resumos.annotate(periodo=chave).values('periodo').annotate(
+            exercicios=Sum('exercicios'), series=Sum('series'), volume=Sum('volume'), minutos=Sum('minutos'),
+        ).order_by('periodo')
+
+
+class ResumoTreinoDiario(models.Model):
+    """
+    Resumo (rollup) do histórico de treinos: uma linha por usuário, dia e plano.
+
+    É mantido de forma incremental por SessaoTreino.finalizar(), a única operação que grava
+    RegistroSerie. Alterações feitas por fora (admin, scripts, imports) devem ser seguidas do
+    comando reconstruir_resumos, que refaz um intervalo de datas a partir de RegistroSerie.
+    """
+
+    objects = ResumoTreinoDiarioQuerySet.as_manager()
+
+    owner = models.ForeignKey(User, on_delete=CASCADE, db_index=False)
+    dia = models.DateField()
+    plano = models.ForeignKey(PlanoTreino, on_delete=CASCADE)
+    # Exercícios concluídos (um por exercício finalizado em cada sessão), séries feitas,
+    # volume em repetições e minutos estimados pela duração de cada exercício.
+    exercicios = models.PositiveIntegerField(default=0)
+    series = models.PositiveIntegerField(default=0)
+    volume = models.PositiveIntegerField(default=0, help_text="Total de repetições")
+    minutos = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'resumos diários de treino'
+        constraints = [
+            # O índice da restrição (owner, dia, plano) também atende as consultas por período.
+            models.UniqueConstraint(fields=['owner', 'dia', 'plano'], name='resumo_owner_dia_plano_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} - {self.plano} ({self.dia:%d/%m/%Y})"
+
+    @classmethod
+    def somar(cls, owner_id, plano_id, dia, registros):
+        """Acrescenta as séries recém-gravadas 'registros' à linha do dia, criando-a se preciso."""
+        if not registros:
+            return
+        totais = {
+            'exercicios': sum(1 for r in registros if r.numero == 1),
+            'series': len(registros),
+            'volume': sum(r.repeticoes for r in registros),
+            'minutos': sum(r.exercicio.duracao_estimada / r.exercicio.series for r in registros) / 60,
+        }
+        incremento = {campo: F(campo) + valor for campo, valor in totais.items()}
+        linha = cls.objects.filter(owner_id=owner_id, plano_id=plano_id, dia=dia)
+        if linha.update(**incremento):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(owner_id=owner_id, plano_id=plano_id, dia=dia, **totais)
+        except IntegrityError:
+            # Outra sessão criou a linha do dia ao mesmo tempo.
+            linha.update(**incremento)
+
+    @classmethod
+    def reconstruir(cls, inicio, fim, owner=None, lote=2000):
+        """
+        Refaz os resumos dos dias entre 'inicio' e 'fim' (inclusive) a partir de RegistroSerie.
+
+        Idempotente: apaga as linhas do intervalo e as recria agregando as séries no banco.
+        Retorna o número de linhas gravadas.
+        """
+        series = RegistroSerie.objects.annotate(dia=TruncDate('registrada_em')).filter(dia__range=(inicio, fim))
+        resumos = cls.objects.filter(dia__range=(inicio, fim))
+        if owner is not None:
+            series = series.filter(owner=owner)
+            resumos = resumos.filter(owner=owner)
+        linhas = series.values('owner_id', 'dia', 'plano_id').annotate(
+            n_exercicios=Count('id', filter=Q(numero=1)),
+            n_series=Count('id'),
+            n_volume=Sum('repeticoes'),
+            # Cada série vale a sua fração da duração estimada do exercício.
+            segundos=Sum(F('exercicio__duracao_estimada') * 1.0 / F('exercicio__series')),
+        ).order_by()
+        total = 0
+        with transaction.atomic():
+            resumos.delete()
+            novos = []
+            for linha in linhas.iterator(chunk_size=lote):
+                novos.append(cls(
+                    owner_id=linha['owner_id'], dia=linha['dia'], plano_id=linha['plano_id'],
+                    exercicios=linha['n_exercicios'], series=linha['n_series'], volume=linha['n_volume'],
+                    minutos=linha['segundos'] / 60,
+                ))
+                if len(novos) == lote:
+                    total += len(cls.objects.bulk_create(novos))
+                    novos = []
+            total += len(cls.objects.bulk_create(novos))
+        return total
+
+
+class Exclusao(models.Model):
+    """
+    Registro (tombstone) de um plano, exercício, tópico ou entrada apagado, para a sincronização.
+
+    O aplicativo recebe estes registros em 'excluidos' (ver sincronizacao.py) e apaga a cópia local.
+    'owner' é o usuário que deve receber o registro; vazio quando o plano era público, e então
+    todos recebem. São apagados depois de SYNC_RETENCAO_DIAS pelo comando limpar_exclusoes.
+    """
+
+    TIPOS = [
+        ('plano', 'Plano de treino'),
+        ('exercicio', 'Exercício'),
+        ('topico', 'Tópico'),
+        ('entrada', 'Entrada'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    objeto_id = models.PositiveBigIntegerField()
+    # Prefixo do índice (owner, excluido_em), que dispensa um índice próprio.
+    owner = models.ForeignKey(User, on_delete=CASCADE, null=True, blank=True, db_index=False)
+    excluido_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'exclusões'
+        indexes = [
+            # Também atende as exclusões que valem para todos (owner IS NULL).
+            models.Index(fields=['owner', 'excluido_em'], name='exclusao_owner_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.objeto_id} ({self.excluido_em:%d/%m/%Y})"
+
+
+class ImagemConteudo(models.Model):
+    """
+    Contagem de referências de um arquivo do armazenamento por conteúdo (ver armazenamento.py).
+
+    'referencias' é o número de exercícios que apontam para o arquivo. É ajustada pelos sinais de
+    Exercicio e pelas operações em massa (importação, clonagem); o comando limpar_imagens apaga os
+    arquivos que chegaram a zero e pode recontar tudo a partir dos exercícios.
+    """
+
+    nome = models.CharField(max_length=100, primary_key=True)
+    referencias = models.IntegerField(default=0)
+    criada_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'imagens (conteúdo)'
+        indexes = [
+            # Candidatas do limpar_imagens: só as linhas sem referências entram no índice.
+            models.Index(fields=['nome'], condition=Q(referencias__lte=0), name='imagem_sem_referencias_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias})"
+
+    @classmethod
+    def ajustar(cls, deltas):
+        """
+        Soma a cada imagem o valor de {nome: delta}; nomes fora do armazenamento por conteúdo são ignorados.
+
+        Um UPDATE para cada valor de delta distinto (a clonagem para N usuários soma N a todas de uma vez).
+        """
+        deltas = {nome: delta for nome, delta in deltas.items() if delta and e_conteudo(nome)}
+        if not deltas:
+            return
+        cls.objects.bulk_create([cls(nome=nome) for nome in deltas], ignore_conflicts=True)
+        por_delta = {}
+        for nome, delta in deltas.items():
+            por_delta.setdefault(delta, []).append(nome)
+        for delta, nomes in por_delta.items():
+            cls.objects.filter(nome__in=nomes).update(referencias=F('referencias') + delta)
+
+    @classmethod
+    def recontar(cls, nomes=None):
+        """Refaz 'referencias' a partir dos exercícios (todas as imagens, ou só as de 'nomes')."""
+        usadas = Exercicio.objects.filter(imagens__startswith=f'{PASTA_CONTEUDO}/')
+        linhas = cls.objects.all()
+        if nomes is not None:
+            usadas = usadas.filter(imagens__in=nomes)
+            linhas = linhas.filter(nome__in=nomes)
+        cls.objects.bulk_create(
+            [cls(nome=nome) for nome in usadas.values_list('imagens', flat=True).distinct()], ignore_conflicts=True,
+        )
+        return linhas.update(referencias=Coalesce(Subquery(
+            Exercicio.objects.filter(imagens=OuterRef('nome')).order_by().values('imagens')
+            .annotate(n=Count('id')).values('n')
+        ), 0))
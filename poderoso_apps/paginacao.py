@@ -0,0 +1,112 @@
+"""
+Paginação por cursor (keyset) sobre (date_added, id).
+
+Em vez de OFFSET, cada página começa logo após o último item da anterior, então o custo
+de uma página é o mesmo em qualquer profundidade: o banco faz uma busca no índice
+(..., date_added) e lê apenas 'tamanho' + 1 linhas.
+
+Também tem o PaginadorEstimado, usado pelo admin para não contar tabelas grandes inteiras.
+"""
+from datetime import datetime
+
+from django.core.exceptions import BadRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def codificar_cursor(objeto):
+    """Gera o cursor opaco que aponta para 'objeto'."""
+    return urlsafe_base64_encode(f'{objeto.date_added.isoformat()}|{objeto.pk}'.encode())
+
+
+def decodificar_cursor(cursor):
+    """Retorna (date_added, id) do cursor, ou lança BadRequest se ele for inválido."""
+    try:
+        data, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        return datetime.fromisoformat(data), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Cursor de paginação inválido.')
+
+
+def _fatia(queryset, cursor, tamanho, descendente):
+    """Queryset com os 'tamanho' + 1 itens seguintes ao cursor (o item extra indica se há próxima página)."""
+    if cursor:
+        data, pk = decodificar_cursor(cursor)
+        # "date_added <= data" usa o índice como intervalo; o empate em date_added é resolvido pelo id.
+        if descendente:
+            queryset = queryset.filter(date_added__lte=data).exclude(date_added=data, id__gte=pk)
+        else:
+            queryset = queryset.filter(date_added__gte=data).exclude(date_added=data, id__lte=pk)
+
+    ordem = ('-date_added', '-id') if descendente else ('date_added', 'id')
+    return queryset.order_by(*ordem)[:tamanho + 1]
+
+
+def _pagina(itens, tamanho):
+    proximo = codificar_cursor(itens[tamanho - 1]) if len(itens) > tamanho else None
+    return itens[:tamanho], proximo
+
+
+def pagina_keyset(queryset, cursor, tamanho, descendente=False):
+    """
+    Retorna (itens, proximo_cursor) da página que começa após 'cursor'.
+
+    'proximo_cursor' é None na última página.
+    """
+    return _pagina(list(_fatia(queryset, cursor, tamanho, descendente)), tamanho)
+
+
+async def apagina_keyset(queryset, cursor, tamanho, descendente=False):
+    """Versão assíncrona de pagina_keyset(), para as views async."""
+    return _pagina([item async for item in _fatia(queryset, cursor, tamanho, descendente)], tamanho)
+
+
+def contagem_estimada(model, using='default'):
+    """
+    Número aproximado de linhas da tabela do model, pelas estatísticas do banco, ou None.
+
+    PostgreSQL: pg_class.reltuples (atualizado pelo autovacuum/ANALYZE).
+    SQLite: sqlite_stat1, que só existe depois de um ANALYZE (ou PRAGMA optimize).
+    """
+    conexao = connections[using]
+    tabela = model._meta.db_table
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [tabela])
+        elif conexao.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # A primeira coluna de 'stat' é o número de linhas da tabela (igual em todos os índices dela).
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabela])
+        else:
+            return None
+        linha = cursor.fetchone()
+    if not linha or linha[0] is None:
+        return None
+    valor = int(str(linha[0]).split()[0])
+    # reltuples é -1 em tabelas que nunca foram analisadas.
+    return valor if valor >= 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator que, em tabelas grandes e sem filtro, usa a contagem estimada em vez de COUNT(*).
+
+    Com filtros (busca, list_filter) a contagem é exata, já que a estimativa é da tabela inteira.
+    Abaixo de LIMITE linhas o COUNT(*) é barato e também é exato.
+    """
+
+    LIMITE = 10000
+
+    @cached_property
+    def count(self):
+        consulta = getattr(self.object_list, 'query', None)
+        if consulta is not None and not consulta.where:
+            estimada = contagem_estimada(self.object_list.model, self.object_list.db)
+            if estimada is not None and estimada >= self.LIMITE:
+                return estimada
+        return super().count
@@ -0,0 +1,181 @@
+# Receptores de sinais dos modelos, conectados em PoderosoAppsConfig.ready().
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidar_catalogo, invalidar_estatisticas, invalidar_plano
+from .imagens import agendar_derivados, derivados_prontos
+from .models import Entry, Exclusao, Exercicio, ImagemConteudo, PlanoTreino, SessaoTreino, Topic
+
+
+@receiver(post_save, sender=Exercicio)
+def gerar_derivados_da_imagem(sender, instance, **kwargs):
+    """Agenda miniaturas e WebP da imagem do exercício depois que a transação for confirmada."""
+    if instance.imagens and not derivados_prontos(instance.imagens.name):
+        nome = instance.imagens.name
+        plano_id = instance.plano_id
+        # A página em cache aponta para a imagem original até os derivados ficarem prontos.
+        transaction.on_commit(lambda: agendar_derivados(nome, ao_concluir=lambda: invalidar_plano(plano_id)))
+
+
+@receiver(post_save, sender=PlanoTreino)
+@receiver(post_delete, sender=PlanoTreino)
+def invalidar_cache_do_plano(sender, instance, **kwargs):
+    """O nome aparece no catálogo e os demais campos na página do plano."""
+    transaction.on_commit(invalidar_catalogo)
+    transaction.on_commit(lambda: invalidar_plano(instance.id))
+    # Quantidade de planos do dono, no perfil.
+    owner_id = instance.owner_id
+    transaction.on_commit(lambda: invalidar_estatisticas(owner_id))
+
+
+@receiver(pre_delete, sender=PlanoTreino)
+def invalidar_estatisticas_de_quem_treina_o_plano(sender, instance, **kwargs):
+    """As sessões abertas do plano são apagadas em cascata: os donos são lidos antes, numa consulta por plano."""
+    owners = list(instance.sessoes.filter(finalizada_em__isnull=True).values_list('owner_id', flat=True).distinct())
+
+    def invalidar_owners():
+        for owner_id in owners:
+            invalidar_estatisticas(owner_id)
+    transaction.on_commit(invalidar_owners)
+
+
+def _invalidar_plano_do_exercicio(plano_id):
+    """
+    Junta os planos com exercícios alterados na transação num único callback de commit.
+
+    Assim a consulta de quem está treinando os planos roda uma vez por transação, e não uma vez
+    por exercício salvo ou apagado.
+    """
+    conexao = transaction.get_connection()
+    pendentes = getattr(conexao, 'planos_com_exercicios_alterados', None)
+    # Só se junta ao callback registrado no mesmo nível de savepoint: um rollback descarta o callback,
+    # e o conjunto dele junto.
+    atual = set(conexao.savepoint_ids)
+    if pendentes is not None and any(
+        func is pendentes[1] and sids == atual for sids, func, _ in conexao.run_on_commit
+    ):
+        pendentes[0].add(plano_id)
+        return
+    planos = {plano_id}
+
+    def invalidar():
+        if getattr(conexao, 'planos_com_exercicios_alterados', None) is pendentes_novos:
+            conexao.planos_com_exercicios_alterados = None
+        # O catálogo mostra a quantidade de exercícios e a duração de cada plano.
+        invalidar_catalogo()
+        for alterado in planos:
+            invalidar_plano(alterado)
+        # O progresso do perfil de quem está treinando o plano depende dos exercícios dele.
+        owners = SessaoTreino.objects.filter(plano_id__in=planos, finalizada_em__isnull=True).values_list('owner_id', flat=True)
+        for owner_id in set(owners):
+            invalidar_estatisticas(owner_id)
+    pendentes_novos = conexao.planos_com_exercicios_alterados = (planos, invalidar)
+    transaction.on_commit(invalidar)
+
+
+@receiver(post_save, sender=Exercicio)
+@receiver(post_delete, sender=Exercicio)
+def invalidar_cache_do_exercicio(sender, instance, origin=None, **kwargs):
+    # Exercícios apagados junto com o plano: os receptores do próprio plano já cuidam do cache.
+    if getattr(origin, 'model', type(origin)) is PlanoTreino:
+        return
+    _invalidar_plano_do_exercicio(instance.plano_id)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def invalidar_estatisticas_do_topico(sender, instance, **kwargs):
+    owner_id = instance.owner_id
+    transaction.on_commit(lambda: invalidar_estatisticas(owner_id))
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def invalidar_estatisticas_da_entrada(sender, instance, **kwargs):
+    try:
+        owner_id = instance.topic.owner_id
+    except Topic.DoesNotExist:
+        # Tópico já apagado (exclusão em cascata): o sinal do próprio tópico cuida do dono.
+        return
+    transaction.on_commit(lambda: invalidar_estatisticas(owner_id))
+
+
+def _registrar_exclusao(tipo, instance, origin, owner_id):
+    """
+    Grava o tombstone lido pela sincronização (ver sincronizacao.py).
+
+    Só a linha apagada diretamente: entradas e exercícios apagados em cascata somem junto com o
+    tópico ou o plano no aplicativo, e nada é registrado quando o próprio usuário é excluído.
+    """
+    if getattr(origin, 'model', type(origin)) is type(instance):
+        Exclusao.objects.create(tipo=tipo, objeto_id=instance.pk, owner_id=owner_id)
+
+
+@receiver(post_delete, sender=PlanoTreino)
+def registrar_exclusao_do_plano(sender, instance, origin=None, **kwargs):
+    # Plano público: a exclusão vale para todos (owner vazio).
+    _registrar_exclusao('plano', instance, origin, None if instance.publico else instance.owner_id)
+
+
+@receiver(post_delete, sender=Exercicio)
+def registrar_exclusao_do_exercicio(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is not Exercicio:
+        return
+    plano = PlanoTreino.objects.filter(pk=instance.plano_id).values('owner_id', 'publico').first()
+    if plano is not None:
+        _registrar_exclusao('exercicio', instance, origin, None if plano['publico'] else plano['owner_id'])
+
+
+@receiver(post_delete, sender=Topic)
+def registrar_exclusao_do_topico(sender, instance, origin=None, **kwargs):
+    _registrar_exclusao('topico', instance, origin, instance.owner_id)
+
+
+@receiver(post_delete, sender=Entry)
+def registrar_exclusao_da_entrada(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is Entry:
+        _registrar_exclusao('entrada', instance, origin, instance.topic.owner_id)
+
+
+@receiver(pre_save, sender=PlanoTreino)
+def reenviar_exercicios_do_plano_publicado(sender, instance, raw=False, **kwargs):
+    """
+    Um plano que passa a ser público chega aos aplicativos dos outros usuários com os exercícios.
+
+    Os exercícios não mudaram, então a sincronização não os enviaria; a data deles é renovada.
+    """
+    if raw or not instance.publico or instance.pk is None:
+        return
+    if PlanoTreino.objects.filter(pk=instance.pk, publico=False).exists():
+        Exercicio.objects.filter(plano_id=instance.pk).update(atualizado_em=timezone.now())
+
+
+@receiver(pre_save, sender=Exercicio)
+def lembrar_imagem_gravada(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Imagem anterior de um exercício que não veio do banco com o campo carregado (ver Exercicio.from_db)."""
+    if raw or instance._state.adding or hasattr(instance, '_imagem_gravada'):
+        return
+    if update_fields is not None and 'imagens' not in update_fields:
+        return
+    instance._imagem_gravada = Exercicio.objects.filter(pk=instance.pk).values_list('imagens', flat=True).first() or None
+
+
+@receiver(post_save, sender=Exercicio)
+def contar_referencias_da_imagem(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Atualiza as referências das imagens do armazenamento por conteúdo, na mesma transação."""
+    if raw or (update_fields is not None and 'imagens' not in update_fields):
+        return
+    anterior = None if created else getattr(instance, '_imagem_gravada', None)
+    atual = instance.imagens.name or None
+    if atual != anterior:
+        ImagemConteudo.ajustar({atual: 1, anterior: -1})
+    instance._imagem_gravada = atual
+
+
+@receiver(post_delete, sender=Exercicio)
+def descontar_referencia_da_imagem(sender, instance, **kwargs):
+    # Lido do __dict__: acessar um campo adiado consultaria a linha que acabou de ser apagada.
+    imagem = instance.__dict__.get('imagens')
+    ImagemConteudo.ajustar({getattr(imagem, 'name', imagem): -1})
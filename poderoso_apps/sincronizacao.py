@@ -0,0 +1,342 @@
+"""
+Sincronização incremental (delta sync) para o aplicativo móvel, que treina muitas vezes sem conexão.
+
+Em vez de baixar as páginas inteiras, o aplicativo pede só o que mudou desde o seu cursor:
+
+    GET  /api/sync/?cursor=...   -> alterações desde o cursor
+    POST /api/sync/              -> {"cursor": "...", "operacoes": [...]}: grava as operações feitas
+                                    sem conexão e devolve as alterações, em uma única ida e volta
+
+A resposta traz as linhas criadas ou alteradas em 'planos', 'exercicios', 'topicos' e 'entradas',
+os ids apagados em 'excluidos' (da tabela Exclusao), 'planos_visiveis' e o novo 'cursor'. Com
+'mais' verdadeiro o aplicativo pede de novo com o novo cursor; com 'reiniciar' ele apaga a cópia
+local antes de aplicar a resposta (cursor mais antigo que SYNC_RETENCAO_DIAS). As exclusões são
+aplicadas antes das alterações, e os filhos somem junto com o pai: apagar um tópico ou um plano
+registra só a exclusão dele, não a de cada entrada ou exercício. Planos que saem de
+'planos_visiveis' (apagados ou que deixaram de ser públicos) também são removidos, com os exercícios.
+
+O cursor guarda, para cada tipo, a posição (data de alteração, id) da última linha enviada: cada
+tipo é paginado por keyset sobre os índices (..., date_updated/atualizado_em), como em paginacao.py.
+Só são enviadas as linhas alteradas até SYNC_JANELA_SEGUNDOS atrás: a data é gravada antes do
+commit, e uma transação ainda aberta poderia confirmar depois uma linha mais antiga que o cursor.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .cache import invalidar_estatisticas
+from .forms import EntryForm, TopicForm
+from .models import Entry, Exclusao, Exercicio, PlanoTreino, SessaoTreino, Topic
+
+# Campos enviados de cada tipo e o campo da data de alteração (ordem do keyset).
+CAMPOS = {
+    'planos': ('id', 'nome', 'descricao', 'tempo_estimado', 'publico', 'owner_id', 'atualizado_em'),
+    'exercicios': (
+        'id', 'plano_id', 'nome', 'series', 'repeticoes', 'intervalo', 'intervalo_segundos',
+        'duracao_estimada', 'imagens', 'atualizado_em',
+    ),
+    'topicos': ('id', 'text', 'date_added', 'date_updated'),
+    'entradas': ('id', 'topic_id', 'text', 'date_added', 'date_updated'),
+    'excluidos': ('id', 'tipo', 'objeto_id', 'excluido_em'),
+}
+DATAS = {
+    'planos': 'atualizado_em', 'exercicios': 'atualizado_em', 'topicos': 'date_updated',
+    'entradas': 'date_updated', 'excluidos': 'excluido_em',
+}
+# Chave de cada Exclusao.tipo na resposta.
+EXCLUIDOS = {'plano': 'planos', 'exercicio': 'exercicios', 'topico': 'topicos', 'entrada': 'entradas'}
+
+
+class SincronizacaoInvalida(ValueError):
+    """Cursor ou operação que não pode ser interpretado; a view responde 400 com a mensagem."""
+
+
+# Cursor -----------------------------------------------------------------------------------------
+
+def codificar_cursor(marcas):
+    """Cursor opaco a partir de {tipo: (data, id)}."""
+    dados = {tipo: [data.isoformat(), pk] for tipo, (data, pk) in marcas.items()}
+    return urlsafe_base64_encode(json.dumps(dados, separators=(',', ':')).encode())
+
+
+def decodificar_cursor(cursor):
+    """Retorna {tipo: (data, id)} do cursor ({} sem cursor), ou lança SincronizacaoInvalida."""
+    if not cursor:
+        return {}
+    try:
+        dados = json.loads(force_str(urlsafe_base64_decode(cursor)))
+        marcas = {tipo: (datetime.datetime.fromisoformat(data), int(pk)) for tipo, (data, pk) in dados.items()
+                  if tipo in DATAS}
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError):
+        raise SincronizacaoInvalida('Cursor de sincronização inválido.')
+    # codificar_cursor() só grava datas com fuso; uma data sem fuso não pode ser comparada com as do banco.
+    if any(timezone.is_naive(data) for data, _ in marcas.values()):
+        raise SincronizacaoInvalida('Cursor de sincronização inválido.')
+    return marcas
+
+
+# Leitura ----------------------------------------------------------------------------------------
+
+def ids_visiveis(usuario):
+    """
+    Ids dos planos que o usuário sincroniza: os dele e os públicos (como no catálogo).
+
+    UNION em vez de OR, para que cada parte use o seu índice (ver PlanoTreinoQuerySet.catalogo).
+    """
+    return PlanoTreino.objects.filter(publico=True).values('pk').union(
+        PlanoTreino.objects.filter(owner=usuario).values('pk'), all=True
+    )
+
+
+def _consultas(usuario, desde):
+    """Querysets das linhas do usuário alteradas depois de 'desde' ({tipo: (data, id)})."""
+    def alterados(queryset, tipo):
+        # O filtro de data vai dentro de cada parte dos UNIONs, junto do índice que ela usa.
+        if tipo in desde:
+            queryset = queryset.filter(**{f'{DATAS[tipo]}__gte': desde[tipo][0]})
+        return queryset
+
+    planos = alterados(PlanoTreino.objects.filter(publico=True), 'planos').values('pk').union(
+        alterados(PlanoTreino.objects.filter(owner=usuario), 'planos').values('pk'), all=True
+    )
+    exclusoes = alterados(Exclusao.objects.filter(owner__isnull=True), 'excluidos').values('pk').union(
+        alterados(Exclusao.objects.filter(owner=usuario), 'excluidos').values('pk'), all=True
+    )
+    return {
+        'planos': PlanoTreino.objects.filter(pk__in=planos),
+        'exercicios': Exercicio.objects.filter(plano__in=ids_visiveis(usuario)),
+        'topicos': Topic.objects.filter(owner=usuario),
+        'entradas': Entry.objects.filter(topic__owner=usuario),
+        'excluidos': Exclusao.objects.filter(pk__in=exclusoes),
+    }
+
+
+def _fatia(queryset, tipo, marca, limite, tamanho):
+    """Até 'tamanho' + 1 linhas depois de 'marca' e antes de 'limite', em ordem de (data, id)."""
+    campo = DATAS[tipo]
+    if marca:
+        data, pk = marca
+        # Mesmo desempate da paginação: "data >= marca" usa o índice e o id resolve as datas iguais.
+        queryset = queryset.filter(**{f'{campo}__gte': data}).exclude(**{campo: data, 'id__lte': pk})
+    queryset = queryset.filter(**{f'{campo}__lt': limite}).order_by(campo, 'id')
+    return list(queryset.values(*CAMPOS[tipo])[:tamanho + 1])
+
+
+def alteracoes(usuario, cursor=None, tamanho=None):
+    """
+    Alterações visíveis para 'usuario' desde 'cursor', no formato da resposta da API.
+
+    Cada tipo traz no máximo 'tamanho' linhas (SYNC_LIMITE); 'mais' indica que há outra página.
+    """
+    tamanho = tamanho or settings.SYNC_LIMITE
+    agora = timezone.now()
+    limite = agora - datetime.timedelta(seconds=settings.SYNC_JANELA_SEGUNDOS)
+    marcas = decodificar_cursor(cursor)
+    # As exclusões mais antigas já foram apagadas: o aplicativo precisa começar do zero.
+    retencao = agora - datetime.timedelta(days=settings.SYNC_RETENCAO_DIAS)
+    if any(data < retencao for data, _ in marcas.values()):
+        marcas = {}
+    reiniciar = not marcas
+
+    resposta = {'reiniciar': reiniciar, 'mais': False}
+    novas = {}
+    consultas = _consultas(usuario, marcas)
+    if reiniciar:
+        # Cópia nova: só as linhas atuais, sem as exclusões anteriores.
+        del consultas['excluidos']
+        resposta['excluidos'] = []
+        novas['excluidos'] = (limite, 0)
+    for tipo, queryset in consultas.items():
+        linhas = _fatia(queryset, tipo, marcas.get(tipo), limite, tamanho)
+        if len(linhas) > tamanho:
+            linhas = linhas[:tamanho]
+            resposta['mais'] = True
+            novas[tipo] = (linhas[-1][DATAS[tipo]], linhas[-1]['id'])
+        else:
+            # Tudo o que foi alterado antes do limite já foi enviado.
+            novas[tipo] = (limite, 0)
+        resposta[tipo] = linhas
+
+    url = Exercicio._meta.get_field('imagens').storage.url
+    for exercicio in resposta['exercicios']:
+        exercicio['imagens'] = url(exercicio['imagens']) if exercicio['imagens'] else None
+    excluidos = {chave: [] for chave in EXCLUIDOS.values()}
+    for exclusao in resposta['excluidos']:
+        excluidos[EXCLUIDOS[exclusao['tipo']]].append(exclusao['objeto_id'])
+    resposta['excluidos'] = excluidos
+    resposta['planos_visiveis'] = sorted(linha['pk'] for linha in ids_visiveis(usuario))
+    resposta['cursor'] = codificar_cursor(novas)
+    return resposta
+
+
+# Escrita ----------------------------------------------------------------------------------------
+
+def _versao(data):
+    """Data de alteração com a precisão enviada ao aplicativo (o JSON do Django corta em milissegundos)."""
+    return data.replace(microsecond=data.microsecond // 1000 * 1000)
+
+
+def _conflito(operacao, data):
+    """True se o aplicativo editou uma versão anterior à atual (campo opcional 'versao')."""
+    if not operacao.get('versao'):
+        return False
+    try:
+        return _versao(data) > datetime.datetime.fromisoformat(operacao['versao'])
+    except (TypeError, ValueError):
+        raise SincronizacaoInvalida('versao deve ser uma data ISO 8601.')
+
+
+def _salvar(form):
+    if not form.is_valid():
+        raise SincronizacaoInvalida('; '.join(erro for erros in form.errors.values() for erro in erros))
+    return form.save()
+
+
+class _Lote:
+    """Estado de um lote de operações: usuário, ids criados por referência e treinos alterados."""
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self.refs = {}
+        self.treinos = False
+
+    def id(self, valor):
+        """Id informado diretamente ou a 'ref' de um objeto criado antes no mesmo lote."""
+        if isinstance(valor, str) and valor in self.refs:
+            return self.refs[valor]
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            raise SincronizacaoInvalida(f'Referência desconhecida: {valor!r}.')
+
+    def topico(self, valor):
+        try:
+            return Topic.objects.get(id=self.id(valor), owner=self.usuario)
+        except Topic.DoesNotExist:
+            raise SincronizacaoInvalida('Tópico não encontrado.')
+
+    def entrada(self, valor):
+        try:
+            return Entry.objects.select_related('topic').get(id=self.id(valor), topic__owner=self.usuario)
+        except Entry.DoesNotExist:
+            raise SincronizacaoInvalida('Entrada não encontrada.')
+
+    def sessao(self, operacao):
+        """Sessão aberta do usuário em um plano que ele pode ver (o dele ou um público)."""
+        plano = PlanoTreino.objects.filter(pk__in=ids_visiveis(self.usuario), pk=self.id(operacao.get('plano'))).first()
+        if plano is None:
+            raise SincronizacaoInvalida('Plano não encontrado.')
+        self.treinos = True
+        return SessaoTreino.aberta(self.usuario, plano)
+
+
+def _criar_topico(lote, operacao):
+    form = TopicForm(data=operacao)
+    form.instance.owner = lote.usuario
+    topico = _salvar(form)
+    return {'id': topico.id, 'versao': topico.date_updated}
+
+
+def _editar_topico(lote, operacao):
+    topico = lote.topico(operacao.get('id'))
+    if _conflito(operacao, topico.date_updated):
+        return {'erro': 'conflito', 'atual': {'id': topico.id, 'text': topico.text, 'date_updated': topico.date_updated}}
+    topico = _salvar(TopicForm(data=operacao, instance=topico))
+    return {'id': topico.id, 'versao': topico.date_updated}
+
+
+def _excluir_topico(lote, operacao):
+    lote.topico(operacao.get('id')).delete()
+    return {}
+
+
+def _criar_entrada(lote, operacao):
+    form = EntryForm(data=operacao)
+    form.instance.topic = lote.topico(operacao.get('topic'))
+    entrada = _salvar(form)
+    return {'id': entrada.id, 'versao': entrada.date_updated}
+
+
+def _editar_entrada(lote, operacao):
+    entrada = lote.entrada(operacao.get('id'))
+    if _conflito(operacao, entrada.date_updated):
+        return {'erro': 'conflito', 'atual': {'id': entrada.id, 'text': entrada.text, 'date_updated': entrada.date_updated}}
+    entrada = _salvar(EntryForm(data=operacao, instance=entrada))
+    return {'id': entrada.id, 'versao': entrada.date_updated}
+
+
+def _excluir_entrada(lote, operacao):
+    lote.entrada(operacao.get('id')).delete()
+    return {}
+
+
+def _concluidos(lote, operacao):
+    try:
+        estados = {int(exercicio_id): valor for exercicio_id, valor in operacao['estados'].items()}
+    except (KeyError, ValueError, AttributeError):
+        raise SincronizacaoInvalida('estados deve ser um objeto {exercicio_id: true/false}.')
+    if not all(isinstance(valor, bool) for valor in estados.values()):
+        raise SincronizacaoInvalida('estados deve ser um objeto {exercicio_id: true/false}.')
+    return {'alterados': lote.sessao(operacao).definir_estados(estados)}
+
+
+def _finalizar(lote, operacao):
+    return {'series': len(lote.sessao(operacao).finalizar())}
+
+
+# Operações aceitas em 'operacoes', pelo campo 'op'.
+OPERACOES = {
+    'criar_topico': _criar_topico,
+    'editar_topico': _editar_topico,
+    'excluir_topico': _excluir_topico,
+    'criar_entrada': _criar_entrada,
+    'editar_entrada': _editar_entrada,
+    'excluir_entrada': _excluir_entrada,
+    'concluidos': _concluidos,
+    'finalizar': _finalizar,
+}
+
+
+def aplicar(usuario, operacoes):
+    """
+    Grava em ordem as operações feitas sem conexão e retorna um resultado para cada uma.
+
+    Exemplo: [{"op": "criar_topico", "ref": "t1", "text": "Pernas"},
+              {"op": "criar_entrada", "topic": "t1", "text": "Agachamento 4x10"},
+              {"op": "concluidos", "plano": 3, "estados": {"12": true, "13": true}},
+              {"op": "finalizar", "plano": 3}]
+
+    Cada operação roda no seu savepoint: uma que falha volta atrás sozinha e as demais seguem.
+    Um objeto criado com 'ref' pode ser citado pelas operações seguintes no lugar do id. As edições
+    com 'versao' (a date_updated que o aplicativo tinha) recusam a alteração se a linha mudou depois.
+    """
+    if not isinstance(operacoes, list):
+        raise SincronizacaoInvalida('operacoes deve ser uma lista.')
+    lote = _Lote(usuario)
+    resultados = []
+    with transaction.atomic():
+        for operacao in operacoes:
+            funcao = OPERACOES.get(operacao.get('op')) if isinstance(operacao, dict) else None
+            if funcao is None:
+                resultados.append({'ok': False, 'erro': 'Operação desconhecida.'})
+                continue
+            if not isinstance(operacao.get('ref', ''), str):
+                resultados.append({'ok': False, 'erro': 'ref deve ser um texto.'})
+                continue
+            try:
+                with transaction.atomic():
+                    resultado = funcao(lote, operacao)
+            except SincronizacaoInvalida as erro:
+                resultado = {'erro': str(erro)}
+            if 'ref' in operacao and 'id' in resultado:
+                lote.refs[operacao['ref']] = resultado['id']
+            resultados.append({'ok': 'erro' not in resultado, **resultado})
+        if lote.treinos:
+            # As marcações não disparam sinais; o progresso do perfil é invalidado aqui.
+            transaction.on_commit(lambda: invalidar_estatisticas(usuario.id))
+    return resultados
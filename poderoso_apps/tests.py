@@ -1,3 +1,1931 @@
-from django.test import TestCase
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import cache as cache_planos
+from . import clonagem
+from . import importacao
+from . import metricas
+from . import sincronizacao
+from . import tmb
+from . import estaticos
+from . import views_async
+from .duracao import segundos_intervalo
+from .imagens import nomes_derivados
+from .paginacao import contagem_estimada
+from .models import (
+    Topic, Entry, PlanoTreino, Exercicio, SessaoTreino, RegistroSerie, ResumoTreinoDiario, Exclusao, ImagemConteudo,
+)
+
+
+def com_metricas():
+    """override_settings com a medição das requisições instalada (desligada por padrão, ver METRICAS_ATIVAS)."""
+    return override_settings(
+        METRICAS_ATIVAS=True,
+        MIDDLEWARE=[settings.METRICAS_MIDDLEWARE, *settings.MIDDLEWARE],
+        TEMPLATES=[{**settings.TEMPLATES[0], 'BACKEND': settings.METRICAS_TEMPLATES}],
+    )
+
+
+def gif_animado(largura=800, quadros=3):
+    """Cria um GIF animado em memória para os testes de imagens."""
+    imagens = [Image.new('RGB', (largura, largura // 2), (i * 60, 0, 0)) for i in range(quadros)]
+    buffer = io.BytesIO()
+    imagens[0].save(buffer, 'GIF', save_all=True, append_images=imagens[1:], duration=80, loop=0)
+    return buffer.getvalue()
+
+
+class DetalhesPlanoTests(TestCase):
+    """Testes da página de detalhes de um plano de treino."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.outro_user = User.objects.create_user('colega', password='senha-forte-123')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60, publico=True)
+        cls.exercicios = Exercicio.objects.bulk_create([
+            Exercicio(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s')
+            for i in range(4)
+        ])
+        SessaoTreino.aberta(cls.user, cls.plano).definir_estados({cls.exercicios[0].id: True})
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self, plano_id):
+        return f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={plano_id}"
+
+    def test_progresso_e_tempo_restante(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url(self.plano.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['progresso'], 25)
+        # 3 exercícios restantes de 3 x (12 repetições x 3s + 60s de descanso) = 864s.
+        self.assertAlmostEqual(response.context['tempo_restante'], 14.4)
+        self.assertEqual(response.context['concluidos'], {self.exercicios[0].id})
+        self.assertContains(response, f'value="{self.exercicios[0].id}"\n               data-exercicio-id="{self.exercicios[0].id}"\n               checked>')
+        self.assertNotContains(response, '__ESTADO_')
+
+    def test_progresso_e_individual(self):
+        self.client.force_login(self.outro_user)
+        response = self.client.get(self.url(self.plano.id))
+        self.assertEqual(response.context['progresso'], 0)
+        self.assertAlmostEqual(response.context['tempo_restante'], 19.2)
+
+    def test_plano_sem_exercicios(self):
+        vazio = PlanoTreino.objects.create(nome='Vazio', owner=self.user, tempo_estimado=30, publico=True)
+        response = self.client.get(self.url(vazio.id))
+        self.assertEqual(response.context['progresso'], 0)
+        self.assertEqual(response.context['tempo_restante'], 0)
+
+    def test_numero_de_consultas_independe_do_tamanho_do_plano(self):
+        # Cache vazio: plano e exercícios.
+        with self.assertNumQueries(2):
+            self.client.get(self.url(self.plano.id))
+        # Cache preenchido: nenhuma consulta para visitantes.
+        with self.assertNumQueries(0):
+            self.client.get(self.url(self.plano.id))
+
+        # bulk_create não dispara sinais, então a invalidação é explícita.
+        Exercicio.objects.bulk_create([
+            Exercicio(plano=self.plano, nome=f'Extra {i}', series=3, repeticoes=10, intervalo='60s')
+            for i in range(50)
+        ])
+        cache_planos.invalidar_plano(self.plano.id)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url(self.plano.id))
+        self.assertContains(response, 'Extra 49')
+
+        # Usuário logado: sessão e usuário da autenticação, os exercícios concluídos e a soma do tempo restante.
+        self.client.force_login(self.user)
+        with self.assertNumQueries(4):
+            self.client.get(self.url(self.plano.id))
+
+    def test_plano_id_invalido_da_404(self):
+        # '²' passa em str.isdigit() mas não em int(); números grandes demais não cabem no banco.
+        for plano_id in ('²', '١', 'abc', '9' * 30):
+            with self.subTest(plano_id=plano_id):
+                self.assertEqual(self.client.get(self.url(plano_id)).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(self.url('²'), {'salvar': '1'}).status_code, 404)
+        self.assertEqual(self.client.post(self.url(self.plano.id), {'exercicio_id': '²'}).status_code, 404)
+
+    def test_visitante_ve_checkboxes_desabilitadas(self):
+        response = self.client.get(self.url(self.plano.id))
+        self.assertEqual(response.content.decode().count('disabled>'), 4)
+        self.assertNotContains(response, 'checked>')
+
+    def test_post_inverte_exercicio(self):
+        self.client.force_login(self.user)
+        exercicio = self.exercicios[1]
+        response = self.client.post(self.url(self.plano.id), {'exercicio_id': exercicio.id})
+        self.assertRedirects(response, self.url(self.plano.id))
+        sessao = SessaoTreino.objects.get(owner=self.user, plano=self.plano, finalizada_em=None)
+        self.assertTrue(sessao.exercicios_concluidos.filter(id=exercicio.id).exists())
+
+        self.client.post(self.url(self.plano.id), {'exercicio_id': exercicio.id})
+        self.assertFalse(sessao.exercicios_concluidos.filter(id=exercicio.id).exists())
+
+    def test_post_exige_login(self):
+        response = self.client.post(self.url(self.plano.id), {'exercicio_id': self.exercicios[1].id})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('accounts:login'), response.url)
+
+    def test_post_exercicio_de_outro_plano(self):
+        self.client.force_login(self.user)
+        outro = PlanoTreino.objects.create(nome='Treino B', owner=self.user, tempo_estimado=40)
+        response = self.client.post(self.url(outro.id), {'exercicio_id': self.exercicios[1].id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_finalizar_grava_series_e_fecha_sessao(self):
+        self.client.force_login(self.user)
+        # O botão envia o formulário inteiro, com as caixas marcadas.
+        self.client.post(self.url(self.plano.id), {'finalizar': '1', 'concluidos': [self.exercicios[0].id]})
+
+        sessao = SessaoTreino.objects.get(owner=self.user, plano=self.plano)
+        self.assertIsNotNone(sessao.finalizada_em)
+        self.assertFalse(sessao.exercicios_concluidos.exists())
+        series = RegistroSerie.objects.filter(owner=self.user)
+        self.assertEqual(series.count(), 3)
+        self.assertEqual(set(series.values_list('exercicio_id', flat=True)), {self.exercicios[0].id})
+
+        # Depois de finalizada, a página volta a mostrar o plano sem progresso.
+        response = self.client.get(self.url(self.plano.id))
+        self.assertEqual(response.context['progresso'], 0)
+
+    def test_salvar_aplica_o_formulario_inteiro(self):
+        self.client.force_login(self.user)
+        marcados = [self.exercicios[1].id, self.exercicios[2].id]
+        response = self.client.post(self.url(self.plano.id), {'salvar': '1', 'concluidos': marcados})
+        self.assertRedirects(response, self.url(self.plano.id))
+        self.assertEqual(SessaoTreino.ids_concluidos(self.user, self.plano.id), set(marcados))
+
+
+class CachePlanosTests(TestCase):
+    """Testes do cache do catálogo e das páginas de plano, e da invalidação pelos sinais."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60, publico=True)
+        cls.exercicio = Exercicio.objects.create(plano=cls.plano, nome='Supino', series=3, repeticoes=12, intervalo='60s')
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self):
+        return f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}"
+
+    def test_catalogo_em_cache_ate_mudar(self):
+        url = reverse('poderoso_apps:planos_treinos')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Treino A')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlanoTreino.objects.create(nome='Treino B', owner=self.user, tempo_estimado=30, publico=True)
+        # Os planos e o prefetch dos exercícios.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Treino B')
+
+    def test_salvar_exercicio_invalida_o_plano(self):
+        self.client.get(self.url())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercicio.nome = 'Supino inclinado'
+            self.exercicio.save()
+        self.assertContains(self.client.get(self.url()), 'Supino inclinado')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercicio.delete()
+        self.assertNotContains(self.client.get(self.url()), 'Supino')
+
+    def test_uma_consulta_de_sessoes_por_transacao(self):
+        outro = User.objects.create_user('colega', password='senha-forte-123')
+        SessaoTreino.aberta(outro, self.plano)
+        cache_planos.estatisticas_usuario(outro.id)
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                for nome in ('Crucifixo', 'Flexão', 'Mergulho'):
+                    Exercicio.objects.create(plano=self.plano, nome=nome, series=3, repeticoes=12, intervalo='60s')
+        sessoes = [c for c in consultas.captured_queries if 'sessaotreino' in c['sql'] and c['sql'].startswith('SELECT')]
+        self.assertEqual(len(sessoes), 1)
+        with CaptureQueriesContext(connection) as consultas:
+            cache_planos.estatisticas_usuario(outro.id)
+        self.assertTrue(consultas.captured_queries)
+
+    def test_apagar_plano_nao_consulta_sessoes_por_exercicio(self):
+        outro = User.objects.create_user('colega', password='senha-forte-123')
+        SessaoTreino.aberta(outro, self.plano)
+        for i in range(5):
+            Exercicio.objects.create(plano=self.plano, nome=f'Extra {i}', series=3, repeticoes=12, intervalo='60s')
+        cache_planos.estatisticas_usuario(outro.id)
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.plano.delete()
+        sessoes = [c for c in consultas.captured_queries if 'sessaotreino' in c['sql'] and c['sql'].startswith('SELECT')]
+        # A leitura dos donos antes da exclusão e a coleta da cascata, sem uma consulta por exercício.
+        self.assertEqual(len(sessoes), 2)
+        with CaptureQueriesContext(connection) as consultas:
+            cache_planos.estatisticas_usuario(outro.id)
+        self.assertTrue(consultas.captured_queries)
+
+    def test_salvar_plano_invalida_a_pagina(self):
+        self.client.get(self.url())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plano.descricao = 'Foco em peito'
+            self.plano.save()
+        self.assertContains(self.client.get(self.url()), 'Foco em peito')
+
+    def test_plano_inexistente(self):
+        response = self.client.get(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id=999")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id=abc")
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogoPlanosTests(TestCase):
+    """Testes do catálogo de planos por dono, com os planos públicos e os totais de cada plano."""
+
+    url = reverse('poderoso_apps:planos_treinos')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.outro_user = User.objects.create_user('colega', password='senha-forte-123')
+        cls.meu = PlanoTreino.objects.create(nome='Meu treino', owner=cls.user, tempo_estimado=60)
+        cls.publico = PlanoTreino.objects.create(nome='Treino da academia', owner=cls.outro_user, tempo_estimado=60,
+                                                 publico=True)
+        cls.privado = PlanoTreino.objects.create(nome='Treino do colega', owner=cls.outro_user, tempo_estimado=60)
+        # 3 x (12 x 3 + 60) = 288 s por exercício.
+        Exercicio.objects.bulk_create([
+            Exercicio(plano=cls.meu, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s', intervalo_segundos=60)
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonimo_ve_so_os_publicos(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Treino da academia')
+        self.assertNotContains(response, 'Meu treino')
+        self.assertNotContains(response, 'Treino do colega')
+
+    def test_usuario_ve_os_seus_e_os_publicos(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'plano_id': self.meu.id})
+        self.assertContains(response, 'Treino da academia')
+        self.assertNotContains(response, 'Treino do colega')
+        self.assertContains(response, 'Meu treino (5 exercícios, ~24 min)')
+        self.assertContains(response, 'title="Exercício 0, Exercício 1')
+        self.assertContains(response, f'value="{self.meu.id}" selected')
+        # O fragmento em cache é de cada usuário.
+        self.client.force_login(self.outro_user)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Treino do colega')
+        self.assertNotContains(response, 'Meu treino')
+
+    def test_planos_privados_de_outros_dao_404(self):
+        detalhes = reverse('poderoso_apps:detalhes_plano')
+        self.assertEqual(self.client.get(detalhes, {'plano_id': self.privado.id}).status_code, 404)
+        self.assertEqual(self.client.get(detalhes, {'plano_id': self.publico.id}).status_code, 200)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(detalhes, {'plano_id': self.privado.id}).status_code, 404)
+        self.assertEqual(self.client.get(detalhes, {'plano_id': self.meu.id}).status_code, 200)
+        # Nem marcar exercícios: nenhuma sessão é aberta no plano do colega.
+        url = f'{detalhes}?plano_id={self.privado.id}'
+        self.assertEqual(self.client.post(url, {'salvar': '1'}).status_code, 404)
+        response = self.client.post(
+            reverse('poderoso_apps:definir_concluidos'),
+            json.dumps({'plano_id': self.privado.id, 'estados': {'1': True}}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(SessaoTreino.objects.filter(plano=self.privado).exists())
+        # O dono continua vendo o próprio plano, inclusive com a página já em cache.
+        self.client.force_login(self.outro_user)
+        self.assertEqual(self.client.get(detalhes, {'plano_id': self.privado.id}).status_code, 200)
+
+    def test_chave_do_cache_so_com_planos_visiveis(self):
+        from django.core.cache.utils import make_template_fragment_key
+        self.client.force_login(self.user)
+        versao = cache_planos.versao_catalogo()
+        for plano_id in ('abc', '²', '999999', str(self.privado.id)):
+            self.client.get(self.url, {'plano_id': plano_id})
+        self.assertIsNotNone(cache.get(make_template_fragment_key('catalogo_planos', [versao, self.user.id, None])))
+        self.assertIsNone(cache.get(make_template_fragment_key('catalogo_planos', [versao, self.user.id, '999999'])))
+        self.assertIsNone(cache.get(make_template_fragment_key('catalogo_planos', [versao, self.user.id, 999999])))
+        response = self.client.get(self.url, {'plano_id': self.publico.id})
+        self.assertContains(response, f'value="{self.publico.id}" selected')
+        self.assertIsNotNone(cache.get(make_template_fragment_key('catalogo_planos', [versao, self.user.id, self.publico.id])))
+
+    def test_consultas_constantes(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(self.url)
+        planos = PlanoTreino.objects.bulk_create([
+            PlanoTreino(nome=f'Modelo {i}', owner=self.outro_user, tempo_estimado=45, publico=True) for i in range(40)
+        ])
+        Exercicio.objects.bulk_create([
+            Exercicio(plano=plano, nome='Agachamento', series=4, repeticoes=10, intervalo='90s') for plano in planos
+        ])
+        cache.clear()
+        with CaptureQueriesContext(connection) as muitos:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Modelo 39')
+        self.assertEqual(len(muitos), len(poucos))
+
+    def test_exercicio_novo_atualiza_o_catalogo(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Exercicio.objects.create(plano=self.meu, nome='Remada', series=3, repeticoes=12, intervalo='60s')
+        self.assertContains(self.client.get(self.url), 'Meu treino (6 exercícios')
+
+
+class DefinirConcluidosTests(TestCase):
+    """Testes da API JSON que define o estado de vários exercícios de uma vez."""
+
+    url = reverse('poderoso_apps:definir_concluidos')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=40)
+        cls.exercicios = Exercicio.objects.bulk_create([
+            Exercicio(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s')
+            for i in range(4)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, dados):
+        return self.client.post(self.url, json.dumps(dados), content_type='application/json')
+
+    def test_define_varios_estados_em_lote(self):
+        a, b, c, _ = self.exercicios
+        response = self.post({'plano_id': self.plano.id, 'estados': {a.id: True, b.id: True, c.id: False}})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados['alterados'], 2)
+        self.assertEqual(dados['exercicios_concluidos'], 2)
+        self.assertEqual(dados['progresso'], 50)
+        self.assertAlmostEqual(dados['tempo_restante'], 9.6)
+
+    def test_idempotente(self):
+        a = self.exercicios[0]
+        self.post({'plano_id': self.plano.id, 'estados': {a.id: True}})
+        response = self.post({'plano_id': self.plano.id, 'estados': {a.id: True}})
+        self.assertEqual(response.json()['alterados'], 0)
+        self.assertEqual(response.json()['exercicios_concluidos'], 1)
+
+    def test_ignora_exercicios_de_outro_plano(self):
+        outro = PlanoTreino.objects.create(nome='Treino B', owner=self.user, tempo_estimado=40)
+        response = self.post({'plano_id': outro.id, 'estados': {self.exercicios[0].id: True}})
+        self.assertEqual(response.json()['alterados'], 0)
+        self.assertFalse(SessaoTreino.exercicios_concluidos.through.objects.exists())
+
+    def test_json_invalido(self):
+        self.assertEqual(self.client.post(self.url, 'x', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post({'plano_id': self.plano.id, 'estados': {}}).status_code, 400)
+        self.assertEqual(self.post({'plano_id': self.plano.id, 'estados': {'1': 'sim'}}).status_code, 400)
+
+    def test_plano_inexistente(self):
+        self.assertEqual(self.post({'plano_id': 999, 'estados': {'1': True}}).status_code, 404)
+
+    def test_exige_login(self):
+        self.client.logout()
+        self.assertEqual(self.post({'plano_id': self.plano.id, 'estados': {'1': True}}).status_code, 401)
+
+    def test_apenas_post(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class DuracaoExercicioTests(TestCase):
+    """Testes do descanso interpretado e da duração estimada de cada exercício."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60)
+
+    def test_interpreta_intervalos(self):
+        casos = {
+            '60s': 60, '90': 90, '2 minutos': 120, '1min30': 90, '1m30s': 90, '1,5 min': 90,
+            '1:30': 90, "1'30''": 90, '30-60s': 45, '1 a 2 min': 90, 'livre': None, '': None,
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(segundos_intervalo(texto), esperado)
+
+    def test_duracao_calculada_pelo_banco(self):
+        exercicio = Exercicio.objects.create(plano=self.plano, nome='Supino', series=4, repeticoes=10, intervalo='1min30')
+        self.assertEqual(exercicio.intervalo_segundos, 90)
+        self.assertEqual(exercicio.duracao_estimada, 4 * (10 * 3 + 90))
+
+        exercicio.intervalo = 'livre'
+        exercicio.save(update_fields=['intervalo'])
+        exercicio.refresh_from_db()
+        # Sem número no texto, vale o descanso padrão.
+        self.assertIsNone(exercicio.intervalo_segundos)
+        self.assertEqual(exercicio.duracao_estimada, 4 * (10 * 3 + 60))
+
+    def test_tempo_restante_soma_os_exercicios_que_faltam(self):
+        curto = Exercicio.objects.create(plano=self.plano, nome='Prancha', series=1, repeticoes=10, intervalo='30s')
+        longo = Exercicio.objects.create(plano=self.plano, nome='Agachamento', series=5, repeticoes=5, intervalo='3min')
+        self.assertEqual(self.plano.exercicios.tempo_restante(self.user), (60 + 5 * 195) / 60)
+
+        SessaoTreino.aberta(self.user, self.plano).definir_estados({longo.id: True})
+        self.assertEqual(self.plano.exercicios.tempo_restante(self.user), 60 / 60)
+        plano = PlanoTreino.objects.com_progresso(self.user).get(id=self.plano.id)
+        self.assertEqual(plano.tempo_restante, 1)
+        self.assertEqual(plano.progresso, 50)
+
+        self.client.force_login(self.user)
+        response = self.client.get(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}")
+        self.assertEqual(response.context['tempo_restante'], 1)
+        self.assertEqual(curto.duracao_estimada, 60)
+
+    def test_importacao_preenche_o_intervalo(self):
+        linhas = [(2, {'owner': 'aluno', 'plano': 'Treino A', 'tempo_estimado': '60', 'exercicio': 'Remada',
+                       'series': '3', 'repeticoes': '10', 'intervalo': '1min', 'imagem': ''})]
+        importacao.importar(linhas)
+        self.assertEqual(Exercicio.objects.get(nome='Remada').duracao_estimada, 3 * (10 * 3 + 60))
+
+
+class DerivadosImagemTests(TestCase):
+    """Testes da geração de miniaturas, WebP e posters das imagens dos exercícios."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        configuracao = override_settings(MEDIA_ROOT=self.media_root, IMAGENS_DERIVADOS_WORKERS=0)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        user = User.objects.create_user('aluno', password='senha-forte-123')
+        self.plano = PlanoTreino.objects.create(nome='Treino A', owner=user, tempo_estimado=60, publico=True)
+
+    def criar_exercicio(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Exercicio.objects.create(
+                plano=self.plano, nome='Supino', series=3, repeticoes=10, intervalo='60s',
+                imagens=SimpleUploadedFile('supino.gif', gif_animado(), content_type='image/gif'),
+            )
+
+    def test_upload_gera_derivados(self):
+        exercicio = self.criar_exercicio()
+        derivados = nomes_derivados(exercicio.imagens.name)
+        for largura, nomes in derivados.items():
+            with Image.open(os.path.join(self.media_root, nomes['webp'])) as webp:
+                self.assertEqual(webp.width, largura)
+                self.assertTrue(webp.is_animated)
+            with Image.open(os.path.join(self.media_root, nomes['miniatura'])) as poster:
+                self.assertEqual(poster.width, largura)
+                self.assertFalse(getattr(poster, 'is_animated', False))
+
+    def test_pagina_usa_srcset(self):
+        exercicio = self.criar_exercicio()
+        response = self.client.get(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}")
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f"{exercicio.miniaturas()['src']}")
+        self.assertNotContains(response, f'src="{exercicio.imagens.url}"')
+
+    def test_comando_gera_derivados_de_arquivos_existentes(self):
+        os.makedirs(os.path.join(self.media_root, 'media'))
+        with open(os.path.join(self.media_root, 'media', 'antiga.gif'), 'wb') as arquivo:
+            arquivo.write(gif_animado())
+        call_command('gerar_derivados_imagens', workers=1, stdout=io.StringIO())
+        for nomes in nomes_derivados('media/antiga.gif').values():
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, nomes['webp'])))
+
+
+class ArmazenamentoConteudoTests(TestCase):
+    """Testes do armazenamento das imagens pelo hash do conteúdo e da contagem de referências."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        configuracao = override_settings(MEDIA_ROOT=self.media_root, IMAGENS_DERIVADOS_WORKERS=0)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.user = User.objects.create_user('aluno', password='senha-forte-123')
+        self.plano = PlanoTreino.objects.create(nome='Treino A', owner=self.user, tempo_estimado=60)
+
+    def criar_exercicio(self, nome='supino.gif', conteudo=None, plano=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Exercicio.objects.create(
+                plano=plano or self.plano, nome='Supino', series=3, repeticoes=10, intervalo='60s',
+                imagens=SimpleUploadedFile(nome, conteudo or gif_animado(), content_type='image/gif'),
+            )
+
+    def referencias(self, nome):
+        return ImagemConteudo.objects.filter(nome=nome).values_list('referencias', flat=True).first()
+
+    def envelhecer(self, nome):
+        caminho = os.path.join(self.media_root, nome)
+        os.utime(caminho, (0, 0))
+
+    def test_mesmo_conteudo_e_gravado_uma_vez(self):
+        primeiro = self.criar_exercicio('supino.gif')
+        segundo = self.criar_exercicio('outro-nome.GIF')
+        self.assertEqual(primeiro.imagens.name, segundo.imagens.name)
+        self.assertRegex(primeiro.imagens.name, r'^conteudo/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(self.referencias(primeiro.imagens.name), 2)
+        pasta = os.path.dirname(os.path.join(self.media_root, primeiro.imagens.name))
+        self.assertEqual(os.listdir(pasta), [os.path.basename(primeiro.imagens.name)])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'conteudo', 'tmp')), [])
+
+    def test_troca_e_exclusao_descontam_referencias(self):
+        exercicio = self.criar_exercicio()
+        antigo = exercicio.imagens.name
+        exercicio.imagens = SimpleUploadedFile('novo.gif', gif_animado(400), content_type='image/gif')
+        with self.captureOnCommitCallbacks(execute=True):
+            exercicio.save()
+        self.assertEqual(self.referencias(antigo), 0)
+        self.assertEqual(self.referencias(exercicio.imagens.name), 1)
+        # Salvar sem trocar a imagem não mexe na contagem.
+        Exercicio.objects.get(pk=exercicio.pk).save()
+        self.assertEqual(self.referencias(exercicio.imagens.name), 1)
+        exercicio.delete()
+        self.assertEqual(self.referencias(exercicio.imagens.name), 0)
+
+    def test_clonagem_soma_referencias(self):
+        exercicio = self.criar_exercicio()
+        outros = [User.objects.create_user(f'aluno{i}').id for i in range(3)]
+        clonagem.clonar_plano(self.plano, outros)
+        self.assertEqual(self.referencias(exercicio.imagens.name), 4)
+        ImagemConteudo.objects.update(referencias=0)
+        ImagemConteudo.recontar()
+        self.assertEqual(self.referencias(exercicio.imagens.name), 4)
+
+    def test_importacao_ajusta_referencias(self):
+        nome = self.criar_exercicio().imagens.name
+        coach = User.objects.create_user('coach', is_staff=True)
+        texto = (
+            'owner,plano,descricao,tempo_estimado,exercicio,series,repeticoes,intervalo,imagem\n'
+            f'coach,Treino C,,60,Remada,3,10,60s,{nome}\n'
+        )
+        importacao.importar(importacao.ler(io.StringIO(texto), 'csv'))
+        self.assertEqual(self.referencias(nome), 2)
+        importacao.importar(importacao.ler(io.StringIO(texto.replace(nome, '')), 'csv'))
+        self.assertEqual(self.referencias(nome), 1)
+        self.assertTrue(PlanoTreino.objects.filter(owner=coach).exists())
+
+    def test_comando_apaga_imagens_sem_referencias(self):
+        exercicio = self.criar_exercicio()
+        nome = exercicio.imagens.name
+        derivados = [os.path.join(self.media_root, d['webp']) for d in nomes_derivados(nome).values()]
+        self.assertTrue(all(os.path.exists(d) for d in derivados))
+        exercicio.delete()
+
+        # Dentro da carência o arquivo fica (pode haver um envio em andamento).
+        call_command('limpar_imagens', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, nome)))
+
+        self.envelhecer(nome)
+        call_command('limpar_imagens', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, nome)))
+        self.assertFalse(any(os.path.exists(d) for d in derivados))
+        self.assertFalse(ImagemConteudo.objects.filter(nome=nome).exists())
+
+    def test_comando_mantem_imagens_em_uso(self):
+        nome = self.criar_exercicio().imagens.name
+        self.envelhecer(nome)
+        # Sem linha em ImagemConteudo, mas ainda usado por um exercício.
+        ImagemConteudo.objects.all().delete()
+        call_command('limpar_imagens', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, nome)))
+
+    def test_comando_converte_imagens_antigas(self):
+        os.makedirs(os.path.join(self.media_root, 'media'))
+        with open(os.path.join(self.media_root, 'media', 'antiga.gif'), 'wb') as arquivo:
+            arquivo.write(gif_animado())
+        Exercicio.objects.create(plano=self.plano, nome='Remada', series=3, repeticoes=10, intervalo='60s',
+                                 imagens='media/antiga.gif')
+        call_command('limpar_imagens', '--converter', stdout=io.StringIO())
+        nome = Exercicio.objects.get(nome='Remada').imagens.name
+        self.assertTrue(nome.startswith('conteudo/'))
+        self.assertEqual(self.referencias(nome), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'media', 'antiga.gif')))
+
+    def test_imagem_e_servida_como_imutavel(self):
+        nome = self.criar_exercicio().imagens.name
+        response = self.client.get(f'/media/{nome}')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class ServirMediaTests(TestCase):
+    """Testes da view que entrega os arquivos de MEDIA_ROOT."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        configuracao = override_settings(MEDIA_ROOT=self.media_root)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.conteudo = bytes(range(256)) * 4
+        os.makedirs(os.path.join(self.media_root, 'media'))
+        for nome in ('supino.gif', '9f86d081884c7d659a2feaa0c55ad015.gif'):
+            with open(os.path.join(self.media_root, 'media', nome), 'wb') as arquivo:
+                arquivo.write(self.conteudo)
+        self.url = reverse('poderoso_apps:media', args=['media/supino.gif'])
+
+    def test_arquivo_inteiro(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Content-Length'], str(len(self.conteudo)))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_nome_com_hash_e_imutavel(self):
+        response = self.client.get(reverse('poderoso_apps:media', args=['media/9f86d081884c7d659a2feaa0c55ad015.gif']))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], '"9f86d081884c7d659a2feaa0c55ad015"')
+
+    def test_requisicao_condicional(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.conteudo)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range_desatualizado_envia_arquivo_inteiro(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"antigo"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_repasse_ao_nginx(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/media/supino.gif')
+        self.assertEqual(response.content, b'')
+
+    def test_caminho_fora_de_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get(reverse('poderoso_apps:media', args=['media/nao-existe.gif'])).status_code, 404)
+
+
+class EstaticosTests(TestCase):
+    """Testes do collectstatic com hash e pré-compressão e do middleware que serve os estáticos."""
+
+    def setUp(self):
+        origem, self.static_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for pasta in (origem, self.static_root):
+            self.addCleanup(shutil.rmtree, pasta)
+        os.makedirs(os.path.join(origem, 'css'))
+        self.css = ('.treino { background: url("fundo.png"); }\n' * 200).encode()
+        with open(os.path.join(origem, 'css', 'treino.css'), 'wb') as arquivo:
+            arquivo.write(self.css)
+        with open(os.path.join(origem, 'css', 'fundo.png'), 'wb') as arquivo:
+            arquivo.write(b'\x89PNG' + bytes(range(256)))
+        configuracao = override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[origem],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'poderoso_apps.estaticos.ArmazenamentoComprimido'},
+            },
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as manifesto:
+            self.nome = json.load(manifesto)['paths']['css/treino.css']
+        self.url = f'/static/{self.nome}'
+
+    def test_collectstatic_gera_hash_e_gzip(self):
+        self.assertRegex(self.nome, r'^css/treino\.[0-9a-f]{12}\.css$')
+        caminho = os.path.join(self.static_root, self.nome)
+        self.assertTrue(os.path.exists(caminho + '.gz'))
+        # A imagem já é binária: não ganha variante.
+        self.assertFalse(any(nome.endswith('.png.gz') for nome in os.listdir(os.path.dirname(caminho))))
+
+    def test_negocia_gzip_com_cache_imutavel(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'fundo.', gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_sem_accept_encoding_envia_o_original(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(int(response['Content-Length']), os.path.getsize(os.path.join(self.static_root, self.nome)))
+        # gzip recusado com q=0.
+        self.assertNotIn('Content-Encoding', self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0'))
+
+    def test_requisicao_condicional_por_codificacao(self):
+        etag = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertNotEqual(etag, self.client.get(self.url)['ETag'])
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_prefere_brotli(self):
+        with open(os.path.join(self.static_root, self.nome + '.br'), 'wb') as arquivo:
+            arquivo.write(b'br')
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Length'], '2')
+
+    def test_codificacoes_aceitas(self):
+        self.assertEqual(estaticos.codificacoes_aceitas('gzip, deflate, br'), ['br', 'gzip'])
+        self.assertEqual(estaticos.codificacoes_aceitas('br;q=0, *'), ['gzip'])
+        self.assertEqual(estaticos.codificacoes_aceitas('identity'), [])
+
+    def test_arquivo_inexistente_segue_para_as_urls(self):
+        self.assertEqual(self.client.get('/static/css/nao-existe.css').status_code, 404)
+
+
+class PaginacaoTests(TestCase):
+    """Testes da paginação por cursor das listas de tópicos e entradas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.topicos = [Topic.objects.create(text=f'Tópico {i}', owner=cls.user) for i in range(5)]
+        # Datas iguais forçam o desempate pelo id.
+        Topic.objects.filter(id__in=[t.id for t in cls.topicos[1:4]]).update(date_added=cls.topicos[1].date_added)
+        cls.topico = cls.topicos[0]
+        cls.entradas = [Entry.objects.create(topic=cls.topico, text=f'Entrada {i}') for i in range(5)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def percorrer(self, url, chave):
+        vistos, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            vistos += [item.id for item in response.context[chave]]
+            cursor = response.context['proximo_cursor']
+            if not cursor:
+                return vistos
+
+    @mock.patch('poderoso_apps.views.TOPICOS_POR_PAGINA', 2)
+    def test_topicos_em_ordem_sem_repetir(self):
+        vistos = self.percorrer(reverse('poderoso_apps:topics'), 'topics')
+        self.assertEqual(vistos, [t.id for t in self.topicos])
+
+    @mock.patch('poderoso_apps.views.ENTRADAS_POR_PAGINA', 2)
+    def test_entradas_da_mais_recente_para_a_mais_antiga(self):
+        vistos = self.percorrer(reverse('poderoso_apps:topic', args=[self.topico.id]), 'entries')
+        self.assertEqual(vistos, [e.id for e in reversed(self.entradas)])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('poderoso_apps:topics'), {'cursor': 'invalido'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GetCondicionalTests(TestCase):
+    """Testes do ETag/Last-Modified e das respostas 304 das páginas de tópicos e de planos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Peito', owner=cls.user)
+        cls.entrada = Entry.objects.create(topic=cls.topico, text='Supino')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60, publico=True)
+        cls.exercicios = [
+            Exercicio.objects.create(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def revalidar(self, url, consultas):
+        """Busca a página e a pede de novo com o ETag recebido, esperando 304 com 'consultas' consultas."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        with self.assertNumQueries(consultas):
+            nao_modificada = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(nao_modificada.status_code, 304)
+        self.assertEqual(nao_modificada.content, b'')
+        self.assertEqual(nao_modificada['ETag'], response['ETag'])
+        return response
+
+    def test_topics(self):
+        url = reverse('poderoso_apps:topics')
+        # Sessão e o validador (o usuário vem do cache); a página de tópicos não é buscada.
+        response = self.revalidar(url, 2)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        # Um tópico novo muda a contagem e a data.
+        Topic.objects.create(text='Costas', owner=self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_topics_exclusao_muda_o_etag(self):
+        url = reverse('poderoso_apps:topics')
+        outro = Topic.objects.create(text='Costas', owner=self.user)
+        etag = self.client.get(url)['ETag']
+        outro.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_topic_edicao_de_entrada_muda_o_etag(self):
+        url = reverse('poderoso_apps:topic', args=[self.topico.id])
+        # Sessão e o tópico com o resumo das entradas.
+        etag = self.revalidar(url, 2)['ETag']
+        Entry.objects.filter(pk=self.entrada.pk).update(date_updated=timezone.now() + datetime.timedelta(seconds=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_topic_de_outro_usuario_continua_404(self):
+        url = reverse('poderoso_apps:topic', args=[self.topico.id])
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(User.objects.create_user('colega', password='senha-forte-123'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_detalhes_plano(self):
+        url = f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}"
+        # Sessão e os concluídos; o tempo restante não é calculado.
+        etag = self.revalidar(url, 2)['ETag']
+        # Marcar um exercício muda a página sem mudar nenhuma data.
+        self.client.post(url, {'exercicio_id': self.exercicios[0].id})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercicios[1].nome = 'Remada'
+            self.exercicios[1].save()
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Remada')
+
+    def test_etag_depende_do_usuario(self):
+        url = f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}"
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BuscaTests(TestCase):
+    """Testes da busca textual nos tópicos e entradas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        outro = User.objects.create_user('colega', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Treino de peito', owner=cls.user)
+        cls.entrada = Entry.objects.create(topic=cls.topico, text='Hoje fiz supino <b>inclinado</b> com 40kg')
+        Entry.objects.create(topic=cls.topico, text='Agachamento livre')
+        alheio = Topic.objects.create(text='Supino do colega', owner=outro)
+        Entry.objects.create(topic=alheio, text='Supino reto')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def buscar(self, q):
+        return self.client.get(reverse('poderoso_apps:buscar'), {'q': q}).context['resultados']
+
+    def test_busca_por_prefixo_e_apenas_do_usuario(self):
+        resultados = self.buscar('sup')
+        self.assertEqual([(r['tipo'], r['id']) for r in resultados], [('entry', self.entrada.id)])
+
+    def test_trecho_destacado_e_escapado(self):
+        trecho = self.buscar('inclinado')[0]['trecho']
+        self.assertIn('<mark>inclinado</mark>', trecho)
+        self.assertIn('&lt;b&gt;', trecho)
+
+    def test_indice_acompanha_edicoes_e_exclusoes(self):
+        self.entrada.text = 'Hoje fiz remada'
+        self.entrada.save()
+        self.assertEqual(self.buscar('supino'), [])
+        self.assertEqual(len(self.buscar('remada')), 1)
+        self.topico.delete()
+        self.assertEqual(self.buscar('remada'), [])
+        self.assertEqual(self.buscar('peito'), [])
+
+    def test_caracteres_especiais_nao_quebram_a_consulta(self):
+        self.assertEqual(self.buscar('"peito OR ( *'), [])
+        self.assertEqual(len(self.buscar('peito')), 1)
+
+    def test_reconstruir(self):
+        saida = io.StringIO()
+        call_command('reconstruir_busca', stdout=saida)
+        self.assertIn('5 tópicos e entradas indexados', saida.getvalue())
+        self.assertEqual(len(self.buscar('sup')), 1)
+
+
+class BenchmarkBancoTests(TestCase):
+    """Teste do benchmark de concorrência do SQLite."""
+
+    def test_perfil_de_producao_nao_tem_erros_de_lock(self):
+        saida = io.StringIO()
+        call_command('benchmark_banco', threads=4, operacoes=20, json=True, stdout=saida)
+        padrao, producao = json.loads(saida.getvalue())
+        self.assertEqual(padrao['operacoes'], 80)
+        self.assertEqual(producao['erros_lock'], 0)
+
+
+class TmbLoteTests(TestCase):
+    """Testes do cálculo da TMB em lote (API e comando)."""
+
+    url = reverse('poderoso_apps:calcular_tmb_lote')
+    linhas = [
+        {'peso': '70', 'idade': '30', 'altura': '175', 'sexo': 'H'},
+        {'peso': 60, 'idade': 25, 'altura': 165, 'sexo': 'M'},
+        {'peso': '70', 'idade': '30.5', 'altura': '175', 'sexo': 'H'},
+        {'peso': '70', 'idade': '30', 'altura': '1000', 'sexo': 'M'},
+        {'peso': 'abc', 'idade': '30', 'altura': '175', 'sexo': 'X'},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('treinador', password='senha-forte-123')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def conferir(self, tmbs, erros):
+        self.assertAlmostEqual(tmbs[0], tmb.calcular(70, 175, 30, 'H'))
+        self.assertAlmostEqual(tmbs[1], tmb.calcular(60, 165, 25, 'M'))
+        self.assertEqual(tmbs[2:], [None, None, None])
+        self.assertEqual(erros[:2], [None, None])
+        self.assertIn('idade', erros[2])
+        self.assertIn('altura', erros[3])
+        self.assertIn('peso', erros[4])
+
+    def test_calcular_lote(self):
+        self.conferir(*tmb.calcular_lote(self.linhas))
+
+    def test_calcular_lote_sem_numpy(self):
+        with mock.patch.object(tmb, 'np', None):
+            self.conferir(*tmb.calcular_lote(self.linhas))
+
+    def test_api_json(self):
+        response = self.client.post(self.url, json.dumps(self.linhas), content_type='application/json')
+        self.assertTrue(response.streaming)
+        dados = json.loads(b''.join(response.streaming_content))
+        self.conferir([d['tmb'] for d in dados], [d['erro'] for d in dados])
+        self.assertEqual(dados[0]['peso'], '70')
+
+    def test_api_csv_no_corpo(self):
+        corpo = 'peso,idade,altura,sexo\n70,30,175,H\n60,25,165,M\n'
+        response = self.client.post(self.url, corpo, content_type='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(linhas[0], 'peso,idade,altura,sexo,tmb,erro')
+        self.assertEqual(linhas[1], f"70,30,175,H,{tmb.calcular(70, 175, 30, 'H'):.2f},")
+        self.assertEqual(len(linhas), 3)
+
+    def test_api_csv_em_arquivo_com_saida_json(self):
+        arquivo = SimpleUploadedFile('alunos.csv', b'\xef\xbb\xbfpeso,idade,altura,sexo\r\n70,30,175,H\r\n')
+        response = self.client.post(f'{self.url}?formato=json', {'arquivo': arquivo})
+        dados = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(dados), 1)
+        self.assertIsNone(dados[0]['erro'])
+
+    def test_api_rejeita_entrada_invalida(self):
+        response = self.client.post(self.url, 'peso,idade\n70,30\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('altura', response.json()['erro'])
+        response = self.client.post(self.url, '{"linhas": 1}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_celulas_com_listas_e_objetos(self):
+        # Listas de mesmo tamanho em todas as linhas virariam uma matriz no np.array da coluna.
+        listas = [{'peso': [70], 'idade': [30], 'altura': [175], 'sexo': ['H']}] * 2
+        objetos = [
+            {'peso': {'kg': 70}, 'idade': 30, 'altura': 175, 'sexo': 'H'},
+            {'peso': 70, 'idade': 30, 'altura': 175, 'sexo': {'s': 'H'}},
+        ]
+        for sem_numpy in (False, True):
+            with self.subTest(sem_numpy=sem_numpy), mock.patch.object(tmb, 'np', None if sem_numpy else tmb.np):
+                self.assertEqual(tmb.calcular_lote(listas), ([None] * 2, ['peso: informe um número válido'] * 2))
+                tmbs, erros = tmb.calcular_lote(objetos)
+                self.assertEqual(tmbs, [None] * 2)
+                self.assertEqual([erro.split(':')[0] for erro in erros], ['peso', 'sexo'])
+        for linhas in (listas, objetos):
+            response = self.client.post(self.url, json.dumps(linhas), content_type='application/json')
+            dados = json.loads(b''.join(response.streaming_content))
+            self.assertEqual([d['tmb'] for d in dados], [None] * len(linhas))
+
+    def test_api_exige_login(self):
+        self.client.logout()
+        response = self.client.post(self.url, '[]', content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'erro': 'Autenticação necessária.'})
+
+    def test_json_lido_aos_poucos(self):
+        # Pedaços pequenos: valores, números e a chave 'linhas' cortados entre duas leituras.
+        texto = json.dumps({'origem': {'a': [1, 2]}, 'linhas': self.linhas * 3})
+        with mock.patch.object(tmb, 'TAMANHO_LEITURA', 7):
+            linhas = [linha for bloco in tmb.ler_json(io.StringIO(texto), tamanho=4) for linha in bloco]
+        self.assertEqual(linhas, self.linhas * 3)
+        self.assertEqual(list(tmb.ler_json(io.StringIO(' [ ] '))), [])
+        for invalido in ('[1]', '{"outra": []}', '[{"peso": 70}', '', '[{"peso": 70}}'):
+            with self.subTest(invalido=invalido), self.assertRaises(ValueError):
+                [linha for bloco in tmb.ler_json(io.StringIO(invalido)) for linha in bloco]
+        with mock.patch.multiple(tmb, TAMANHO_LEITURA=10, TAMANHO_MAXIMO_VALOR=100), self.assertRaises(ValueError):
+            list(tmb.ler_json(io.StringIO(json.dumps([{'sexo': 'H' * 200}]))))
+
+    def test_formulario_individual(self):
+        response = self.client.post(reverse('poderoso_apps:calculotmb'),
+                                    {'peso': 70, 'idade': 30, 'altura': 175, 'sexo': 'H'})
+        self.assertAlmostEqual(response.context['tmb'], tmb.calcular(70, 175, 30, 'H'))
+        response = self.client.post(reverse('poderoso_apps:calculotmb'), {'peso': 70})
+        self.assertIsNone(response.context['tmb'])
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            entrada = os.path.join(pasta, 'alunos.json')
+            with open(entrada, 'w') as arquivo:
+                json.dump(self.linhas, arquivo)
+            saida = io.StringIO()
+            call_command('calcular_tmb_lote', entrada, formato='csv', stdout=saida, stderr=io.StringIO())
+        linhas = saida.getvalue().splitlines()
+        self.assertEqual(len(linhas), len(self.linhas) + 1)
+        self.assertTrue(linhas[1].startswith('70,30,175,H,'))
+
+
+class BenchmarkViewsTests(TestCase):
+    """Teste do benchmark das views (o banco de teste do próprio teste substitui o do comando)."""
+
+    def test_percentil(self):
+        from .management.commands.benchmark_views import _percentil
+        valores = list(range(1, 101))
+        self.assertEqual([_percentil(valores, p) for p in (7, 50, 95, 99, 100)], [7, 50, 95, 99, 100])
+        self.assertEqual([_percentil([10, 20, 30, 40], p) for p in (50, 75, 95)], [20, 30, 40])
+        self.assertEqual(_percentil([7], 99), 7)
+
+    def test_mede_todas_as_rotas(self):
+        modulo = 'poderoso_apps.management.commands.benchmark_views'
+        saida = io.StringIO()
+        with mock.patch(f'{modulo}.setup_test_environment'), mock.patch(f'{modulo}.teardown_test_environment'), \
+                mock.patch('django.db.connection.creation.create_test_db'), \
+                mock.patch('django.db.connection.creation.destroy_test_db'):
+            call_command('benchmark_views', repeticoes=2, aquecimento=0, planos=2, exercicios_por_plano=3,
+                         usuarios=2, topicos_por_usuario=2, entradas_por_topico=2, imagens=1, stdout=saida)
+        relatorio = json.loads(saida.getvalue())
+        self.assertEqual(relatorio['sem_cenario'], [])
+        for nome in ('poderoso_apps:topic', 'poderoso_apps:detalhes_plano', 'accounts:login', 'poderoso_apps:media'):
+            self.assertIn(nome, relatorio['rotas'])
+        detalhes = relatorio['rotas']['poderoso_apps:detalhes_plano']
+        self.assertEqual(detalhes['status'], {'200': 2})
+        self.assertLessEqual(detalhes['p50_ms'], detalhes['p99_ms'])
+        self.assertGreater(detalhes['consultas'], 0)
+
+    def test_condicional_revalida_as_paginas(self):
+        modulo = 'poderoso_apps.management.commands.benchmark_views'
+        saida = io.StringIO()
+        with mock.patch(f'{modulo}.setup_test_environment'), mock.patch(f'{modulo}.teardown_test_environment'), \
+                mock.patch('django.db.connection.creation.create_test_db'), \
+                mock.patch('django.db.connection.creation.destroy_test_db'):
+            call_command('benchmark_views', repeticoes=2, aquecimento=1, condicional=True, imagens=0,
+                         rotas=['poderoso_apps:topics', 'poderoso_apps:detalhes_plano'], stdout=saida)
+        for rota in json.loads(saida.getvalue())['rotas'].values():
+            self.assertEqual(rota['status'], {'304': 2})
+
+
+class BenchmarkSessoesTests(TestCase):
+    """Teste do benchmark dos perfis de sessão (o banco de teste do próprio teste substitui o do comando)."""
+
+    def test_usuario_em_cache_e_sessao_em_cache_sem_consultas_de_autenticacao(self):
+        modulo = 'poderoso_apps.management.commands.benchmark_sessoes'
+        saida = io.StringIO()
+        with mock.patch(f'{modulo}.setup_test_environment'), mock.patch(f'{modulo}.teardown_test_environment'), \
+                mock.patch('django.db.connection.creation.create_test_db'), \
+                mock.patch('django.db.connection.creation.destroy_test_db'):
+            call_command('benchmark_sessoes', repeticoes=2, perfis=['db', 'cached_db'], stdout=saida)
+        resultados = json.loads(saida.getvalue())['resultados']
+        self.assertEqual(set(resultados), {'db+model', 'db+cache', 'cached_db+model', 'cached_db+cache'})
+        for rota in ('topics', 'detalhes_plano'):
+            self.assertEqual((resultados['db+model'][rota]['sessao'], resultados['db+model'][rota]['usuario']), (1, 1))
+            self.assertEqual((resultados['cached_db+cache'][rota]['sessao'], resultados['cached_db+cache'][rota]['usuario']), (0, 0))
+            self.assertEqual(
+                resultados['cached_db+cache'][rota]['consultas'], resultados['db+model'][rota]['consultas'] - 2,
+            )
+
+
+@com_metricas()
+class MetricasTests(TestCase):
+    """Testes do middleware de medição e da view de métricas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.staff = User.objects.create_user('admin', password='senha-forte-123', is_staff=True)
+        Topic.objects.create(text='Peito', owner=cls.user)
+
+    def setUp(self):
+        for histograma in metricas.HISTOGRAMAS:
+            histograma.limpar()
+
+    def test_server_timing(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('poderoso_apps:topics'))
+        cabecalho = response['Server-Timing']
+        self.assertRegex(cabecalho, r'^db;dur=[\d.]+;desc="4 consultas", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertGreater(float(cabecalho.split('tpl;dur=')[1].split(',')[0]), 0)
+
+    def test_histogramas_por_view(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('poderoso_apps:topics'))
+        self.client.get(reverse('poderoso_apps:topics'))
+        self.client.get('/nao-existe/')
+        texto = metricas.exportar()
+        self.assertIn('poderoso_request_duration_seconds_count{view="poderoso_apps:topics"} 2', texto)
+        # Sessão, usuário, validador da página e tópicos; na segunda requisição o usuário já vem do cache.
+        self.assertIn('poderoso_db_queries_bucket{view="poderoso_apps:topics",le="5"} 2', texto)
+        self.assertIn('poderoso_db_queries_bucket{view="poderoso_apps:topics",le="3"} 1', texto)
+        self.assertIn('poderoso_db_queries_bucket{view="poderoso_apps:topics",le="2"} 0', texto)
+        self.assertIn('poderoso_request_duration_seconds_count{view="<sem rota>"} 1', texto)
+
+    def test_view_de_metricas_so_para_staff(self):
+        url = reverse('poderoso_apps:metricas')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, '# TYPE poderoso_template_render_seconds histogram')
+
+    def _perfis(self, **ambiente):
+        """Middleware e backend de templates dos dois perfis, lidos num processo com o ambiente limpo."""
+        codigo = (
+            'import json; from poderoso_app import settings as b, settings_producao as p; '
+            'print(json.dumps([b.MIDDLEWARE, b.TEMPLATES[0]["BACKEND"], p.MIDDLEWARE, p.TEMPLATES[0]["BACKEND"]]))'
+        )
+        env = {chave: valor for chave, valor in os.environ.items() if not chave.startswith('DJANGO_')}
+        resultado = subprocess.run(
+            [sys.executable, '-c', codigo], env={**env, **ambiente}, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        return json.loads(resultado.stdout)
+
+    def test_ligada_so_em_producao_por_padrao(self):
+        middleware, templates, middleware_producao, templates_producao = self._perfis()
+        self.assertNotIn(settings.METRICAS_MIDDLEWARE, middleware)
+        self.assertEqual(templates, 'django.template.backends.django.DjangoTemplates')
+        self.assertEqual(middleware_producao[0], settings.METRICAS_MIDDLEWARE)
+        self.assertEqual(templates_producao, settings.METRICAS_TEMPLATES)
+        _, _, middleware_producao, _ = self._perfis(DJANGO_METRICAS='0')
+        self.assertNotIn(settings.METRICAS_MIDDLEWARE, middleware_producao)
+
+    @override_settings(METRICAS_ATIVAS=False)
+    def test_desligado(self):
+        response = self.client.get(reverse('poderoso_apps:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class ImportacaoPlanosTests(TestCase):
+    """Testes da importação e exportação de planos (comandos e admin)."""
+
+    csv = (
+        'owner,plano,descricao,tempo_estimado,exercicio,series,repeticoes,intervalo,imagem\n'
+        'coach,Treino A,Peito,60,Supino,3,12,60s,\n'
+        'coach,Treino A,Peito,60,Crucifixo,3,10,45s,media/crucifixo.gif\n'
+        'coach,Treino B,,30,,,,,\n'
+        'coach,Treino C,,abc,Remada,3,10,60s,\n'
+        'ninguem,Treino D,,30,Remada,3,10,60s,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.coach = User.objects.create_user('coach', password='senha-forte-123', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def importar(self, texto, formato='csv', **kwargs):
+        return importacao.importar(importacao.ler(io.StringIO(texto), formato), **kwargs)
+
+    def test_importa_e_reimporta_sem_duplicar(self):
+        resultado = self.importar(self.csv, tamanho_lote=2)
+        self.assertEqual(resultado.como_dict(), {
+            'planos_criados': 2, 'planos_atualizados': 0, 'exercicios_criados': 2, 'exercicios_atualizados': 0,
+            'erros': 2,
+        })
+        self.assertEqual(resultado.erros, [
+            'linha 5: tempo_estimado: informe um número inteiro',
+            'linha 6: owner: usuário "ninguem" não existe',
+        ])
+        crucifixo = Exercicio.objects.get(nome='Crucifixo')
+        self.assertEqual(crucifixo.imagens.name, 'media/crucifixo.gif')
+        self.assertFalse(PlanoTreino.objects.get(nome='Treino B').exercicios.exists())
+
+        resultado = self.importar(self.csv.replace('Supino,3,12', 'Supino,4,12'))
+        self.assertEqual((resultado.exercicios_criados, resultado.exercicios_atualizados), (0, 1))
+        self.assertEqual(Exercicio.objects.get(nome='Supino').series, 4)
+        self.assertEqual(PlanoTreino.objects.count(), 2)
+
+    def test_exporta_e_importa_jsonl(self):
+        self.importar(self.csv)
+        texto = ''.join(importacao.escrever(importacao.linhas_exportacao(), 'jsonl'))
+        linhas = [json.loads(linha) for linha in texto.splitlines()]
+        self.assertEqual([(l['plano'], l['exercicio']) for l in linhas],
+                         [('Treino A', 'Supino'), ('Treino A', 'Crucifixo'), ('Treino B', '')])
+        PlanoTreino.objects.all().delete()
+        resultado = self.importar(texto, 'jsonl')
+        self.assertEqual((resultado.planos_criados, resultado.exercicios_criados, resultado.total_erros), (2, 2, 0))
+
+    def test_coluna_publico(self):
+        csv = 'owner,plano,tempo_estimado,publico,exercicio\ncoach,Modelo,30,sim,\ncoach,Meu,30,,\ncoach,Outro,30,talvez,\n'
+        resultado = self.importar(csv)
+        self.assertEqual(resultado.erros, ['linha 4: publico: use true ou false'])
+        self.assertEqual(dict(PlanoTreino.objects.values_list('nome', 'publico')), {'Modelo': True, 'Meu': False})
+        # A exportação leva a coluna; sem ela (ou vazia), o plano existente mantém o valor.
+        texto = ''.join(importacao.escrever(importacao.linhas_exportacao(), 'csv'))
+        self.assertIn('coach,Modelo,,30,True,', texto)
+        self.importar('owner,plano,tempo_estimado,exercicio\ncoach,Modelo,30,\n')
+        self.assertTrue(PlanoTreino.objects.get(nome='Modelo').publico)
+        self.importar(texto.replace(',True,', ',False,'))
+        self.assertFalse(PlanoTreino.objects.get(nome='Modelo').publico)
+
+    def test_importacao_invalida_o_cache_do_plano(self):
+        self.importar(self.csv)
+        plano = PlanoTreino.objects.get(nome='Treino A')
+        url = f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={plano.id}"
+        self.client.force_login(self.coach)
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar(self.csv.replace('Supino,', 'Supino inclinado,'))
+        self.assertContains(self.client.get(url), 'Supino inclinado')
+
+    def test_comandos(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            entrada = os.path.join(pasta, 'planos.csv')
+            with open(entrada, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(self.csv)
+            saida = io.StringIO()
+            call_command('import_planos', entrada, lote=1, stdout=saida, stderr=io.StringIO())
+            self.assertIn('Planos: 2 criados', saida.getvalue())
+            exportado = os.path.join(pasta, 'planos.jsonl')
+            call_command('export_planos', saida=exportado, owner='coach')
+            with open(exportado, encoding='utf-8') as arquivo:
+                self.assertEqual(len(arquivo.readlines()), 3)
+
+    def test_admin(self):
+        self.importar(self.csv)
+        self.client.force_login(self.coach)
+        response = self.client.post(reverse('admin:poderoso_apps_planotreino_changelist'), {
+            'action': 'exportar_csv', '_selected_action': [PlanoTreino.objects.get(nome='Treino A').id],
+        })
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(linhas), 3)
+
+        self.assertContains(self.client.get(reverse('admin:poderoso_apps_planotreino_importar')), 'enctype="multipart/form-data"')
+        arquivo = SimpleUploadedFile('planos.csv', self.csv.replace('Treino A', 'Treino E').encode())
+        response = self.client.post(reverse('admin:poderoso_apps_planotreino_importar'), {'arquivo': arquivo, 'lote': 100})
+        self.assertRedirects(response, reverse('admin:poderoso_apps_planotreino_changelist'))
+        self.assertTrue(PlanoTreino.objects.filter(nome='Treino E', owner=self.coach).exists())
+
+        # Caminhos fora do diretório de mídia viram erro da linha, não um erro 500.
+        arquivo = SimpleUploadedFile('planos.csv', self.csv.replace('media/crucifixo.gif', '../../etc/passwd').encode())
+        response = self.client.post(reverse('admin:poderoso_apps_planotreino_importar'), {'arquivo': arquivo, 'lote': 100})
+        self.assertRedirects(response, reverse('admin:poderoso_apps_planotreino_changelist'))
+        resultado = self.importar(self.csv.replace('media/crucifixo.gif', '/etc/passwd'))
+        self.assertIn('linha 3: imagem: informe um caminho relativo ao diretório de mídia', resultado.erros)
+        self.assertFalse(Exercicio.objects.filter(imagens__contains='passwd').exists())
+
+
+class AdminEscalavelTests(TestCase):
+    """Testes das listas do admin com muitas linhas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('chefe', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Treino de peito', owner=cls.admin)
+        Entry.objects.bulk_create([Entry(topic=cls.topico, text=f'Supino série {i}') for i in range(5)])
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.admin, tempo_estimado=60)
+        Exercicio.objects.create(plano=cls.plano, nome='Supino', series=3, repeticoes=12, intervalo='60s')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(consultas)
+
+    def test_lista_sem_consultas_por_linha(self):
+        url = reverse('admin:poderoso_apps_entry_changelist')
+        # A primeira requisição também guarda o usuário logado no cache.
+        self.contar_consultas(url)
+        antes = self.contar_consultas(url)
+        outros = [Topic.objects.create(text=f'Tópico {i}', owner=self.admin) for i in range(10)]
+        Entry.objects.bulk_create([Entry(topic=t, text='Remada') for t in outros])
+        self.assertEqual(self.contar_consultas(url), antes)
+
+    def test_busca_pelo_indice_e_pelo_dono(self):
+        url = reverse('admin:poderoso_apps_entry_changelist')
+        Entry.objects.create(topic=self.topico, text='Agachamento livre')
+        response = self.client.get(url, {'q': 'agach'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(url, {'q': 'chefe'})
+        self.assertEqual(response.context['cl'].result_count, 6)
+
+    def test_paginador_usa_estimativa_sem_filtro(self):
+        url = reverse('admin:poderoso_apps_entry_changelist')
+        with mock.patch('poderoso_apps.paginacao.contagem_estimada', return_value=2_000_000):
+            response = self.client.get(url)
+            self.assertEqual(response.context['cl'].result_count, 2_000_000)
+            # Com filtro a contagem é exata.
+            response = self.client.get(url, {'q': 'supino'})
+            self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_contagem_estimada_do_sqlite(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(contagem_estimada(Entry), 5)
+
+    def test_formularios_sem_select_das_tabelas_grandes(self):
+        entrada = Entry.objects.first()
+        response = self.client.get(reverse('admin:poderoso_apps_entry_change', args=[entrada.id]))
+        self.assertContains(response, 'class="vForeignKeyRawIdAdminField"')
+        response = self.client.get(reverse('admin:poderoso_apps_planotreino_change', args=[self.plano.id]))
+        self.assertContains(response, 'exercicios-TOTAL_FORMS')
+        self.assertContains(response, 'value="Supino"')
+
+
+@override_settings(VIEWS_ASYNC=True)
+class ViewsAsyncTests(TestCase):
+    """Testes das views async (usadas no ASGI), pelo AsyncClient com as rotas recarregadas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.outro_user = User.objects.create_user('colega', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Treino de peito', owner=cls.user)
+        Entry.objects.bulk_create([Entry(topic=cls.topico, text=f'Supino {i}') for i in range(25)])
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60)
+        cls.exercicios = Exercicio.objects.bulk_create([
+            Exercicio(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s')
+            for i in range(4)
+        ])
+        SessaoTreino.aberta(cls.user, cls.plano).definir_estados({cls.exercicios[0].id: True})
+
+    def setUp(self):
+        cache.clear()
+        self.recarregar_rotas()
+        self.addCleanup(self.recarregar_rotas)
+
+    def recarregar_rotas(self):
+        # urls.py escolhe as views ao ser importado; recarrega para valer o VIEWS_ASYNC do momento.
+        importlib.reload(importlib.import_module('poderoso_apps.urls'))
+        importlib.reload(importlib.import_module('poderoso_app.urls'))
+        clear_url_caches()
+
+    def test_rotas_usam_as_views_async(self):
+        self.assertIs(resolve(reverse('poderoso_apps:topics')).func.__wrapped__, views_async.topics.__wrapped__)
+
+    async def test_plano_id_invalido_da_404(self):
+        response = await self.async_client.get(reverse('poderoso_apps:detalhes_plano'), {'plano_id': '²'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_plano_privado_de_outro_usuario(self):
+        privado = await PlanoTreino.objects.acreate(nome='Privado', owner=self.outro_user, tempo_estimado=30)
+        url = f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={privado.id}"
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+    @com_metricas()
+    async def test_server_timing_conta_as_consultas_async(self):
+        # As consultas das views async rodam em outra thread; a contagem é a mesma da view síncrona.
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('poderoso_apps:topics'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="4 consultas", ')
+
+    async def test_topics_e_topic_exigem_login(self):
+        response = await self.async_client.get(reverse('poderoso_apps:topics'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('accounts:login'), response.url)
+
+    async def test_topic_com_paginacao(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('poderoso_apps:topic', args=[self.topico.id]))
+        self.assertEqual(len(response.context['entries']), 20)
+        self.assertContains(response, 'Supino 24')
+        response = await self.async_client.get(
+            reverse('poderoso_apps:topic', args=[self.topico.id]), {'cursor': response.context['proximo_cursor']}
+        )
+        self.assertEqual(len(response.context['entries']), 5)
+
+        await self.async_client.aforce_login(self.outro_user)
+        response = await self.async_client.get(reverse('poderoso_apps:topic', args=[self.topico.id]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('poderoso_apps:topics'))
+        self.assertEqual(list(response.context['topics']), [])
+
+    @com_metricas()
+    async def test_detalhes_e_catalogo(self):
+        await self.async_client.aforce_login(self.user)
+        url = f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.context['progresso'], 25)
+        self.assertEqual(response.context['concluidos'], {self.exercicios[0].id})
+        self.assertContains(response, 'Exercício 3')
+        self.assertIn('desc="6 consultas"', response['Server-Timing'])
+
+        response = await self.async_client.post(url, {'exercicio_id': self.exercicios[1].id})
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.context['progresso'], 50)
+
+        catalogo = reverse('poderoso_apps:planos_treinos')
+        self.assertContains(await self.async_client.get(catalogo), 'Treino A')
+        # Na segunda vez o fragmento vem do cache e os planos nem são carregados.
+        response = await self.async_client.get(catalogo)
+        self.assertEqual(response.context['planos'], [])
+        self.assertContains(response, 'Treino A')
+
+    async def test_get_condicional(self):
+        await self.async_client.aforce_login(self.user)
+        for url in (
+            reverse('poderoso_apps:topics'),
+            reverse('poderoso_apps:topic', args=[self.topico.id]),
+            f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={self.plano.id}",
+        ):
+            etag = (await self.async_client.get(url))['ETag']
+            response = await self.async_client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+
+
+class ResumoTreinoDiarioTests(TestCase):
+    """Testes do resumo diário do histórico de treinos e da API que o lê."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60)
+        # 3 x (10 x 3s + 60s) = 270s por exercício.
+        cls.exercicios = [
+            Exercicio.objects.create(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=10, intervalo='60s')
+            for i in range(3)
+        ]
+
+    def finalizar(self, *exercicios):
+        sessao = SessaoTreino.aberta(self.user, self.plano)
+        sessao.definir_estados({e.id: True for e in exercicios})
+        sessao.finalizar()
+
+    def valores(self):
+        return list(ResumoTreinoDiario.objects.order_by('dia').values_list('dia', 'exercicios', 'series', 'volume', 'minutos'))
+
+    def test_finalizar_atualiza_o_resumo_do_dia(self):
+        self.finalizar(*self.exercicios[:2])
+        self.finalizar(self.exercicios[0])
+        hoje = timezone.localdate()
+        self.assertEqual(self.valores(), [(hoje, 3, 9, 90, 13.5)])
+
+    def test_reconstruir_e_idempotente_e_igual_ao_incremental(self):
+        self.finalizar(*self.exercicios)
+        incremental = self.valores()
+        ResumoTreinoDiario.objects.update(series=0)
+        hoje = timezone.localdate()
+        call_command('reconstruir_resumos', stdout=io.StringIO())
+        call_command('reconstruir_resumos', inicio=hoje, fim=hoje, stdout=io.StringIO())
+        self.assertEqual(self.valores(), incremental)
+
+    def test_reconstruir_respeita_o_intervalo(self):
+        self.finalizar(self.exercicios[0])
+        ontem = timezone.localdate() - datetime.timedelta(days=1)
+        RegistroSerie.objects.update(registrada_em=timezone.now() - datetime.timedelta(days=1))
+        ResumoTreinoDiario.reconstruir(ontem, ontem)
+        self.assertEqual([v[0] for v in self.valores()], [ontem, timezone.localdate()])
+
+    def test_api_agrupa_por_periodo(self):
+        self.finalizar(*self.exercicios)
+        hoje = timezone.localdate()
+        # Histórico antigo gravado direto no resumo, como faria o comando de reconstrução.
+        ResumoTreinoDiario.objects.bulk_create([
+            ResumoTreinoDiario(owner=self.user, plano=self.plano, dia=hoje - datetime.timedelta(days=d),
+                               exercicios=1, series=3, volume=30, minutos=4.5)
+            for d in range(1, 60)
+        ])
+        self.client.force_login(self.user)
+        url = reverse('poderoso_apps:historico_treinos')
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'periodo': 'mes', 'inicio': hoje.replace(day=1), 'fim': hoje})
+        dados = response.json()['dados']
+        self.assertEqual(len(dados), 1)
+        self.assertEqual(dados[0]['exercicios'], 3 + hoje.day - 1)
+
+        semanas = self.client.get(url).json()['dados']
+        self.assertEqual(sum(s['series'] for s in semanas), 9 + 3 * 59)
+        self.assertEqual(self.client.get(url, {'periodo': 'ano'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'inicio': 'ontem'}).status_code, 400)
+
+
+class PerfilTests(TestCase):
+    """Testes da página de perfil e do cache das estatísticas de cada usuário."""
+
+    url = reverse('poderoso_apps:perfil')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.outro_user = User.objects.create_user('colega', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Supino', owner=cls.user)
+        Entry.objects.bulk_create([Entry(topic=cls.topico, text=f'Entrada {i}') for i in range(3)])
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.outro_user, tempo_estimado=60, publico=True)
+        cls.exercicios = Exercicio.objects.bulk_create([
+            Exercicio(plano=cls.plano, nome=f'Exercício {i}', series=3, repeticoes=12, intervalo='60s')
+            for i in range(4)
+        ])
+        SessaoTreino.aberta(cls.user, cls.plano).definir_estados({cls.exercicios[0].id: True})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_estatisticas(self):
+        response = self.client.get(self.url)
+        estatisticas = response.context['estatisticas']
+        self.assertEqual(estatisticas['topicos'], 1)
+        self.assertEqual(estatisticas['entradas'], 3)
+        self.assertEqual(estatisticas['planos'], 0)
+        self.assertEqual(estatisticas['progresso'], 25)
+        self.assertEqual(estatisticas['ultima_atividade'], SessaoTreino.objects.get().iniciada_em)
+        self.assertContains(response, '1 de 4')
+        self.assertEqual(self.client.get(self.url).context['estatisticas'], estatisticas)
+
+    def test_uma_consulta_e_depois_nenhuma(self):
+        # Sessão e usuário da autenticação, mais a consulta agregada.
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        # Só a sessão: o usuário e as estatísticas vêm do cache.
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_invalidado_pelas_escritas(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.create(text='Agachamento', owner=self.user)
+        self.assertEqual(self.client.get(self.url).context['estatisticas']['topicos'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Entry.objects.create(topic=self.topico, text='Mais uma')
+        self.assertEqual(self.client.get(self.url).context['estatisticas']['entradas'], 4)
+
+        # Exercício novo num plano de outro dono que o usuário está treinando.
+        with self.captureOnCommitCallbacks(execute=True):
+            Exercicio.objects.create(plano=self.plano, nome='Extra', series=3, repeticoes=10, intervalo='60s')
+        self.assertEqual(self.client.get(self.url).context['estatisticas']['progresso'], 20)
+
+        self.client.post(
+            reverse('poderoso_apps:definir_concluidos'),
+            json.dumps({'plano_id': self.plano.id, 'estados': {self.exercicios[1].id: True}}),
+            content_type='application/json',
+        )
+        self.assertEqual(self.client.get(self.url).context['estatisticas']['progresso'], 40)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topico.delete()
+        estatisticas = self.client.get(self.url).context['estatisticas']
+        self.assertEqual((estatisticas['topicos'], estatisticas['entradas']), (1, 0))
+
+    def test_exige_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+@override_settings(SYNC_JANELA_SEGUNDOS=0)
+class SincronizacaoTests(TestCase):
+    """Testes da API de sincronização incremental do aplicativo."""
+
+    url = reverse('poderoso_apps:sincronizar')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('aluno', password='senha-forte-123')
+        cls.colega = User.objects.create_user('colega', password='senha-forte-123')
+        cls.topico = Topic.objects.create(text='Peito', owner=cls.user)
+        cls.entradas = [Entry.objects.create(topic=cls.topico, text=f'Supino {i}') for i in range(2)]
+        Topic.objects.create(text='Do colega', owner=cls.colega)
+        cls.plano = PlanoTreino.objects.create(nome='Treino A', owner=cls.user, tempo_estimado=60)
+        cls.publico = PlanoTreino.objects.create(nome='Modelo', owner=cls.colega, tempo_estimado=30, publico=True)
+        cls.privado = PlanoTreino.objects.create(nome='Do colega', owner=cls.colega, tempo_estimado=30)
+        cls.exercicios = [
+            Exercicio.objects.create(plano=plano, nome=f'{plano.nome} {i}', series=3, repeticoes=10, intervalo='60s')
+            for plano in (cls.plano, cls.publico, cls.privado) for i in range(2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def sincronizar(self, cursor=None, operacoes=None):
+        if operacoes is None:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+        else:
+            response = self.client.post(
+                self.url, json.dumps({'cursor': cursor, 'operacoes': operacoes}), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    @staticmethod
+    def ids(dados, tipo):
+        return sorted(linha['id'] for linha in dados[tipo])
+
+    def test_primeira_sincronizacao_traz_os_dados_visiveis(self):
+        self.sincronizar()
+        # Sessão (o usuário já está em cache), as fatias de planos, exercícios, tópicos e entradas
+        # e os planos visíveis; a primeira sincronização não lê as exclusões.
+        with self.assertNumQueries(6):
+            dados = self.sincronizar()
+        self.assertTrue(dados['reiniciar'])
+        self.assertFalse(dados['mais'])
+        self.assertEqual(self.ids(dados, 'topicos'), [self.topico.id])
+        self.assertEqual(self.ids(dados, 'entradas'), sorted(e.id for e in self.entradas))
+        self.assertEqual(self.ids(dados, 'planos'), [self.plano.id, self.publico.id])
+        self.assertEqual(dados['planos_visiveis'], [self.plano.id, self.publico.id])
+        self.assertEqual(self.ids(dados, 'exercicios'), sorted(e.id for e in self.exercicios[:4]))
+        self.assertEqual(dados['exercicios'][0]['duracao_estimada'], 270)
+
+    def test_so_as_alteracoes_desde_o_cursor(self):
+        cursor = self.sincronizar()['cursor']
+        dados = self.sincronizar(cursor)
+        self.assertFalse(dados['reiniciar'])
+        self.assertEqual([dados[tipo] for tipo in ('planos', 'exercicios', 'topicos', 'entradas')], [[]] * 4)
+
+        self.entradas[0].text = 'Supino inclinado'
+        self.entradas[0].save()
+        novo = Topic.objects.create(text='Costas', owner=self.user)
+        Topic.objects.create(text='Outro do colega', owner=self.colega)
+        self.exercicios[2].save()
+        dados = self.sincronizar(dados['cursor'])
+        self.assertEqual([e['text'] for e in dados['entradas']], ['Supino inclinado'])
+        self.assertEqual(self.ids(dados, 'topicos'), [novo.id])
+        self.assertEqual(self.ids(dados, 'exercicios'), [self.exercicios[2].id])
+        self.assertEqual(self.sincronizar(dados['cursor'])['entradas'], [])
+
+    def test_exclusoes(self):
+        cursor = self.sincronizar()['cursor']
+        outro = Topic.objects.create(text='Costas', owner=self.user)
+        Entry.objects.create(topic=outro, text='Remada')
+        ids = {'entrada': self.entradas[0].id, 'topico': outro.id, 'exercicio': self.exercicios[2].id, 'plano': self.privado.id}
+        for objeto in (self.entradas[0], outro, self.exercicios[2], self.privado):
+            objeto.delete()
+        dados = self.sincronizar(cursor)
+        # As entradas do tópico apagado somem com ele: só a exclusão do tópico é registrada.
+        self.assertEqual(dados['excluidos'], {
+            'planos': [], 'exercicios': [ids['exercicio']], 'topicos': [ids['topico']], 'entradas': [ids['entrada']],
+        })
+        self.assertEqual(Exclusao.objects.count(), 4)
+
+        # O colega recebe a exclusão do exercício do plano público e a do próprio plano.
+        self.client.force_login(self.colega)
+        excluidos = self.sincronizar(cursor)['excluidos']
+        self.assertEqual((excluidos['exercicios'], excluidos['planos'], excluidos['topicos']),
+                         ([ids['exercicio']], [ids['plano']], []))
+
+    def test_exclusao_do_usuario_nao_registra_tombstones(self):
+        self.colega.delete()
+        self.assertFalse(Exclusao.objects.exists())
+
+    def test_plano_que_vira_publico_reenvia_os_exercicios(self):
+        cursor = self.sincronizar()['cursor']
+        self.privado.publico = True
+        self.privado.save()
+        dados = self.sincronizar(cursor)
+        self.assertEqual(self.ids(dados, 'planos'), [self.privado.id])
+        self.assertEqual(self.ids(dados, 'exercicios'), sorted(e.id for e in self.exercicios[4:]))
+
+        # Ao deixar de ser público, o plano sai de 'planos_visiveis'.
+        self.publico.publico = False
+        self.publico.save()
+        self.assertNotIn(self.publico.id, self.sincronizar(dados['cursor'])['planos_visiveis'])
+
+    @override_settings(SYNC_LIMITE=2)
+    def test_paginacao(self):
+        Topic.objects.bulk_create([Topic(text=f'Tópico {i}', owner=self.user) for i in range(4)])
+        dados = self.sincronizar()
+        self.assertTrue(dados['mais'])
+        topicos = self.ids(dados, 'topicos')
+        while dados['mais']:
+            dados = self.sincronizar(dados['cursor'])
+            topicos += self.ids(dados, 'topicos')
+        self.assertEqual(topicos, sorted(Topic.objects.filter(owner=self.user).values_list('id', flat=True)))
+
+    def test_janela_de_confirmacao(self):
+        with self.settings(SYNC_JANELA_SEGUNDOS=60):
+            dados = self.sincronizar()
+        # Linhas alteradas há menos de um minuto ficam para a próxima sincronização.
+        self.assertEqual(dados['topicos'], [])
+        self.assertEqual(self.ids(self.sincronizar(dados['cursor']), 'topicos'), [self.topico.id])
+
+    def test_cursor_antigo_reinicia(self):
+        antigo = timezone.now() - datetime.timedelta(days=365)
+        dados = self.sincronizar(sincronizacao.codificar_cursor({'topicos': (antigo, 0)}))
+        self.assertTrue(dados['reiniciar'])
+        self.assertEqual(self.ids(dados, 'topicos'), [self.topico.id])
+
+    def test_gravacoes_em_lote(self):
+        cursor = self.sincronizar()['cursor']
+        a, b = self.exercicios[2:4]
+        dados = self.sincronizar(cursor, [
+            {'op': 'criar_topico', 'ref': 't1', 'text': 'Pernas'},
+            {'op': 'criar_entrada', 'ref': 'e1', 'topic': 't1', 'text': 'Agachamento 4x10'},
+            {'op': 'editar_entrada', 'id': 'e1', 'text': 'Agachamento 5x5'},
+            {'op': 'excluir_entrada', 'id': self.entradas[1].id},
+            {'op': 'criar_entrada', 'topic': self.colega.topic_set.get().id, 'text': 'Invasão'},
+            {'op': 'concluidos', 'plano': self.publico.id, 'estados': {a.id: True, b.id: True}},
+            {'op': 'finalizar', 'plano': self.publico.id},
+            {'op': 'voar'},
+        ])
+        resultados = dados['resultados']
+        self.assertEqual([r['ok'] for r in resultados], [True] * 4 + [False, True, True, False])
+        self.assertEqual(resultados[4]['erro'], 'Tópico não encontrado.')
+        self.assertEqual(resultados[5]['alterados'], 2)
+        self.assertEqual(resultados[6]['series'], 6)
+        entrada = Entry.objects.get(id=resultados[1]['id'])
+        self.assertEqual((entrada.topic_id, entrada.text), (resultados[0]['id'], 'Agachamento 5x5'))
+        self.assertFalse(Entry.objects.filter(id=self.entradas[1].id).exists())
+        self.assertEqual(RegistroSerie.objects.filter(owner=self.user).count(), 6)
+
+        # A resposta já traz as alterações do lote (sem a janela de confirmação, nos testes).
+        self.assertEqual(self.ids(dados, 'topicos'), [resultados[0]['id']])
+        self.assertEqual(self.ids(dados, 'entradas'), [resultados[1]['id']])
+        self.assertEqual(dados['excluidos']['entradas'], [self.entradas[1].id])
+
+    def test_treino_em_plano_privado_de_outro_usuario(self):
+        resultado = self.sincronizar(operacoes=[
+            {'op': 'concluidos', 'plano': self.privado.id, 'estados': {self.exercicios[4].id: True}},
+        ])['resultados'][0]
+        self.assertEqual(resultado, {'ok': False, 'erro': 'Plano não encontrado.'})
+
+    def versao(self, entrada):
+        return next(e['date_updated'] for e in self.sincronizar()['entradas'] if e['id'] == entrada.id)
+
+    def test_conflito_de_edicao(self):
+        versao = self.versao(self.entradas[0])
+        self.entradas[0].text = 'Editado no site'
+        self.entradas[0].save()
+        resultado = self.sincronizar(operacoes=[
+            {'op': 'editar_entrada', 'id': self.entradas[0].id, 'text': 'Editado offline', 'versao': versao},
+        ])['resultados'][0]
+        self.assertEqual(resultado['erro'], 'conflito')
+        self.assertEqual(resultado['atual']['text'], 'Editado no site')
+
+        versao = self.versao(self.entradas[0])
+        resultado = self.sincronizar(operacoes=[
+            {'op': 'editar_entrada', 'id': self.entradas[0].id, 'text': 'Editado offline', 'versao': versao},
+        ])['resultados'][0]
+        self.assertTrue(resultado['ok'], resultado)
+
+    def test_erros(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'x'}).status_code, 400)
+        # Cursor adulterado com uma data sem fuso (codificar_cursor só gera datas com fuso).
+        sem_fuso = sincronizacao.codificar_cursor({'topicos': (datetime.datetime(2024, 1, 1), 1)})
+        self.assertEqual(self.client.get(self.url, {'cursor': sem_fuso}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, 'x', content_type='application/json').status_code, 400)
+        response = self.client.post(
+            self.url, json.dumps({'cursor': 'x', 'operacoes': [{'op': 'criar_topico', 'text': 'A'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Topic.objects.filter(text='A').exists())
+        # Um 'ref' que não é texto falha só na sua operação.
+        resultados = self.sincronizar(operacoes=[
+            {'op': 'criar_topico', 'ref': ['t1'], 'text': 'B'}, {'op': 'criar_topico', 'ref': 't2', 'text': 'C'},
+        ])['resultados']
+        self.assertEqual(resultados[0], {'ok': False, 'erro': 'ref deve ser um texto.'})
+        self.assertTrue(resultados[1]['ok'])
+        self.assertEqual(list(Topic.objects.filter(text__in=['B', 'C']).values_list('text', flat=True)), ['C'])
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_limpar_exclusoes(self):
+        antiga, recente = self.entradas
+        antiga.delete()
+        Exclusao.objects.update(excluido_em=timezone.now() - datetime.timedelta(days=100))
+        recente_id = recente.id
+        recente.delete()
+        call_command('limpar_exclusoes', stdout=io.StringIO())
+        self.assertEqual(list(Exclusao.objects.values_list('objeto_id', flat=True)), [recente_id])
+
+
+class ClonagemPlanosTests(TestCase):
+    """Testes da clonagem de um plano modelo para muitos usuários."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.treinador = User.objects.create_superuser('treinador', password='senha-forte-123')
+        cls.modelo = PlanoTreino.objects.create(
+            nome='Hipertrofia', descricao='Modelo da academia', owner=cls.treinador, tempo_estimado=50, publico=True,
+        )
+        cls.exercicios = [
+            Exercicio.objects.create(plano=cls.modelo, nome='Supino', series=3, repeticoes=10, intervalo='60s',
+                                     imagens='media/supino.png'),
+            Exercicio.objects.create(plano=cls.modelo, nome='Remada', series=4, repeticoes=8, intervalo='90s'),
+        ]
+        cls.alunos = User.objects.bulk_create([User(username=f'aluno{i}') for i in range(5)])
+
+    def copias(self):
+        return PlanoTreino.objects.filter(nome='Hipertrofia').exclude(pk=self.modelo.pk)
+
+    def conferir_copias(self, quantidade):
+        copias = self.copias()
+        self.assertEqual(copias.count(), quantidade)
+        self.assertFalse(copias.filter(publico=True).exists())
+        esperado = [
+            (e.nome, e.series, e.repeticoes, e.intervalo, e.intervalo_segundos, e.duracao_estimada, e.imagens.name or None)
+            for e in self.exercicios
+        ]
+        for copia in copias.prefetch_related('exercicios'):
+            self.assertEqual((copia.descricao, copia.tempo_estimado), ('Modelo da academia', 50))
+            self.assertEqual([
+                (e.nome, e.series, e.repeticoes, e.intervalo, e.intervalo_segundos, e.duracao_estimada, e.imagens.name or None)
+                for e in copia.exercicios.order_by('id')
+            ], esperado)
+
+    def test_clona_com_os_exercicios_e_as_mesmas_imagens(self):
+        planos, exercicios = clonagem.clonar_plano(self.modelo, [a.id for a in self.alunos])
+        self.assertEqual((len(planos), exercicios), (5, 10))
+        self.conferir_copias(5)
+
+    def test_sem_insert_select(self):
+        with mock.patch.object(clonagem, 'INSERT_SELECT', ()):
+            planos, exercicios = clonagem.clonar_plano(self.modelo, [a.id for a in self.alunos])
+        self.assertEqual((len(planos), exercicios), (5, 10))
+        self.conferir_copias(5)
+
+    def test_repetir_nao_duplica(self):
+        clonagem.clonar_plano(self.modelo, [self.alunos[0].id])
+        planos, _ = clonagem.clonar_plano(self.modelo, [self.treinador.id, *(a.id for a in self.alunos)])
+        self.assertEqual(len(planos), 4)
+        self.conferir_copias(5)
+
+    def test_consultas_nao_dependem_da_quantidade_de_usuarios(self):
+        alunos = User.objects.bulk_create([User(username=f'membro{i}') for i in range(1000)])
+        # Planos já existentes, o INSERT dos planos (em lotes do bulk_create) e um INSERT ... SELECT
+        # a cada PLANOS_POR_INSERT planos, mais o savepoint.
+        with CaptureQueriesContext(connection) as consultas:
+            planos, exercicios = clonagem.clonar_plano(self.modelo, [a.id for a in alunos])
+        self.assertEqual((len(planos), exercicios), (1000, 2000))
+        insercoes = [c['sql'] for c in consultas if c['sql'].startswith('INSERT INTO "poderoso_apps_exercicio"')]
+        self.assertEqual(len(insercoes), 2)
+        self.assertLess(len(consultas), 20)
+
+    def test_invalida_catalogo_e_perfis(self):
+        versao = cache_planos.versao_catalogo()
+        estatisticas = cache_planos.versao(f'estatisticas:{self.alunos[0].id}')
+        with self.captureOnCommitCallbacks(execute=True):
+            clonagem.clonar_plano(self.modelo, [self.alunos[0].id])
+        self.assertNotEqual(cache_planos.versao_catalogo(), versao)
+        self.assertNotEqual(cache_planos.versao(f'estatisticas:{self.alunos[0].id}'), estatisticas)
+
+    def test_ids_dos_usuarios(self):
+        grupo = Group.objects.create(name='Turma da manhã')
+        grupo.user_set.add(self.alunos[3], self.alunos[4])
+        ids, desconhecidos = clonagem.ids_dos_usuarios(['aluno1', 'fantasma', 'aluno3'], 'Turma da manhã')
+        self.assertEqual(ids, [self.alunos[1].id, self.alunos[3].id, self.alunos[4].id])
+        self.assertEqual(desconhecidos, ['fantasma'])
+
+    def test_comando(self):
+        saida = io.StringIO()
+        call_command('clonar_plano', self.modelo.id, 'aluno0', 'aluno1', stdout=saida)
+        self.assertIn('2 planos e 4 exercícios criados', saida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('clonar_plano', self.modelo.id, 'fantasma', stdout=io.StringIO())
+
+    def test_acao_do_admin(self):
+        self.client.force_login(self.treinador)
+        url = reverse('admin:poderoso_apps_planotreino_changelist')
+        dados = {'action': 'clonar_para_usuarios', '_selected_action': [self.modelo.id]}
+        response = self.client.post(url, dados)
+        self.assertTemplateUsed(response, 'admin/poderoso_apps/planotreino/clonar.html')
+        response = self.client.post(url, {**dados, 'aplicar': '1', 'usuarios': 'aluno0, aluno1\naluno2'})
+        self.assertRedirects(response, url)
+        self.conferir_copias(3)
+        response = self.client.post(url, {**dados, 'aplicar': '1', 'usuarios': 'fantasma'})
+        self.assertContains(response, 'Usuários inexistentes: fantasma')
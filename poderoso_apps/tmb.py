@@ -0,0 +1,311 @@
+"""
+Taxa metabólica basal (TMB) pela equação de Harris-Benedict revisada.
+
+calcular() atende o formulário de uma pessoa; calcular_lote() atende listas inteiras de alunos,
+validando e calculando coluna a coluna com NumPy (ou em Python puro, se o NumPy não estiver
+instalado). ler_csv()/ler_json() leem a entrada aos poucos e entregam as linhas em blocos, e
+escrever_csv()/escrever_json() geram a saída aos poucos, para que a memória usada não cresça com
+o tamanho da lista.
+"""
+import csv
+import io
+import json
+import math
+import re
+from itertools import chain, islice
+
+from .forms import CalculoBasal
+
+try:
+    import numpy as np
+except ImportError:  # O cálculo em lote funciona sem NumPy, só que mais devagar.
+    np = None
+
+# Coeficientes por sexo: constante + peso (kg) + altura (cm) - idade (anos).
+COEFICIENTES = {
+    'H': (88.36, 13.4, 4.8, 5.7),
+    'M': (447.6, 9.2, 3.1, 4.3),
+}
+COLUNAS = ('peso', 'idade', 'altura', 'sexo')
+# Linhas processadas por vez: limita a memória e ainda aproveita a vetorização.
+TAMANHO_BLOCO = 10000
+# Leitura da entrada JSON: caracteres lidos por vez e tamanho máximo de uma linha da lista.
+TAMANHO_LEITURA = 64 * 1024
+TAMANHO_MAXIMO_VALOR = 64 * 1024
+_ESPACOS = re.compile(r'\s*')
+
+
+def calcular(peso, altura, idade, sexo):
+    """TMB de uma pessoa, em kcal/dia."""
+    constante, k_peso, k_altura, k_idade = COEFICIENTES[sexo]
+    return constante + k_peso * peso + k_altura * altura - k_idade * idade
+
+
+def _limites(campo):
+    """(mínimo, máximo) do campo de CalculoBasal; None quando o formulário não limita."""
+    campo = CalculoBasal.base_fields[campo]
+    return campo.min_value, campo.max_value
+
+
+def _numero(valor):
+    """Converte o texto em float, ou NaN quando não é um número."""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _sexo(valor):
+    """Sexo sem espaços em volta; None para o que não é texto (listas e objetos vindos do JSON)."""
+    return valor.strip() if isinstance(valor, str) else None
+
+
+def _coluna(valores):
+    """Converte uma coluna inteira de uma vez; só cai para a conversão item a item se houver lixo."""
+    try:
+        coluna = np.array(valores, dtype=np.float64)
+    except (TypeError, ValueError):
+        coluna = None
+    # Células com listas (ex.: "peso": [70]) dariam uma matriz em vez de uma coluna.
+    if coluna is None or coluna.shape != (len(valores),):
+        coluna = np.fromiter((_numero(v) for v in valores), np.float64, len(valores))
+    return coluna
+
+
+def _erro(campo, valor, minimo, maximo, inteiro=False):
+    """Mensagem de validação de um valor, com as mesmas regras de CalculoBasal, ou None."""
+    if not math.isfinite(valor):
+        return f'{campo}: informe um número válido'
+    if inteiro and valor != int(valor):
+        return f'{campo}: informe um número inteiro'
+    if minimo is not None and valor < minimo:
+        return f'{campo}: deve ser maior ou igual a {minimo}'
+    if maximo is not None and valor > maximo:
+        return f'{campo}: deve ser menor ou igual a {maximo}'
+    return None
+
+
+def _lote_numpy(linhas):
+    # float() e o NumPy já ignoram espaços em volta dos números; só o sexo precisa de strip (_sexo).
+    peso = _coluna([linha.get('peso') for linha in linhas])
+    idade = _coluna([linha.get('idade') for linha in linhas])
+    altura = _coluna([linha.get('altura') for linha in linhas])
+    sexo = np.array([_sexo(linha.get('sexo')) for linha in linhas], dtype=object)
+
+    validos = np.ones(len(linhas), dtype=bool)
+    for valores, campo, inteiro in ((peso, 'peso', False), (idade, 'idade', True), (altura, 'altura', False)):
+        minimo, maximo = _limites(campo)
+        ok = np.isfinite(valores)
+        if inteiro:
+            ok &= np.floor(valores) == valores
+        if minimo is not None:
+            ok &= valores >= minimo
+        if maximo is not None:
+            ok &= valores <= maximo
+        validos &= ok
+    homem = sexo == 'H'
+    validos &= homem | (sexo == 'M')
+
+    # Os coeficientes são escolhidos por linha e a equação roda sobre as colunas inteiras.
+    h, m = COEFICIENTES['H'], COEFICIENTES['M']
+    coeficientes = [np.where(homem, kh, km) for kh, km in zip(h, m)]
+    tmb = coeficientes[0] + coeficientes[1] * peso + coeficientes[2] * altura - coeficientes[3] * idade
+
+    resultado = tmb.tolist()
+    erros = [None] * len(linhas)
+    # Só as linhas inválidas (normalmente poucas) passam pela validação item a item, para a mensagem.
+    for i in np.flatnonzero(~validos).tolist():
+        resultado[i] = None
+        erros[i] = _validar_linha(peso[i], idade[i], altura[i], sexo[i])
+    return resultado, erros
+
+
+def _validar_linha(peso, idade, altura, sexo):
+    for campo, valor, inteiro in (('peso', peso, False), ('idade', idade, True), ('altura', altura, False)):
+        erro = _erro(campo, valor, *_limites(campo), inteiro=inteiro)
+        if erro:
+            return erro
+    if not isinstance(sexo, str) or sexo not in COEFICIENTES:
+        return 'sexo: use H ou M'
+    return None
+
+
+def _lote_python(linhas):
+    resultado, erros = [], []
+    for linha in linhas:
+        peso, idade, altura = (_numero(linha.get(campo)) for campo in ('peso', 'idade', 'altura'))
+        sexo = _sexo(linha.get('sexo'))
+        erro = _validar_linha(peso, idade, altura, sexo)
+        resultado.append(None if erro else calcular(peso, altura, idade, sexo))
+        erros.append(erro)
+    return resultado, erros
+
+
+def calcular_lote(linhas):
+    """
+    Calcula a TMB de uma lista de linhas {'peso', 'idade', 'altura', 'sexo'} (textos ou números).
+
+    Retorna (tmbs, erros): listas do mesmo tamanho de 'linhas'; em cada posição, ou a TMB
+    ou a mensagem de validação.
+    """
+    if not linhas:
+        return [], []
+    return _lote_numpy(linhas) if np is not None else _lote_python(linhas)
+
+
+def _blocos(linhas, tamanho):
+    linhas = iter(linhas)
+    while bloco := list(islice(linhas, tamanho)):
+        yield bloco
+
+
+def ler_csv(arquivo, tamanho=TAMANHO_BLOCO):
+    """
+    Lê um CSV com cabeçalho (peso, idade, altura, sexo) de um arquivo de texto, em blocos de linhas.
+
+    O cabeçalho é conferido na hora (ValueError); as linhas só são lidas quando os blocos são consumidos.
+    """
+    leitor = csv.DictReader(arquivo)
+    faltando = set(COLUNAS) - set(leitor.fieldnames or ())
+    if faltando:
+        raise ValueError(f'Colunas ausentes no CSV: {", ".join(sorted(faltando))}')
+    return _blocos(leitor, tamanho)
+
+
+class _LeitorJson:
+    """
+    Lê um documento JSON de um arquivo de texto aos poucos, um valor por vez.
+
+    Cada valor (uma linha da lista) é decodificado com JSONDecoder.raw_decode sobre um buffer que
+    guarda só o trecho ainda não lido; um valor maior que TAMANHO_MAXIMO_VALOR é recusado.
+    """
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.buffer = ''
+        self.posicao = 0
+        self.fim = False
+        self.decodificador = json.JSONDecoder()
+
+    def _ler(self):
+        """Acrescenta mais um pedaço do arquivo ao buffer; False no fim do arquivo."""
+        if self.fim:
+            return False
+        if len(self.buffer) - self.posicao > TAMANHO_MAXIMO_VALOR:
+            raise ValueError(f'JSON inválido (ou uma linha com mais de {TAMANHO_MAXIMO_VALOR // 1024} KiB).')
+        pedaco = self.arquivo.read(TAMANHO_LEITURA)
+        if not pedaco:
+            self.fim = True
+            return False
+        self.buffer = self.buffer[self.posicao:] + pedaco
+        self.posicao = 0
+        return True
+
+    def proximo(self):
+        """Próximo caractere fora de espaços, sem consumi-lo ('' no fim do arquivo)."""
+        while True:
+            self.posicao = _ESPACOS.match(self.buffer, self.posicao).end()
+            if self.posicao < len(self.buffer):
+                return self.buffer[self.posicao]
+            if not self._ler():
+                return ''
+
+    def consumir(self, caractere, mensagem='JSON inválido.'):
+        if self.proximo() != caractere:
+            raise ValueError(mensagem)
+        self.posicao += 1
+
+    def valor(self):
+        self.proximo()
+        while True:
+            try:
+                valor, fim = self.decodificador.raw_decode(self.buffer, self.posicao)
+            except json.JSONDecodeError:
+                # Valor incompleto: lê mais um pedaço e tenta de novo.
+                if not self._ler():
+                    raise ValueError('JSON inválido.')
+                continue
+            # Um número no fim do buffer pode continuar no próximo pedaço.
+            if fim == len(self.buffer) and self._ler():
+                continue
+            self.posicao = fim
+            return valor
+
+
+def _linhas_json(leitor):
+    mensagem = 'Envie uma lista de objetos com peso, idade, altura e sexo.'
+    if leitor.proximo() == '{':
+        # {"linhas": [...]}: as outras chaves são ignoradas.
+        leitor.consumir('{')
+        while leitor.proximo() != '}':
+            chave = leitor.valor()
+            leitor.consumir(':')
+            if chave == 'linhas':
+                break
+            leitor.valor()
+            if leitor.proximo() == ',':
+                leitor.consumir(',')
+        else:
+            raise ValueError(mensagem)
+    leitor.consumir('[', mensagem)
+    if leitor.proximo() == ']':
+        return
+    while True:
+        linha = leitor.valor()
+        if not isinstance(linha, dict):
+            raise ValueError(mensagem)
+        yield linha
+        if leitor.proximo() == ']':
+            return
+        leitor.consumir(',')
+
+
+def ler_json(arquivo, tamanho=TAMANHO_BLOCO):
+    """
+    Lê uma lista de objetos ou {'linhas': [...]} de um arquivo de texto e entrega as linhas em blocos.
+
+    O JSON é decodificado aos poucos, sem carregar o documento inteiro. O primeiro bloco é lido na hora,
+    então erros no início (ValueError) aparecem antes da resposta; um erro mais adiante interrompe a
+    saída, que fica com um JSON incompleto.
+    """
+    blocos = _blocos(_linhas_json(_LeitorJson(arquivo)), tamanho)
+    primeiro = next(blocos, None)
+    return chain([primeiro], blocos) if primeiro is not None else iter(())
+
+
+def resultados(blocos):
+    """Para cada linha de entrada, gera (linha, tmb, erro), processando um bloco por vez."""
+    for bloco in blocos:
+        tmbs, erros = calcular_lote(bloco)
+        yield from zip(bloco, tmbs, erros)
+
+
+def escrever_csv(resultados):
+    """Gera o CSV de saída em pedaços de texto (um por bloco de linhas)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS + ('tmb', 'erro'))
+    for i, (linha, tmb, erro) in enumerate(resultados, 1):
+        escritor.writerow([linha.get(campo, '') for campo in COLUNAS] + [
+            '' if tmb is None else f'{tmb:.2f}', erro or '',
+        ])
+        if i % TAMANHO_BLOCO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def escrever_json(resultados):
+    """Gera uma lista JSON de saída em pedaços de texto, sem montá-la inteira na memória."""
+    partes = ['[']
+    for i, (linha, tmb, erro) in enumerate(resultados):
+        item = {campo: linha.get(campo) for campo in COLUNAS}
+        item['tmb'] = None if tmb is None else round(tmb, 2)
+        item['erro'] = erro
+        partes.append((',' if i else '') + json.dumps(item, ensure_ascii=False))
+        if len(partes) >= TAMANHO_BLOCO:
+            yield ''.join(partes)
+            partes = []
+    partes.append(']')
+    yield ''.join(partes)
@@ -2,9 +2,12 @@
 from django.urls import path  
 # Importa as views que contêm a lógica de cada página.
 from . import views  
-from django.conf.urls.static import static
+from . import views_async
 from django.conf import settings
 
+# Com VIEWS_ASYNC (ligado pelo asgi.py) as páginas de leitura mais acessadas usam as versões async.
+leitura = views_async if settings.VIEWS_ASYNC else views
+
 # Define o namespace da aplicação para que as URLs possam ser referenciadas de maneira única.
 app_name = 'poderoso_apps'  
 
@@ -14,10 +17,13 @@ urlpatterns = [
     path('', views.index, name='index'),  # Quando o usuário acessa a raiz do site, chama a função index na views.
 
     # Página com Tópicos
-    path('topics/', views.topics, name='topics'),  # Quando o usuário acessa /topics/, chama a função topics.
+    path('topics/', leitura.topics, name='topics'),  # Quando o usuário acessa /topics/, chama a função topics.
 
     # Página com Tópico detalhado
-    path('topics/<int:topic_id>/', views.topic, name='topic'),  # Captura um ID de tópico e chama a função topic com esse ID.
+    path('topics/<int:topic_id>/', leitura.topic, name='topic'),  # Captura um ID de tópico e chama a função topic com esse ID.
+
+    # Busca textual nos tópicos e entradas do usuário
+    path('busca/', views.buscar, name='buscar'),
 
     # Criação de novo tópico
     path('new_topic/', views.new_topic, name='new_topic'),  # Acessa /new_topic/ para criar um novo tópico, chamando new_topic.
@@ -29,13 +35,29 @@ urlpatterns = [
     path('edit_entry/<int:entry_id>/', views.edit_entry, name='edit_entry'),  # Permite editar uma entrada existente, capturando seu ID.
 
     # Exibição da lista de planos de treino
-    path('planos_treinos/', views.planos_treinos, name='planos_treinos'),  # Acessa /planos_treino/ para exibir todos os planos de treino.
+    path('planos_treinos/', leitura.planos_treinos, name='planos_treinos'),  # Acessa /planos_treino/ para exibir todos os planos de treino.
 
     # Exibição dos detalhes de um plano de treino
-    path('detalhes_plano/', views.detalhes_planos, name='detalhes_plano'),  # Acessa /detalhes_plano/ para mostrar os detalhes de um plano específico.
+    path('detalhes_plano/', leitura.detalhes_planos, name='detalhes_plano'),  # Acessa /detalhes_plano/ para mostrar os detalhes de um plano específico.
+
+    # API JSON para marcar vários exercícios como concluídos em uma única requisição
+    path('api/exercicios/concluidos/', views.definir_concluidos, name='definir_concluidos'),
+
+    # Sincronização incremental do aplicativo: alterações desde um cursor e gravações feitas sem conexão
+    path('api/sync/', views.sincronizar, name='sincronizar'),
 
     path('calculotmb/', views.calculotmb, name='calculotmb'),
+    # Cálculo da TMB de uma lista de alunos (CSV ou JSON), com resposta em streaming.
+    path('api/tmb/lote/', views.calcular_tmb_lote, name='calcular_tmb_lote'),
 
     path('perfil/', views.perfil, name='perfil'),
+    # Totais de treino por dia, semana ou mês, lidos dos resumos diários
+    path('api/historico/', views.historico_treinos, name='historico_treinos'),
+
+    # Métricas das requisições no formato do Prometheus (apenas staff)
+    path('metricas/', views.ver_metricas, name='metricas'),
+
+    # Arquivos enviados (imagens dos exercícios), com cache HTTP e suporte a Range
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:caminho>", views.servir_media, name='media'),
 
-]   + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
@@ -1,11 +1,60 @@
+import codecs
+import datetime
+import json
+import re
+
 # Importa funções e classes necessárias do Django
 from django.shortcuts import get_object_or_404, render, redirect  # Funções para renderizar páginas e redirecionar
-from .models import Topic, Entry, PlanoTreino, Exercicio  # Importa os modelos que representam os dados no banco de dados
+from .models import Topic, Entry, PlanoTreino, Exercicio, SessaoTreino, ResumoTreinoDiario  # Importa os modelos que representam os dados no banco de dados
 from .forms import TopicForm, EntryForm, CalculoBasal  # Importa os formulários que lidam com os dados de entrada
 from django.contrib.auth.decorators import login_required  # Importa o decorador que restringe acesso a usuários logados
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import Http404  # Importa a classe para gerar erros 404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from django.conf import settings
+from django.db.models import Count, Max
+from .arquivos import servir_arquivo
+from .paginacao import pagina_keyset
+from . import busca
+from . import cache as cache_planos
+from . import condicional
+from . import metricas
+from . import sincronizacao
+from . import tmb as calculo_tmb
+from .tmb import calcular as calcular_tmb
+
+# Quantidade de itens por página nas listas paginadas por cursor.
+TOPICOS_POR_PAGINA = 50
+ENTRADAS_POR_PAGINA = 20
+# Intervalo padrão do histórico de treinos para cada agrupamento, em dias.
+HISTORICO_DIAS = {'dia': 31, 'semana': 7 * 12, 'mes': 365}
+# Agregados do validador da lista de tópicos, lidos só do índice (owner, date_updated).
+RESUMO_TOPICOS = {'total': Count('id'), 'atualizado_em': Max('date_updated')}
+# Ids aceitos nos parâmetros da URL: só algarismos ASCII (str.isdigit() aceita '²', que int() recusa)
+# e no máximo 18, dentro do inteiro de 64 bits do banco.
+ID_VALIDO = re.compile(r'[0-9]{1,18}')
+
+
+def id_da_url(valor):
+    """O id de um parâmetro da URL como int, ou None se não for um id válido."""
+    return int(valor) if valor and ID_VALIDO.fullmatch(valor) else None
+
+
+def topicos_com_entradas():
+    """Tópicos anotados com o total de entradas e a última alteração delas, para o validador da página."""
+    return Topic.objects.annotate(total_entradas=Count('entry'), entradas_atualizadas_em=Max('entry__date_updated'))
+
+
+def validador_topico(request, topic):
+    """Retorna (etag, atualizado_em) da página do tópico."""
+    atualizado_em = max(topic.date_updated, topic.entradas_atualizadas_em or topic.date_updated)
+    return condicional.validador(request, topic.id, topic.total_entradas, atualizado_em), atualizado_em
 
 
 def index(request):
@@ -18,34 +67,62 @@ def index(request):
 @login_required  # Garante que apenas usuários logados possam acessar esta função
 def topics(request):
     """Exibe a lista de tópicos do usuário logado."""
-    # 'Topic.objects.filter()' recupera todos os tópicos do banco de dados que pertencem ao usuário logado.
-    topics = Topic.objects.filter(owner=request.user).order_by('date_added')  # Ordena os tópicos pela data de adição.
+    # Validador barato (quantos tópicos e a última alteração): se o navegador já tem esta versão,
+    # responde 304 sem paginar nem renderizar.
+    resumo = Topic.objects.filter(owner=request.user).aggregate(**RESUMO_TOPICOS)
+    etag = condicional.validador(request, resumo['total'], resumo['atualizado_em'])
+    if resposta := condicional.nao_modificado(request, etag, resumo['atualizado_em']):
+        return resposta
+
+    # 'Topic.objects.filter()' recupera os tópicos do banco de dados que pertencem ao usuário logado.
+    # A lista é paginada por cursor, ordenada pela data de adição: cada página custa o mesmo em qualquer profundidade.
+    topics, proximo_cursor = pagina_keyset(
+        Topic.objects.filter(owner=request.user), request.GET.get('cursor'), TOPICOS_POR_PAGINA
+    )
     
     # 'context' é um dicionário que contém os dados que serão passados para o template.
-    context = {'topics': topics}  # Aqui, associamos a lista de tópicos à chave 'topics'.
+    context = {'topics': topics, 'proximo_cursor': proximo_cursor}  # Associa a página de tópicos à chave 'topics'.
     
     # 'render()' retorna uma resposta ao navegador, renderizando o template 'poderoso_apps/topics.html' com o contexto fornecido.
-    return render(request, 'poderoso_apps/topics.html', context)
+    return condicional.aplicar(render(request, 'poderoso_apps/topics.html', context), etag, resumo['atualizado_em'])
 
 
 @login_required  # Protege a função para garantir que o usuário esteja logado
 def topic(request, topic_id):
     """Exibe os detalhes de um tópico específico pelo seu ID."""
     # 'get_object_or_404()' tenta obter o tópico correspondente ao ID. Se não encontrar, retorna um erro 404.
-    topic = get_object_or_404(Topic, id=topic_id)
+    # A mesma consulta traz a contagem e a última alteração das entradas, usadas no validador.
+    topic = get_object_or_404(topicos_com_entradas(), id=topic_id)
     
     # Aqui, verificamos se o tópico pertence ao usuário que está logado. Se não pertencer, levantamos um erro 404.
-    if topic.owner != request.user:
+    # Compara os ids para não precisar buscar o usuário dono no banco.
+    if topic.owner_id != request.user.id:
         raise Http404  # Lança um erro 404 para indicar que o recurso não foi encontrado.
+
+    # Nada mudou desde a última visita: 304 antes de buscar as entradas.
+    etag, atualizado_em = validador_topico(request, topic)
+    if resposta := condicional.nao_modificado(request, etag, atualizado_em):
+        return resposta
     
-    # Obtém todas as entradas associadas a este tópico, ordenando-as da mais recente para a mais antiga.
-    entries = topic.entry_set.order_by('-date_added')
+    # Obtém uma página das entradas deste tópico, da mais recente para a mais antiga.
+    entries, proximo_cursor = pagina_keyset(
+        topic.entry_set.all(), request.GET.get('cursor'), ENTRADAS_POR_PAGINA, descendente=True
+    )
     
     # Cria um dicionário de contexto com o tópico e suas entradas, que será utilizado pelo template.
-    context = {'topic': topic, 'entries': entries}  
+    context = {'topic': topic, 'entries': entries, 'proximo_cursor': proximo_cursor}  
     
     # Renderiza a página do tópico, retornando o template 'poderoso_apps/topic.html' com o contexto.
-    return render(request, 'poderoso_apps/topic.html', context)
+    return condicional.aplicar(render(request, 'poderoso_apps/topic.html', context), etag, atualizado_em)
+
+
+@login_required  # Garante que apenas usuários logados possam acessar esta função
+def buscar(request):
+    """Busca um texto nos tópicos e entradas do usuário logado, com os resultados mais relevantes primeiro."""
+    q = request.GET.get('q', '').strip()
+    # A busca é sempre restrita aos dados do próprio usuário.
+    resultados = busca.buscar(request.user, q) if q else []
+    return render(request, 'poderoso_apps/busca.html', {'q': q, 'resultados': resultados})
 
 
 @login_required  # Garante que o usuário esteja logado para acessar essa função
@@ -136,91 +213,271 @@ def edit_entry(request, entry_id):
 
 
 def planos_treinos(request):
-    """Exibe a lista de planos de treino disponíveis."""
-    # Obtém todos os planos de treino do banco de dados.
-    planos = PlanoTreino.objects.all()  
-    plano_id = request.GET.get('plano_id')
+    """Exibe o catálogo de planos do usuário: os dele e os públicos (só os públicos para visitantes)."""
+    # Planos com total de exercícios, duração e exercícios pré-carregados: duas consultas para o catálogo
+    # inteiro. A consulta é preguiçosa: só roda quando o fragmento do catálogo não está em cache
+    # (ver planos_treinos.html), cuja chave inclui o usuário.
+    planos = PlanoTreino.objects.catalogo(request.user)
+    # O plano selecionado entra na chave do fragmento em cache: só um plano que o usuário vê é aceito,
+    # para que valores arbitrários na URL não criem uma entrada nova no cache a cada requisição.
+    plano_id = id_da_url(request.GET.get('plano_id'))
+    if plano_id is not None and not PlanoTreino.objects.visiveis(request.user).filter(id=plano_id).exists():
+        plano_id = None
     # Renderiza a lista de planos, enviando os dados para o template.
-    return render(request, 'poderoso_apps/planos_treinos.html', {'planos': planos, 'plano_id': plano_id})  
+    return render(request, 'poderoso_apps/planos_treinos.html', {
+        'planos': planos, 'plano_id': plano_id, 'versao_catalogo': cache_planos.versao_catalogo(),
+    })
 
 
 def detalhes_planos(request):
     """Exibe detalhes de um plano de treino específico e permite marcar exercícios como concluídos."""
     plano_id = request.GET.get('plano_id')
-    
-    if plano_id:
-        plano = get_object_or_404(PlanoTreino, id=plano_id)
-        exercicios = plano.exercicios.all()
-    else:
-        plano = None
-        exercicios = None
 
-    planos = PlanoTreino.objects.all()
-    
-    if exercicios:
-        total_exercicios = exercicios.count()
-        exercicios_concluidos = exercicios.filter(concluido=True).count()
-        progresso = (exercicios_concluidos / total_exercicios) * 100 if total_exercicios > 0 else 0
-        tempo_total_estimado = plano.tempo_estimado
-        tempo_por_exercicio = tempo_total_estimado / total_exercicios if total_exercicios > 0 else 0
-        tempo_restante = tempo_total_estimado - (exercicios_concluidos * tempo_por_exercicio)
+    if request.method == 'POST' and plano_id:
+        # O progresso é individual, então só usuários logados podem marcar exercícios.
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # Planos privados de outros usuários não existem para quem não é o dono (id inválido: None, 404).
+        plano = get_object_or_404(PlanoTreino.objects.visiveis(request.user), id=id_da_url(plano_id))
+        exercicio_id = request.POST.get('exercicio_id')
 
-    else:
-        progresso = 0
-        tempo_restante = 0
+        if 'salvar' in request.POST or 'finalizar' in request.POST:
+            # Formulário da lista inteira: as caixas marcadas ficam concluídas e as demais não.
+            marcados = set(request.POST.getlist('concluidos'))
+            sessao = SessaoTreino.aberta(request.user, plano)
+            sessao.definir_estados({
+                exercicio: str(exercicio) in marcados
+                for exercicio in plano.exercicios.values_list('id', flat=True)
+            })
+            if 'finalizar' in request.POST:
+                # Encerra a sessão aberta, gravando as séries feitas no histórico do usuário.
+                sessao.finalizar()
+        elif exercicio_id:
+            exercicio = get_object_or_404(Exercicio, id=id_da_url(exercicio_id), plano=plano)
+            sessao = SessaoTreino.aberta(request.user, plano)
+            # Inverte o estado atual do exercício na sessão do usuário
+            feito = sessao.exercicios_concluidos.filter(id=exercicio.id).exists()
+            sessao.definir_estados({exercicio.id: not feito})
 
-    if request.method == 'POST':
-        exercicio_id = request.POST.get('exercicio_id')
-        
-        if exercicio_id and plano:
-            exercicio = get_object_or_404(Exercicio, id=exercicio_id, plano=plano)
-            # Inverte o estado atual do exercício
-            exercicio.concluido = not exercicio.concluido
-            exercicio.save()
-            
-            # Redireciona de volta para a mesma página mantendo o plano_id
-            return redirect(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={plano_id}")
+        # As marcações não disparam sinais; o progresso do perfil é invalidado aqui.
+        cache_planos.invalidar_estatisticas(request.user.id)
+        # Redireciona de volta para a mesma página mantendo o plano_id
+        return redirect(f"{reverse('poderoso_apps:detalhes_plano')}?plano_id={plano.id}")
 
-    return render(request, 'poderoso_apps/detalhes_plano.html', {
+    plano = None
+    exercicios_html = ''
+    concluidos = set()
+    progresso = 0
+    tempo_restante = 0
+    etag = None
+
+    if plano_id:
+        # Plano e lista de exercícios (já renderizada) vêm do cache; só o progresso do usuário é consultado.
+        dados = cache_planos.detalhes_plano(plano_id) if id_da_url(plano_id) is not None else None
+        # O cache é compartilhado por todos; a visibilidade é conferida no plano em cache (ver PlanoTreino.visivel_para).
+        if dados is None or not dados['plano'].visivel_para(request.user):
+            raise Http404
+        plano = dados['plano']
+        if request.user.is_authenticated:
+            concluidos = SessaoTreino.ids_concluidos(request.user, plano.id)
+        # Validador do plano em cache mais os exercícios concluídos: 304 antes do tempo restante e da renderização.
+        # Sem Last-Modified: marcar um exercício muda a página sem mudar nenhuma data.
+        etag = condicional.validador(request, plano.id, dados['versao'], dados['atualizado_em'], sorted(concluidos))
+        if resposta := condicional.nao_modificado(request, etag):
+            return resposta
+        progresso = plano.calcular_progresso(dados['total_exercicios'], len(concluidos))
+        # Sem exercícios concluídos falta o plano inteiro, cuja duração já está em cache;
+        # do contrário o banco soma a duração estimada dos exercícios que faltam.
+        tempo_restante = plano.duracao_total / 60
+        if concluidos:
+            tempo_restante = plano.exercicios.tempo_restante(request.user)
+        exercicios_html = mark_safe(cache_planos.aplicar_estados(
+            dados['html'], concluidos, habilitado=request.user.is_authenticated
+        ))
+
+    resposta = render(request, 'poderoso_apps/detalhes_plano.html', {
         'plano': plano,
-        'exercicios': exercicios,
-        'planos': planos,
+        'exercicios_html': exercicios_html,
+        'concluidos': concluidos,
         'progresso': progresso,
         'tempo_restante': tempo_restante
     })
+    return condicional.aplicar(resposta, etag) if etag else resposta
+
+@require_POST
+def definir_concluidos(request):
+    """
+    API JSON que define o estado 'concluido' de um ou vários exercícios de um plano de uma só vez.
+
+    Espera um corpo como {"plano_id": 1, "estados": {"3": true, "5": false}} e devolve o novo progresso do plano.
+    A operação é idempotente: cada exercício recebe o estado pedido, em vez de ter o estado invertido.
+    Os estados ficam na sessão de treino aberta do usuário logado.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'erro': 'Autenticação necessária.'}, status=401)
+
+    try:
+        dados = json.loads(request.body)
+        plano_id = int(dados['plano_id'])
+        estados = {int(exercicio_id): valor for exercicio_id, valor in dados['estados'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+
+    if not estados or not all(isinstance(valor, bool) for valor in estados.values()):
+        return JsonResponse({'erro': 'Informe ao menos um exercício com estado true ou false.'}, status=400)
+
+    plano = get_object_or_404(PlanoTreino.objects.visiveis(request.user), id=plano_id)
+    # Só grava as diferenças: um INSERT para os novos concluídos e um DELETE para os desfeitos.
+    alterados = SessaoTreino.aberta(request.user, plano).definir_estados(estados)
+    if alterados:
+        cache_planos.invalidar_estatisticas(request.user.id)
+    plano = PlanoTreino.objects.com_progresso(request.user).get(id=plano.id)
+
+    return JsonResponse({
+        'plano_id': plano.id,
+        'alterados': alterados,
+        'total_exercicios': plano.total_exercicios,
+        'exercicios_concluidos': plano.exercicios_concluidos,
+        'progresso': plano.progresso,
+        'tempo_restante': plano.tempo_restante,
+    })
+
+@ensure_csrf_cookie
+@require_http_methods(['GET', 'POST'])
+def sincronizar(request):
+    """
+    API JSON de sincronização incremental para o aplicativo (ver sincronizacao.py).
+
+    GET ?cursor=... devolve as linhas alteradas e apagadas desde o cursor. POST com
+    {"cursor": "...", "operacoes": [...]} grava antes as operações feitas sem conexão e devolve
+    também um resultado para cada uma, em uma única requisição. O GET já entrega o cookie CSRF
+    exigido pelo POST.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'erro': 'Autenticação necessária.'}, status=401)
+
+    cursor = request.GET.get('cursor')
+    resultados = None
+    try:
+        if request.method == 'POST':
+            try:
+                dados = json.loads(request.body)
+                cursor = dados.get('cursor')
+                operacoes = dados.get('operacoes', [])
+            except (ValueError, AttributeError):
+                return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+            # Cursor inválido é recusado antes de gravar qualquer operação.
+            sincronizacao.decodificar_cursor(cursor)
+            resultados = sincronizacao.aplicar(request.user, operacoes)
+        resposta = sincronizacao.alteracoes(request.user, cursor)
+    except sincronizacao.SincronizacaoInvalida as erro:
+        return JsonResponse({'erro': str(erro)}, status=400)
+
+    if resultados is not None:
+        resposta['resultados'] = resultados
+    return JsonResponse(resposta)
+
+@require_safe
+def servir_media(request, caminho):
+    """Entrega os arquivos enviados (MEDIA_ROOT) com ETag, Range e repasse opcional ao proxy."""
+    return servir_arquivo(
+        request, settings.MEDIA_ROOT, caminho,
+        sendfile=settings.MEDIA_SENDFILE,
+        prefixo_accel=settings.MEDIA_ACCEL_PREFIX,
+        max_age=settings.MEDIA_CACHE_MAX_AGE,
+    )
 
 def calculotmb(request):
     tmb = None
     if request.method == 'POST':
         form = CalculoBasal(request.POST)
         if form.is_valid():
-            peso = form.cleaned_data['peso']
-            idade = form.cleaned_data['idade']
-            sexo = form.cleaned_data['sexo']
-            altura = form.cleaned_data['altura']
-
-        if sexo == 'H':
-            tmb = 88.36 + (13.4 * peso) + (4.8 * altura) - (5.7 * idade)
-        else:
-            tmb = 447.6 + (9.2 * peso) + (3.1 * altura) - (4.3 * idade)
-
-        return render(request, 'poderoso_apps/calculotmb.html', {
-            'peso': peso,
-            'idade': idade,
-            'altura': altura,
-            'sexo': sexo,
-            'tmb': tmb,
-            'form': form,
-
-        })
-    
+            dados = form.cleaned_data
+            # Mesma equação usada no cálculo em lote (ver tmb.py).
+            tmb = calcular_tmb(dados['peso'], dados['altura'], dados['idade'], dados['sexo'])
     else:
         form = CalculoBasal()
-    
+
     return render(request, 'poderoso_apps/calculotmb.html', {
         'form': form,
+        'tmb': tmb,
     })
 
+
+@require_POST
+def calcular_tmb_lote(request):
+    """
+    Calcula a TMB de uma lista de alunos enviada como CSV ou JSON e devolve o resultado em streaming.
+
+    Entrada: JSON (Content-Type application/json), um arquivo CSV no campo 'arquivo' de um formulário
+    ou o próprio corpo em CSV. A saída segue o formato da entrada, ou o parâmetro ?formato=csv|json.
+    Cada linha volta com as colunas de entrada mais 'tmb' e 'erro' (validação de CalculoBasal).
+    """
+    # API: sem login, 401 em JSON em vez do redirecionamento para a página de login.
+    if not request.user.is_authenticated:
+        return JsonResponse({'erro': 'Autenticação necessária.'}, status=401)
+
+    try:
+        if request.content_type == 'application/json':
+            # Lido do stream da requisição, como o CSV: request.body carregaria o corpo inteiro.
+            blocos = calculo_tmb.ler_json(codecs.getreader(request.encoding or 'utf-8-sig')(request))
+            formato = 'json'
+        elif 'arquivo' in request.FILES:
+            blocos = calculo_tmb.ler_csv(codecs.iterdecode(request.FILES['arquivo'], 'utf-8-sig'))
+            formato = 'csv'
+        else:
+            # Corpo em CSV: lido direto do stream da requisição, bloco a bloco, enquanto a resposta é enviada.
+            blocos = calculo_tmb.ler_csv(codecs.iterdecode(request, request.encoding or 'utf-8-sig'))
+            formato = 'csv'
+    except (ValueError, UnicodeDecodeError) as erro:
+        return JsonResponse({'erro': str(erro)}, status=400)
+
+    formato = request.GET.get('formato', formato)
+    if formato == 'json':
+        return StreamingHttpResponse(calculo_tmb.escrever_json(calculo_tmb.resultados(blocos)), content_type='application/json')
+    resposta = StreamingHttpResponse(calculo_tmb.escrever_csv(calculo_tmb.resultados(blocos)), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = 'attachment; filename="tmb.csv"'
+    return resposta
+
+
+@login_required
 def perfil(request):
+    """Painel do usuário com os totais de tópicos, entradas e planos, o progresso e a última atividade."""
+    # Uma consulta agregada quando o cache está vazio; nenhuma depois disso.
+    estatisticas = cache_planos.estatisticas_usuario(request.user.id)
+    return render(request, 'poderoso_apps/perfil.html', {'estatisticas': estatisticas})
+
+
+@login_required
+@require_safe
+def historico_treinos(request):
+    """
+    API JSON com os totais de treino do usuário por dia, semana ou mês, para os gráficos do histórico.
+
+    Parâmetros: periodo ('dia', 'semana' ou 'mes'), inicio e fim (AAAA-MM-DD). Lê os resumos diários
+    (ResumoTreinoDiario), então o custo não depende de quantas séries foram registradas.
+    """
+    periodo = request.GET.get('periodo', 'semana')
+    if periodo not in HISTORICO_DIAS:
+        return JsonResponse({'erro': 'periodo deve ser dia, semana ou mes.'}, status=400)
+    try:
+        fim = datetime.date.fromisoformat(request.GET['fim']) if 'fim' in request.GET else timezone.localdate()
+        inicio = (datetime.date.fromisoformat(request.GET['inicio']) if 'inicio' in request.GET
+                  else fim - datetime.timedelta(days=HISTORICO_DIAS[periodo] - 1))
+    except ValueError:
+        return JsonResponse({'erro': 'Datas devem estar no formato AAAA-MM-DD.'}, status=400)
+
+    totais = ResumoTreinoDiario.objects.por_periodo(request.user, inicio, fim, periodo)
+    return JsonResponse({
+        'periodo': periodo,
+        'inicio': inicio,
+        'fim': fim,
+        'dados': [{**linha, 'minutos': round(linha['minutos'], 1)} for linha in totais],
+    })
+
 
-    return render(request, 'poderoso_apps/perfil.html')
\ No newline at end of file
+@staff_member_required
+@require_safe
+def ver_metricas(request):
+    """Histogramas de tempo, consultas e templates por view, no formato texto do Prometheus."""
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,130 @@
+"""
+Versões assíncronas das páginas de leitura mais acessadas.
+
+São usadas no lugar das views de views.py quando VIEWS_ASYNC está ligado (o asgi.py liga por
+padrão, ver urls.py). Num servidor ASGI elas esperam o banco sem ocupar uma thread por requisição;
+num servidor WSGI cada chamada precisaria de um laço de eventos próprio, por isso lá continuam
+as versões síncronas.
+
+O usuário é carregado com request.auser() e guardado em request.user antes de renderizar, porque
+os templates (context processor 'auth') leem request.user e não podem consultar o banco fora de
+uma thread síncrona.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.safestring import mark_safe
+
+from . import cache as cache_planos
+from . import condicional
+from . import views
+from .models import PlanoTreino, SessaoTreino, Topic
+from .paginacao import apagina_keyset
+
+
+async def _usuario(request):
+    """Carrega o usuário sem bloquear o laço de eventos e o deixa pronto para os templates."""
+    usuario = await request.auser()
+    request.user = usuario
+    return usuario
+
+
+@login_required
+async def topics(request):
+    """Lista de tópicos do usuário logado (ver views.topics)."""
+    usuario = await _usuario(request)
+    resumo = await Topic.objects.filter(owner=usuario).aaggregate(**views.RESUMO_TOPICOS)
+    etag = condicional.validador(request, resumo['total'], resumo['atualizado_em'])
+    if resposta := condicional.nao_modificado(request, etag, resumo['atualizado_em']):
+        return resposta
+    topics, proximo_cursor = await apagina_keyset(
+        Topic.objects.filter(owner=usuario), request.GET.get('cursor'), views.TOPICOS_POR_PAGINA
+    )
+    resposta = render(request, 'poderoso_apps/topics.html', {'topics': topics, 'proximo_cursor': proximo_cursor})
+    return condicional.aplicar(resposta, etag, resumo['atualizado_em'])
+
+
+@login_required
+async def topic(request, topic_id):
+    """Um tópico e uma página das suas entradas (ver views.topic)."""
+    usuario = await _usuario(request)
+    try:
+        topic = await views.topicos_com_entradas().aget(id=topic_id)
+    except Topic.DoesNotExist:
+        raise Http404
+    if topic.owner_id != usuario.id:
+        raise Http404
+    etag, atualizado_em = views.validador_topico(request, topic)
+    if resposta := condicional.nao_modificado(request, etag, atualizado_em):
+        return resposta
+    entries, proximo_cursor = await apagina_keyset(
+        topic.entry_set.all(), request.GET.get('cursor'), views.ENTRADAS_POR_PAGINA, descendente=True
+    )
+    resposta = render(request, 'poderoso_apps/topic.html', {
+        'topic': topic, 'entries': entries, 'proximo_cursor': proximo_cursor,
+    })
+    return condicional.aplicar(resposta, etag, atualizado_em)
+
+
+async def planos_treinos(request):
+    """Catálogo de planos (ver views.planos_treinos)."""
+    usuario = await _usuario(request)
+    # Só um plano visível entra na chave do fragmento (ver views.planos_treinos).
+    plano_id = views.id_da_url(request.GET.get('plano_id'))
+    if plano_id is not None and not await PlanoTreino.objects.visiveis(usuario).filter(id=plano_id).aexists():
+        plano_id = None
+    versao = await cache_planos.aversao_catalogo()
+    # O template só percorre os planos quando o fragmento não está em cache; como ele não pode
+    # consultar o banco aqui, a lista (com o prefetch dos exercícios) é carregada antes, e só nesse caso.
+    planos = []
+    if await cache.aget(make_template_fragment_key('catalogo_planos', [versao, usuario.id, plano_id])) is None:
+        planos = [plano async for plano in PlanoTreino.objects.catalogo(usuario)]
+    return render(request, 'poderoso_apps/planos_treinos.html', {
+        'planos': planos, 'plano_id': plano_id, 'versao_catalogo': versao,
+    })
+
+
+async def detalhes_planos(request):
+    """Página de um plano com o progresso do usuário (ver views.detalhes_planos)."""
+    plano_id = request.GET.get('plano_id')
+    if request.method == 'POST' and plano_id:
+        # As marcações feitas pelo formulário seguem pela view síncrona, em uma thread.
+        return await sync_to_async(views.detalhes_planos)(request)
+
+    usuario = await _usuario(request)
+    plano = None
+    exercicios_html = ''
+    concluidos = set()
+    progresso = 0
+    tempo_restante = 0
+    etag = None
+
+    if plano_id:
+        dados = await cache_planos.adetalhes_plano(plano_id) if views.id_da_url(plano_id) is not None else None
+        if dados is None or not dados['plano'].visivel_para(usuario):
+            raise Http404
+        plano = dados['plano']
+        if usuario.is_authenticated:
+            concluidos = await SessaoTreino.aids_concluidos(usuario, plano.id)
+        etag = condicional.validador(request, plano.id, dados['versao'], dados['atualizado_em'], sorted(concluidos))
+        if resposta := condicional.nao_modificado(request, etag):
+            return resposta
+        progresso = plano.calcular_progresso(dados['total_exercicios'], len(concluidos))
+        tempo_restante = plano.duracao_total / 60
+        if concluidos:
+            tempo_restante = await plano.exercicios.atempo_restante(usuario)
+        exercicios_html = mark_safe(cache_planos.aplicar_estados(
+            dados['html'], concluidos, habilitado=usuario.is_authenticated
+        ))
+
+    resposta = render(request, 'poderoso_apps/detalhes_plano.html', {
+        'plano': plano,
+        'exercicios_html': exercicios_html,
+        'concluidos': concluidos,
+        'progresso': progresso,
+        'tempo_restante': tempo_restante
+    })
+    return condicional.aplicar(resposta, etag) if etag else resposta